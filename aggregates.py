@@ -0,0 +1,207 @@
+import weakref
+import numpy as np
+import pandas as pd
+
+# Pre-aggregation for the summary plots.
+#
+# Bar, box and histogram plots only need a handful of numbers per group, so
+# they are computed once per frame with vectorized groupbys and the plots
+# draw from these small tables. Rendering cost then depends on the number of
+# groups, not the number of rows.
+
+CONFIDENCE = 0.95
+MAX_FLIERS = 200
+
+# Error-bar modes for mean plots:
+#   'se'        - analytic Student-t interval from the standard error (default)
+#   'bootstrap' - percentile bootstrap on a bounded, seeded subsample per group
+#   'none'      - no interval
+CI_MODES = ('se', 'bootstrap', 'none')
+BOOTSTRAP_SAMPLE = 5000
+BOOTSTRAP_ITERATIONS = 1000
+BOOTSTRAP_SEED = 0
+_ci_mode = 'se'
+
+def set_ci_mode(mode):
+    global _ci_mode
+    if mode not in CI_MODES:
+        raise ValueError(f"Unknown CI mode {mode!r}; expected one of {CI_MODES}")
+    _ci_mode = mode
+
+def get_ci_mode():
+    return _ci_mode
+
+def ci_label(mode, confidence=CONFIDENCE):
+    if mode == 'se':
+        return f"Mean ± {confidence:.0%} CI (analytic SE)"
+    if mode == 'bootstrap':
+        return f"Mean ± {confidence:.0%} CI (bootstrap, n≤{BOOTSTRAP_SAMPLE}, seed {BOOTSTRAP_SEED})"
+    return "Mean (no CI)"
+
+# Per-frame memo: id(df) -> {key: summary}. Entries are dropped when the frame
+# is garbage collected; call clear_cache(df) after mutating a frame in place.
+_cache = {}
+
+def cached(df, key, compute):
+    frame_id = id(df)
+    if frame_id not in _cache:
+        _cache[frame_id] = {}
+        weakref.finalize(df, _cache.pop, frame_id, None)
+    entry = _cache[frame_id]
+    if key not in entry:
+        entry[key] = compute()
+    return entry[key]
+
+def remember(df, key, value):
+    # Seed the memo with a value computed elsewhere (e.g. a saved cube)
+    cached(df, key, lambda: value)
+    _cache[id(df)][key] = value
+    return value
+
+def clear_cache(df=None):
+    if df is None:
+        _cache.clear()
+    else:
+        _cache.pop(id(df), None)
+
+def _key(by):
+    return tuple(by) if isinstance(by, list) else by
+
+def group_means(df, by, value='DALYs', ci=None, confidence=CONFIDENCE):
+    # count / mean / std / sem per group plus ci_low / ci_high for the chosen
+    # CI mode (None -> the module default, see set_ci_mode)
+    ci = ci or _ci_mode
+    if ci not in CI_MODES:
+        raise ValueError(f"Unknown CI mode {ci!r}; expected one of {CI_MODES}")
+    return cached(df, ('means', _key(by), value, ci, confidence),
+                  lambda: _group_means(df, by, value, ci, confidence))
+
+def _group_means(df, by, value, ci, confidence):
+    # Rolled up from the aggregate cube when it covers the grouping (see
+    # cube.py); the bootstrap resamples rows, so it always reads the frame
+    from cube import CUBE_DIMENSIONS, CUBE_MEASURE, frame_cube
+    keys = [by] if isinstance(by, str) else list(by)
+    if value == CUBE_MEASURE and ci != 'bootstrap' and set(keys) <= set(CUBE_DIMENSIONS) and set(keys) <= set(df.columns):
+        summary = frame_cube(df).rollup(keys)[['count', 'mean', 'std', 'sem']].copy()
+    else:
+        summary = df.groupby(by, observed=True, sort=True)[value].agg(['count', 'mean', 'std'])
+        summary['sem'] = summary['std'] / np.sqrt(summary['count'])
+    if ci == 'se':
+        from scipy import stats
+        t = stats.t.ppf(0.5 + confidence / 2, np.maximum(summary['count'] - 1, 1))
+        summary['ci_low'] = summary['mean'] - t * summary['sem']
+        summary['ci_high'] = summary['mean'] + t * summary['sem']
+    elif ci == 'bootstrap':
+        bounds = _bootstrap_bounds(df, by, value, summary, confidence)
+        summary['ci_low'], summary['ci_high'] = bounds[:, 0], bounds[:, 1]
+    summary.attrs['ci'] = ci
+    summary.attrs['ci_label'] = ci_label(ci, confidence)
+    return summary
+
+def _bootstrap_bounds(df, by, value, summary, confidence):
+    # Resample at most BOOTSTRAP_SAMPLE rows per group. The spread of the
+    # subsample means is rescaled by sqrt(m / n) so the interval describes
+    # the full group's mean rather than the smaller subsample's.
+    rng = np.random.default_rng(BOOTSTRAP_SEED)
+    alpha = (1 - confidence) / 2
+    bounds = np.full((len(summary), 2), np.nan)
+    grouped = df.groupby(by, observed=True, sort=True)[value]
+    for i, (_, values) in enumerate(grouped):
+        values = values.dropna().to_numpy(dtype=float)
+        n = len(values)
+        if n < 2:
+            continue
+        m = min(n, BOOTSTRAP_SAMPLE)
+        sample = rng.choice(values, m, replace=False) if m < n else values
+        means = sample[rng.integers(0, m, size=(BOOTSTRAP_ITERATIONS, m))].mean(axis=1)
+        low, high = np.quantile(means, [alpha, 1 - alpha])
+        center = sample.mean()
+        scale = np.sqrt(m / n)
+        mean = summary['mean'].iloc[i]
+        bounds[i] = mean + (low - center) * scale, mean + (high - center) * scale
+    return bounds
+
+def box_stats(df, by, value='DALYs', max_fliers=MAX_FLIERS):
+    # Quartiles, Tukey whiskers (1.5 IQR, clipped to the data) and a capped
+    # set of fliers per group, in the format Axes.bxp expects
+    return cached(df, ('box', _key(by), value, max_fliers),
+                  lambda: _box_stats(df, by, value, max_fliers))
+
+def _box_stats(df, by, value, max_fliers):
+    values = df[value].to_numpy(dtype=float)
+    grouped = df[value].groupby(df[by], observed=True, sort=True)
+    quartiles = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    q1, med, q3 = (quartiles[q].to_numpy() for q in (0.25, 0.5, 0.75))
+    lo = q1 - 1.5 * (q3 - q1)
+    hi = q3 + 1.5 * (q3 - q1)
+
+    # Broadcast each group's fences back to its rows to find the whisker ends
+    codes = pd.Categorical(df[by], categories=quartiles.index).codes
+    valid = (codes >= 0) & ~np.isnan(values)
+    inside = valid & (values >= lo[codes]) & (values <= hi[codes])
+    n_groups = len(quartiles.index)
+    whislo = np.full(n_groups, np.inf)
+    whishi = np.full(n_groups, -np.inf)
+    np.minimum.at(whislo, codes[inside], values[inside])
+    np.maximum.at(whishi, codes[inside], values[inside])
+
+    flier_mask = valid & ~inside
+    flier_codes, flier_values = codes[flier_mask], values[flier_mask]
+
+    result = []
+    for i, label in enumerate(quartiles.index):
+        group_fliers = flier_values[flier_codes == i]
+        n_fliers = len(group_fliers)
+        if n_fliers > max_fliers:
+            group_fliers = _extreme_fliers(group_fliers, med[i], max_fliers)
+        result.append({
+            'label': str(label),
+            'q1': q1[i], 'med': med[i], 'q3': q3[i],
+            'whislo': whislo[i], 'whishi': whishi[i],
+            'fliers': group_fliers,
+            'n_fliers': n_fliers,
+        })
+    return result
+
+def _extreme_fliers(fliers, median, n):
+    # The n fliers farthest from the median, always including the lowest and
+    # highest so the plot spans the group's full range; kept in row order
+    farthest = np.argsort(-np.abs(fliers - median), kind='stable')
+    ends = [np.argmin(fliers), np.argmax(fliers)] if n >= 2 else []
+    keep = np.unique(np.concatenate([farthest[:n - len(ends)], ends]).astype(np.intp))
+    if len(keep) < n:
+        # min or max was among the farthest already: fill up in distance order
+        rest = farthest[~np.isin(farthest, keep)][:n - len(keep)]
+        keep = np.sort(np.concatenate([keep, rest]))
+    return fliers[keep]
+
+def histogram(df, value='DALYs', bins=30, kde_points=200):
+    # Bin counts plus a binned Gaussian KDE scaled to the histogram
+    return cached(df, ('hist', value, bins, kde_points),
+                  lambda: _histogram(df[value].dropna().to_numpy(dtype=float), bins, kde_points))
+
+def _histogram(values, bins, kde_points):
+    counts, edges = np.histogram(values, bins=bins)
+    grid, density = binned_kde(values, kde_points)
+    # Same scaling seaborn uses for kde=True on a count histogram
+    scale = len(values) * (edges[1] - edges[0])
+    return {'counts': counts, 'edges': edges, 'kde_x': grid, 'kde_y': density * scale}
+
+def binned_kde(values, points=200):
+    # Gaussian KDE evaluated by smoothing a fine histogram (Scott's bandwidth),
+    # O(n) instead of O(n * points)
+    n = len(values)
+    lo, hi = values.min(), values.max()
+    bandwidth = values.std(ddof=1) * n ** (-1 / 5) if n > 1 else 0.0
+    if n < 2 or bandwidth == 0 or hi == lo:
+        return np.array([lo, hi]), np.zeros(2)
+
+    fine, edges = np.histogram(values, bins=points * 4, range=(lo, hi), density=True)
+    centers = (edges[:-1] + edges[1:]) / 2
+    step = centers[1] - centers[0]
+    half = min(int(np.ceil(4 * bandwidth / step)), len(fine) // 2 - 1)
+    offsets = np.arange(-half, half + 1) * step
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2)
+    kernel /= kernel.sum()
+    smoothed = np.convolve(fine, kernel, mode='same')
+    return centers[::4], smoothed[::4]
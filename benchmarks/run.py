@@ -0,0 +1,195 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import matplotlib
+matplotlib.use('Agg')
+
+from synthetic import SIZES, write_synthetic
+
+# Benchmarks for the pipeline hot paths.
+#
+# Every stage (load, preprocess, report, each figure) is timed over a few
+# repeats with the per-frame aggregate caches cleared in between, so each run
+# is a cold one; the best time is reported. One extra run per stage under
+# tracemalloc records the peak Python/NumPy allocation. Results are written as
+# JSON and can be compared against an earlier file: any stage slower than the
+# baseline by more than the threshold is reported and the exit code is 1. A
+# slowdown also has to exceed a minimum number of seconds and the run-to-run
+# spread of both measurements, so short stages cannot fail on noise alone.
+#
+#   python benchmarks/run.py --size 1m --out bench_1m.json
+#   python benchmarks/run.py --size 1m --baseline bench_1m.json --threshold 0.1
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+DEFAULT_THRESHOLD = 0.10
+# Smallest slowdown in seconds that counts as a regression
+DEFAULT_MIN_DELTA = 0.1
+
+def measure(fn, repeat=3, memory=True, setup=None):
+    # With setup, fn receives setup()'s result; setup runs outside the timer
+    # and before tracemalloc starts, so neither the time nor the peak includes it
+    from aggregates import clear_cache
+    runs = []
+    result = None
+    for _ in range(repeat):
+        args = (setup(),) if setup else ()
+        clear_cache()
+        gc.collect()
+        start = time.perf_counter()
+        result = fn(*args)
+        runs.append(time.perf_counter() - start)
+        del args
+
+    peak = None
+    if memory:
+        args = (setup(),) if setup else ()
+        clear_cache()
+        gc.collect()
+        tracemalloc.start()
+        fn(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        del args
+    return result, {'seconds': min(runs), 'runs': runs, 'peak_bytes': peak}
+
+def warm_up():
+    # Lazily imported libraries and matplotlib's first draw would otherwise be
+    # charged to whichever stage happens to run first
+    import io
+    import scipy.stats  # noqa: F401
+    import seaborn  # noqa: F401
+    from figures import get_axes
+    fig, axes = get_axes()
+    axes.plot([0, 1], [0, 1])
+    axes.set_title("warm-up")
+    fig.savefig(io.BytesIO(), format='png')
+
+def run_benchmarks(csv_path, repeat=3, memory=True, plots=None):
+    from preprocessing import load_data, preprocess_data
+    from report import build_report
+    from render import RENDER_TARGETS, _render_one
+
+    warm_up()
+
+    stages = {}
+    quiet = open(os.devnull, 'w')
+
+    def stage(name, fn, times=repeat, setup=None):
+        # Pipeline functions print progress; keep the benchmark output readable
+        stdout, sys.stdout = sys.stdout, quiet
+        try:
+            result, stages[name] = measure(fn, times, memory, setup)
+        finally:
+            sys.stdout = stdout
+        print(f"  {name:<32} {stages[name]['seconds']:8.3f} s"
+              + (f"  peak {stages[name]['peak_bytes'] / 1e6:8.1f} MB" if memory else ""))
+        return result
+
+    raw = stage('load_data', lambda: load_data(csv_path))
+    # Each run cleans a fresh copy of the raw frame, made outside the timer
+    cleaned = stage('preprocess_data', preprocess_data, setup=raw.copy)
+    stage('report', lambda: build_report(cleaned))
+
+    assets = DATA_DIR / "assets"
+    os.makedirs(assets, exist_ok=True)
+    for name in plots or RENDER_TARGETS:
+        stage(f'plot:{name}', lambda name=name: _render_one(cleaned, name, str(assets)))
+    return {'rows': len(raw), 'cleaned_rows': len(cleaned), 'stages': stages}
+
+def metadata():
+    import numpy
+    import pandas
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'pandas': pandas.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD, min_delta=DEFAULT_MIN_DELTA):
+    # Returns the stages slower than baseline * (1 + threshold) by more than
+    # both min_delta seconds and the spread of the runs behind either time
+    regressions = []
+    print(f"\n{'stage':<32} {'baseline':>9} {'current':>9} {'change':>8}")
+    for name, current in results['stages'].items():
+        before = baseline['stages'].get(name)
+        if before is None:
+            print(f"{name:<32} {'-':>9} {current['seconds']:9.3f} {'new':>8}")
+            continue
+        change = current['seconds'] / before['seconds'] - 1 if before['seconds'] else 0.0
+        delta = current['seconds'] - before['seconds']
+        # Run-to-run spread of either measurement: differences inside it are noise
+        spread = max(_spread(before), _spread(current))
+        flag = ''
+        if change > threshold and delta > max(min_delta, spread):
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:<32} {before['seconds']:9.3f} {current['seconds']:9.3f} {change:+8.1%}{flag}")
+    return regressions
+
+def _spread(stage):
+    runs = stage.get('runs')
+    return max(runs) - min(runs) if runs else 0.0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the preprocessing, analysis and plotting stages")
+    parser.add_argument('--size', choices=list(SIZES), default='10k', help="synthetic dataset size")
+    parser.add_argument('--data', help="benchmark this CSV instead of synthetic data")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc pass")
+    parser.add_argument('--plots', nargs='*', help="only these render targets")
+    parser.add_argument('--out', help="write results JSON here")
+    parser.add_argument('--baseline', help="compare against this results JSON")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown vs baseline (0.10 = 10%%)")
+    parser.add_argument('--min-delta', type=float, default=DEFAULT_MIN_DELTA,
+                        help="smallest slowdown in seconds reported as a regression (default: 0.1)")
+    args = parser.parse_args(argv)
+
+    csv_path = args.data
+    if csv_path is None:
+        csv_path = DATA_DIR / f"synthetic_{args.size}_seed{args.seed}.csv"
+        print(f"Preparing {SIZES[args.size]:,} synthetic rows in {csv_path}")
+        write_synthetic(str(csv_path), SIZES[args.size], seed=args.seed)
+
+    print(f"\nBenchmarking {csv_path}")
+    results = {'meta': metadata(), 'size': args.size if args.data is None else None, 'source': str(csv_path)}
+    results.update(run_benchmarks(csv_path, repeat=args.repeat, memory=not args.no_memory, plots=args.plots))
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults saved to: {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.min_delta)
+        if regressions:
+            print(f"\n{len(regressions)} stage(s) slower than baseline by more than {args.threshold:.0%}")
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Synthetic data with the Global Health Statistics schema.
+#
+# Values follow the ranges and rounding of the real file, a few percent of the
+# imputed and required columns are missing and about 2% of the rows are exact
+# duplicates, so every cleaning step does real work. Rows are generated and
+# written in chunks from per-chunk seeds: the same (rows, seed) always gives
+# the same file, and 10M rows never have to fit in memory at once.
+
+SIZES = {'10k': 10_000, '1m': 1_000_000, '10m': 10_000_000}
+CHUNK_ROWS = 500_000
+DUPLICATE_FRACTION = 0.02
+
+COUNTRIES = ['Argentina', 'Australia', 'Brazil', 'Canada', 'China', 'France', 'Germany', 'India',
+             'Indonesia', 'Italy', 'Japan', 'Mexico', 'Nigeria', 'Russia', 'Saudi Arabia',
+             'South Africa', 'South Korea', 'Turkey', 'UK', 'USA']
+DISEASES = ['Alzheimer\'s Disease', 'Asthma', 'COVID-19', 'Cancer', 'Cholera', 'Dengue', 'Diabetes',
+            'Ebola', 'HIV/AIDS', 'Hepatitis', 'Hypertension', 'Influenza', 'Leprosy', 'Malaria',
+            'Measles', 'Parkinson\'s Disease', 'Polio', 'Rabies', 'Tuberculosis', 'Zika']
+CATEGORIES = ['Autoimmune', 'Bacterial', 'Cardiovascular', 'Chronic', 'Genetic', 'Infectious',
+              'Metabolic', 'Neurological', 'Parasitic', 'Respiratory', 'Viral']
+MISSING = {'Education Index': 0.05, 'Urbanization Rate (%)': 0.05, 'DALYs': 0.01, 'Per Capita Income (USD)': 0.01}
+
+def synthetic_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    pick = lambda values: np.asarray(values)[rng.integers(0, len(values), rows)]
+    rate = lambda lo, hi: rng.integers(lo * 100, hi * 100, rows) / 100
+    df = pd.DataFrame({
+        'Country': pick(COUNTRIES),
+        'Year': rng.integers(2000, 2025, rows),
+        'Disease Name': pick(DISEASES),
+        'Disease Category': pick(CATEGORIES),
+        'Prevalence Rate (%)': rate(0.1, 20),
+        'Incidence Rate (%)': rate(0.1, 15),
+        'Mortality Rate (%)': rate(0.1, 10),
+        'Age Group': pick(['0-18', '19-35', '36-60', '61+']),
+        'Gender': pick(['Male', 'Female', 'Other']),
+        'Population Affected': rng.integers(1_000, 1_000_000, rows),
+        'Healthcare Access (%)': rate(50, 100),
+        'Doctors per 1000': rate(0.5, 5),
+        'Hospital Beds per 1000': rate(0.5, 10),
+        'Treatment Type': pick(['Medication', 'Surgery', 'Vaccination', 'Therapy']),
+        'Average Treatment Cost (USD)': rng.integers(100, 50_000, rows),
+        'Availability of Vaccines/Treatment': pick(['Yes', 'No']),
+        'Recovery Rate (%)': rate(50, 100),
+        'DALYs': rng.integers(10, 5_000, rows).astype(float),
+        'Improvement in 5 Years (%)': rate(0, 10),
+        'Per Capita Income (USD)': rng.integers(500, 100_000, rows).astype(float),
+        'Education Index': rate(0.4, 0.9),
+        'Urbanization Rate (%)': rate(20, 85),
+    })
+    for col, fraction in MISSING.items():
+        df.loc[rng.random(rows) < fraction, col] = np.nan
+
+    # Exact duplicates of earlier rows, shuffled in
+    n_dup = int(rows * DUPLICATE_FRACTION)
+    dup = df.iloc[rng.integers(0, rows, n_dup)]
+    df = pd.concat([df.iloc[:rows - n_dup], dup])
+    return df.iloc[rng.permutation(len(df))].reset_index(drop=True)
+
+def write_synthetic(path, rows, seed=0):
+    # Writes `rows` rows to path; reuses an existing file made with the same parameters
+    stamp = f"{path}.params"
+    params = f"{rows}:{seed}:{CHUNK_ROWS}"
+    if os.path.exists(path) and os.path.exists(stamp) and open(stamp).read() == params:
+        return path
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    written = 0
+    for i, start in enumerate(range(0, rows, CHUNK_ROWS)):
+        n = min(CHUNK_ROWS, rows - start)
+        synthetic_frame(n, seed=seed * 1_000_003 + i).to_csv(path, index=False, mode='w' if i == 0 else 'a', header=(i == 0))
+        written += n
+    with open(stamp, 'w') as f:
+        f.write(params)
+    return path
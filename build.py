@@ -0,0 +1,351 @@
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+from cache import CACHE_DIR, cache_key, file_fingerprint
+from telemetry import stage
+
+# Incremental CLI build.
+#
+# Artifacts form a small dependency graph:
+#   raw CSV fingerprint -> 'cleaned' (cleaned_data.csv) -> 'report'
+#                                                      -> 'cube' (cleaned_data.cube)
+#                                                      -> one node per figure
+# Files appended with run_append() become part of the cleaned key, and a full
+# rebuild cleans them together with the raw CSV.
+# Each artifact's key is a hash of its inputs' keys plus the version of the
+# code that makes it (and the CI mode for figures), so a change anywhere
+# upstream changes every key below it. build_state.json remembers the key
+# each artifact was last built with; an artifact is rebuilt only when its key
+# changed or one of its output files is missing. When nothing is stale the
+# cleaned frame is never loaded.
+
+BUILD_STATE = CACHE_DIR / "build_state.json"
+REPORT_VERSION = 1
+FIGURE_VERSION = 1
+# Artifacts that are not figures
+DATA_TARGETS = ('cleaned', 'report', 'cube')
+
+def available_targets():
+    from render import RENDER_TARGETS
+    return list(DATA_TARGETS) + list(RENDER_TARGETS)
+
+def resolve_targets(names=None):
+    # 'all' (the default) and 'figures' are accepted as groups; every
+    # selection includes the cleaned data the others depend on, and figures
+    # bring in the aggregate cube they are summarised from
+    from render import RENDER_TARGETS
+    if not names or 'all' in names:
+        return list(DATA_TARGETS) + list(RENDER_TARGETS)
+    resolved = ['cleaned']
+    for name in names:
+        if name == 'figures':
+            resolved += list(RENDER_TARGETS)
+        elif name in DATA_TARGETS or name in RENDER_TARGETS:
+            resolved.append(name)
+        else:
+            raise ValueError(f"Unknown target {name!r}; run 'main.py targets' for the list")
+    if any(name in RENDER_TARGETS for name in resolved):
+        resolved.insert(1, 'cube')
+    return list(dict.fromkeys(resolved))
+
+def _hash(*parts):
+    return hashlib.sha256(":".join(str(p) for p in parts).encode()).hexdigest()[:24]
+
+def read_state(path=BUILD_STATE):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'source': {}, 'artifacts': {}}
+
+def write_state(state, path=BUILD_STATE):
+    os.makedirs(Path(path).parent, exist_ok=True)
+    tmp = Path(path).with_suffix('.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+def plan(data_path, targets, assets_dir, cleaned_path, report_path, ci, state, quantiles='exact'):
+    # {target: (key, outputs)} for every requested target, plus the set that is stale
+    from cube import CUBE_VERSION, cube_path
+    from render import RENDER_TARGETS
+
+    source = state['source'].get(str(data_path))
+    fingerprint = file_fingerprint(data_path, previous=source)
+    state['source'][str(data_path)] = fingerprint
+    cleaned_key = cache_key(fingerprint, 'cleaned')
+    appended = _appended(state, data_path)
+    if appended:
+        cleaned_key = _hash(cleaned_key, *_sha256s(appended))
+    if quantiles == 'sketch':
+        # Sketched income edges and quartiles give different artifacts
+        cleaned_key = _hash(cleaned_key, 'sketch')
+
+    nodes = {}
+    for target in targets:
+        if target == 'cleaned':
+            nodes[target] = (cleaned_key, [str(cleaned_path)])
+        elif target == 'report':
+            base = os.path.splitext(report_path)[0]
+            nodes[target] = (_hash(cleaned_key, 'report', REPORT_VERSION),
+                             [str(report_path), base + '.json', base + '_grouped.csv'])
+        elif target == 'cube':
+            nodes[target] = (_hash(cleaned_key, 'cube', CUBE_VERSION),
+                             [str(Path(cube_path(cleaned_path)) / 'meta.json')])
+        else:
+            filename = RENDER_TARGETS[target][2]
+            nodes[target] = (_hash(cleaned_key, target, FIGURE_VERSION, ci),
+                             [str(Path(assets_dir) / filename)])
+
+    stale = set()
+    for target, (key, outputs) in nodes.items():
+        record = state['artifacts'].get(target)
+        if record is None or record['key'] != key or not all(os.path.exists(p) for p in outputs):
+            stale.add(target)
+    return nodes, stale
+
+def run_build(data_path, targets=None, assets_dir='assets', cleaned_path='data/cleaned_data.csv',
+              report_path='data/analysis_results.txt', chunksize=None, workers=None, ci=None,
+              force=False, state_path=BUILD_STATE, quantiles='exact'):
+    # Returns {target: 'built' | 'up to date'}. quantiles='sketch' takes the
+    # chunked pipeline's quartiles and income edges from KLL sketches (it has
+    # no effect without a chunksize; see quantiles.py)
+    from aggregates import get_ci_mode, set_ci_mode
+    if ci is not None:
+        set_ci_mode(ci)
+    ci = get_ci_mode()
+    quantiles = quantiles if chunksize else 'exact'
+
+    targets = resolve_targets(targets)
+    state = read_state(state_path)
+    nodes, stale = plan(data_path, targets, assets_dir, cleaned_path, report_path, ci, state, quantiles)
+    if force:
+        stale = set(nodes)
+
+    status = {target: 'up to date' for target in nodes}
+    if not stale:
+        write_state(state, state_path)
+        return status
+
+    start = time.perf_counter()
+    with stage('build.cleaned', rebuild='cleaned' in stale) as record:
+        df_cleaned = _build_cleaned(data_path, cleaned_path, rebuild='cleaned' in stale,
+                                    chunksize=chunksize, workers=workers, quantiles=quantiles,
+                                    appended=_appended(state, data_path))
+        record['rows_out'] = len(df_cleaned)
+    if 'cleaned' in stale:
+        _record(state, 'cleaned', nodes, status, state_path)
+
+    if 'report' in stale:
+        print("\nRunning statistical analysis...")
+        from report import build_report, build_report_streaming, write_report
+        with stage('build.report', rows_in=df_cleaned):
+            if chunksize:
+                # Out-of-core: the report is accumulated from the cleaned CSV in chunks
+                report = build_report_streaming(cleaned_path, chunksize=chunksize, workers=workers,
+                                                quantiles=quantiles)
+            else:
+                report = build_report(df_cleaned)
+            write_report(report, save_path=report_path)
+        _record(state, 'report', nodes, status, state_path)
+
+    figures = [t for t in targets if t in stale and t not in DATA_TARGETS]
+    if 'cube' in stale or figures:
+        # Only new or changed years are aggregated into the saved cube
+        from cube import cube_path, refresh_cube
+        with stage('build.cube', rows_in=df_cleaned) as record:
+            cube, years = refresh_cube(df_cleaned, cube_path(cleaned_path))
+            record['rows_out'] = len(cube)
+            record['years_aggregated'] = years
+        if 'cube' in stale:
+            _record(state, 'cube', nodes, status, state_path)
+
+    if figures:
+        print(f"\nGenerating {len(figures)} visualizations...")
+        from render import render_all
+        with stage('build.figures', rows_in=df_cleaned, figures=len(figures)):
+            rendered = render_all(df_cleaned, assets_dir=assets_dir, targets=figures, workers=workers,
+                                  cube=cube_path(cleaned_path))
+        for target in rendered:
+            _record(state, target, nodes, status, state_path, save=False)
+        write_state(state, state_path)
+        failed = sorted(set(figures) - set(rendered))
+        for target in failed:
+            status[target] = 'failed'
+
+    print(f"\nRebuilt {sum(s == 'built' for s in status.values())} of {len(status)} targets "
+          f"in {time.perf_counter() - start:.1f} s")
+    return status
+
+def run_append(data_path, paths, targets=None, assets_dir='assets', cleaned_path='data/cleaned_data.csv',
+               report_path='data/analysis_results.txt', workers=None, ci=None, recompute=False,
+               tolerance=None, state_path=BUILD_STATE):
+    # Add raw files (typically a new year's release) to the cleaned data
+    # without cleaning the history again, then bring the other targets up to
+    # date. Returns (build status, {derived column: drift}). With recompute,
+    # every year is cleaned again once a drift passes the tolerance.
+    from cache import load_cached, record_output, store_cached
+    from preprocessing import (DRIFT_TOLERANCE, CleaningState, append_rows, cleaning_state_path,
+                               concat_rows, load_data)
+    tolerance = DRIFT_TOLERANCE if tolerance is None else tolerance
+    state = read_state(state_path)
+    appended = list(_appended(state, data_path))
+    state_file = cleaning_state_path(cleaned_path)
+
+    with stage('append', files=len(paths)) as record:
+        df = _build_cleaned(data_path, cleaned_path, rebuild=False, workers=workers, appended=appended)
+        cleaning = CleaningState.load(state_file)
+        if cleaning is None or int(cleaning.dalys_counts.sum()) != len(df):
+            # No statistics for these rows (cleaned by an older version or elsewhere)
+            print("No cleaning statistics for the stored data; cleaning it again")
+            df = _build_cleaned(data_path, cleaned_path, rebuild=True, workers=workers,
+                                appended=appended, use_cache=False)
+            cleaning = CleaningState.load(state_file)
+
+        # Every file is cleaned before anything is written, so a rejected file
+        # leaves the stored data as it was
+        new_rows = []
+        for path in paths:
+            fingerprint = file_fingerprint(path)
+            if any(source['fingerprint']['sha256'] == fingerprint['sha256'] for source in appended):
+                print(f"Already appended: {path}")
+                continue
+            print(f"\nAppending: {path}")
+            rows, cleaning = append_rows(load_data(path), cleaning)
+            new_rows.append(rows[list(df.columns)])
+            appended.append({'path': str(Path(path).absolute()), 'fingerprint': fingerprint})
+
+        if new_rows:
+            with stage('append.save', rows_in=sum(len(rows) for rows in new_rows)):
+                for rows in new_rows:
+                    df = concat_rows(df, rows)
+                    rows.to_csv(cleaned_path, mode='a', header=False, index=False)
+                df.attrs['dalys_iqr'] = cleaning.iqr()
+                df.attrs['cleaning'] = cleaning.applied
+                # Cached as the raw file plus these appended files; the raw
+                # file's own entry is left as it was
+                sha256s = _sha256s(appended)
+                store_cached(df, data_path, appended=sha256s)
+                record_output(data_path, cleaned_path, appended=sha256s)
+                mapped = load_cached(data_path, appended=sha256s)
+                if mapped is not None:
+                    df = mapped
+                store_cached(df, cleaned_path, stage='parsed')
+                cleaning.save(state_file)
+            state['appended'][str(data_path)] = appended
+        record['rows_out'] = sum(len(rows) for rows in new_rows)
+
+        drift = cleaning.drift()
+        record['drift'] = drift
+        flagged = [name for name, value in drift.items() if value > tolerance]
+        print(f"\nDrift of the derived columns from a full recompute (tolerance {tolerance:.2%}):")
+        for name, value in drift.items():
+            print(f"  {name:<32} {value:8.2%}{'  needs a full recompute' if name in flagged else ''}")
+
+        if flagged and recompute:
+            print("\nCleaning every year again with the current statistics...")
+            _build_cleaned(data_path, cleaned_path, rebuild=True, workers=workers,
+                           appended=appended, use_cache=False)
+            drift = CleaningState.load(state_file).drift()
+            record['recomputed'] = True
+            # Same inputs, new cleaning statistics: everything downstream is rebuilt
+            for target in list(state['artifacts']):
+                if target != 'cleaned':
+                    del state['artifacts'][target]
+        elif flagged:
+            print("Run `main.py append --recompute` to clean every year again with the current statistics.")
+
+    status = {}
+    if new_rows or (flagged and recompute):
+        nodes, _ = plan(data_path, ['cleaned'], assets_dir, cleaned_path, report_path, ci, state)
+        _record(state, 'cleaned', nodes, status, state_path)
+    built = run_build(data_path, targets=targets, assets_dir=assets_dir, cleaned_path=cleaned_path,
+                      report_path=report_path, workers=workers, ci=ci, state_path=state_path)
+    built.update(status)
+    return built, drift
+
+def _record(state, target, nodes, status, state_path, save=True):
+    key, outputs = nodes[target]
+    state['artifacts'][target] = {'key': key, 'outputs': outputs, 'built': time.time()}
+    status[target] = 'built'
+    if save:
+        write_state(state, state_path)
+
+def _appended(state, data_path):
+    return state.setdefault('appended', {}).get(str(data_path), [])
+
+def _sha256s(appended):
+    return [source['fingerprint']['sha256'] for source in appended]
+
+def _build_cleaned(data_path, cleaned_path, rebuild, chunksize=None, workers=None, appended=(), use_cache=True,
+                   quantiles='exact'):
+    import pandas as pd
+    from cache import load_cached, output_current, record_output, store_cached, store_cached_chunks
+    from preprocessing import (CleaningState, cleaning_state_path, impute_counts, load_data,
+                               preprocess_data_parallel, save_cleaned_data, preprocess_data_streaming)
+    from schema import apply_schema, parse_dtypes
+
+    # appended: the {'path', 'fingerprint'} records of files appended to the raw
+    # CSV; the frame including them has a cache entry of its own
+    sha256s = _sha256s(appended)
+    print(f"\nLoading data from: {data_path}")
+    sketch = quantiles == 'sketch' and chunksize and not appended
+    if sketch:
+        # The raw-file cache holds exactly cleaned frames only; a sketched one
+        # is kept as the parsed copy of its cleaned CSV
+        df_cleaned = load_cached(cleaned_path, stage='parsed') if use_cache and not rebuild else None
+    else:
+        df_cleaned = load_cached(data_path, appended=sha256s) if use_cache else None
+    if df_cleaned is not None:
+        print("Using cached cleaned data (raw file unchanged)")
+        # The CSV may have been written from another input since (a sketched
+        # frame is the parse of the CSV itself)
+        current = os.path.exists(cleaned_path) if sketch else output_current(data_path, cleaned_path,
+                                                                             appended=sha256s)
+        if rebuild or not current:
+            save_cleaned_data(df_cleaned, cleaned_path)
+            if not sketch:
+                record_output(data_path, cleaned_path, appended=sha256s)
+            store_cached(df_cleaned, cleaned_path, stage='parsed')
+        return df_cleaned
+
+    if chunksize and not appended:
+        # Bounded-memory cleaning. The cleaned CSV is parsed back a chunk at a
+        # time straight into a column store, which is then mapped rather than
+        # loaded, so memory stays flat whatever the input size.
+        preprocess_data_streaming(data_path, cleaned_path, chunksize=chunksize,
+                                  quantiles='sketch' if sketch else 'exact')
+        chunks = (apply_schema(chunk) for chunk in pd.read_csv(cleaned_path, dtype=parse_dtypes(),
+                                                                chunksize=chunksize))
+        if sketch:
+            store_cached_chunks(chunks, cleaned_path, stage='parsed')
+            return load_cached(cleaned_path, stage='parsed')
+        store_cached_chunks(chunks, data_path)
+        record_output(data_path, cleaned_path)
+        df_cleaned = load_cached(data_path)
+        store_cached(df_cleaned, cleaned_path, stage='parsed')
+        return df_cleaned
+
+    # Appended files are cleaned together with the raw CSV, in memory
+    df = load_data(data_path)
+    if appended:
+        print(f"Including {len(appended)} appended file(s)")
+        df = apply_schema(pd.concat([df] + [load_data(source['path']) for source in appended], ignore_index=True))
+    raw_counts = impute_counts(df)
+    # Year partitions in a process pool for large frames; same result as the serial path
+    df_cleaned = preprocess_data_parallel(df, workers=workers)
+    save_cleaned_data(df_cleaned, cleaned_path)
+    CleaningState.from_frame(raw_counts, df_cleaned).save(cleaning_state_path(cleaned_path))
+    store_cached(df_cleaned, data_path, appended=sha256s)
+    record_output(data_path, cleaned_path, appended=sha256s)
+    # Carry on with the memory-mapped copy: the in-memory frame is released,
+    # the 'parsed' entry for the GUI hard-links the same files, and render
+    # workers open them by path instead of receiving a copy
+    mapped = load_cached(data_path, appended=sha256s)
+    if mapped is not None:
+        df_cleaned = mapped
+    store_cached(df_cleaned, cleaned_path, stage='parsed')
+    return df_cleaned
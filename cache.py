@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+import pandas as pd
+
+from preprocessing import PREPROCESSING_VERSION
+from store import open_store, write_store, write_store_chunks
+
+CACHE_DIR = Path(__file__).parent / "data" / "cache"
+INDEX_NAME = "index.json"
+
+# Cache stages:
+#   'cleaned' - output of preprocess_data for a raw CSV (depends on the cleaning logic)
+#   'parsed'  - a cleaned CSV read back with its dtypes
+#
+# A cleaned frame extended with appended files (see build.run_append) is
+# cached under an entry of its own, keyed by the raw file and the appended
+# files' sha256 values (`appended`), so the raw file's entry stays the frame
+# cleaned from that file alone.
+STAGE_VERSIONS = {
+    'cleaned': PREPROCESSING_VERSION,
+    'parsed': 3,
+}
+
+def file_fingerprint(path, previous=None):
+    # Size and mtime are cheap; the content hash is only recomputed when they
+    # change, so a warm start never re-reads a multi-GB file.
+    st = os.stat(path)
+    fp = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+    if previous and previous.get('size') == fp['size'] and previous.get('mtime_ns') == fp['mtime_ns']:
+        fp['sha256'] = previous['sha256']
+    else:
+        with open(path, 'rb') as f:
+            fp['sha256'] = hashlib.file_digest(f, 'sha256').hexdigest()
+    return fp
+
+def cache_key(fingerprint, stage, appended=()):
+    raw = f"{stage}:{STAGE_VERSIONS[stage]}:{fingerprint['size']}:{fingerprint['sha256']}"
+    raw += ''.join(f":{sha256}" for sha256 in appended)
+    return hashlib.sha256(raw.encode()).hexdigest()[:24]
+
+def load_cached(source_path, stage='cleaned', cache_dir=CACHE_DIR, appended=()):
+    index = _read_index(cache_dir)
+    entry = index.get(_entry_name(source_path, stage, appended))
+    if entry is None or not os.path.exists(source_path):
+        return None
+
+    fp = file_fingerprint(source_path, previous=entry['fingerprint'])
+    if cache_key(fp, stage, appended) != entry['key']:
+        return None
+    data_path = Path(cache_dir) / entry['file']
+    if not data_path.exists():
+        return None
+
+    df = _read_frame(data_path, entry['format'])
+    if fp != entry['fingerprint']:
+        # Touched but unchanged: remember the new mtime so the next hit skips hashing
+        entry['fingerprint'] = fp
+        _write_index(cache_dir, index)
+    return df
+
+def store_cached(df, source_path, stage='cleaned', cache_dir=CACHE_DIR, appended=()):
+    return _store(lambda path, fmt: _write_frame(df, path, fmt), source_path, stage, cache_dir, appended)
+
+def store_cached_chunks(chunks, source_path, stage='cleaned', cache_dir=CACHE_DIR):
+    # store_cached for a frame given as chunks of rows, written as a column
+    # store without holding the frame in memory
+    return _store(lambda path, fmt: write_store_chunks(chunks, path), source_path, stage, cache_dir, fmt='columns')
+
+def _store(write, source_path, stage, cache_dir, appended=(), fmt=None):
+    os.makedirs(cache_dir, exist_ok=True)
+    index = _read_index(cache_dir)
+    name = _entry_name(source_path, stage, appended)
+    previous = index.get(name)
+
+    fp = file_fingerprint(source_path, previous=previous['fingerprint'] if previous else None)
+    key = cache_key(fp, stage, appended)
+    fmt = fmt or _frame_format()
+    filename = f"{key}.{fmt}"
+    write(Path(cache_dir) / filename, fmt)
+
+    if previous and previous['file'] != filename:
+        _remove(Path(cache_dir, previous['file']))
+    index[name] = {'key': key, 'file': filename, 'format': fmt, 'fingerprint': fp}
+    _write_index(cache_dir, index)
+    return Path(cache_dir) / filename
+
+def record_output(source_path, output_path, stage='cleaned', cache_dir=CACHE_DIR, appended=()):
+    # Remember that output_path (e.g. cleaned_data.csv) was written from the
+    # cached frame of source_path; replacing that frame forgets it
+    index = _read_index(cache_dir)
+    entry = index.get(_entry_name(source_path, stage, appended))
+    if entry is None:
+        return
+    entry.setdefault('outputs', {})[str(output_path)] = file_fingerprint(output_path)
+    _write_index(cache_dir, index)
+
+def output_current(source_path, output_path, stage='cleaned', cache_dir=CACHE_DIR, appended=()):
+    # Whether output_path is still the file written from source_path's cached
+    # frame (not since overwritten from another source)
+    entry = _read_index(cache_dir).get(_entry_name(source_path, stage, appended))
+    recorded = entry.get('outputs', {}).get(str(output_path)) if entry else None
+    if recorded is None or not os.path.exists(output_path):
+        return False
+    return file_fingerprint(output_path, previous=recorded)['sha256'] == recorded['sha256']
+
+def entry_key(source_path, stage='cleaned', cache_dir=CACHE_DIR):
+    # Content key of the cached frame for source_path, usable as a dataset
+    # fingerprint by callers that hold the frame in memory
+    entry = _read_index(cache_dir).get(_entry_name(source_path, stage))
+    return entry['key'] if entry else None
+
+def _entry_name(source_path, stage, appended=()):
+    # One entry per source and stage, plus one for the source with its appended
+    # files (replaced as more are appended)
+    return f"{stage}{'+appended' if appended else ''}:{Path(source_path).resolve()}"
+
+def _read_index(cache_dir):
+    path = Path(cache_dir) / INDEX_NAME
+    if not path.exists():
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _write_index(cache_dir, index):
+    path = Path(cache_dir) / INDEX_NAME
+    tmp = path.with_suffix('.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp, path)
+
+# Frames are cached as memory-mapped column stores (see store.py): a hit is
+# opened in constant time and shares its pages with every other process that
+# opens it. Entries written as parquet / pickle by older versions still load.
+def _frame_format():
+    return 'columns'
+
+def _write_frame(df, path, fmt):
+    if fmt == 'columns':
+        write_store(df, path)
+        return
+    tmp = path.with_name(path.name + '.tmp')
+    if fmt == 'parquet':
+        df.to_parquet(tmp, index=False)
+    else:
+        df.reset_index(drop=True).to_pickle(tmp)
+    os.replace(tmp, path)
+
+def _read_frame(path, fmt):
+    if fmt == 'columns':
+        return open_store(path)
+    if fmt == 'parquet':
+        return pd.read_parquet(path)
+    return pd.read_pickle(path)
+
+def _remove(path):
+    if path.is_dir():
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        path.unlink(missing_ok=True)
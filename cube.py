@@ -0,0 +1,240 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from aggregates import cached, remember
+from store import is_store, open_store, write_store
+
+# Aggregate cube of DALYs over the dimensions every summary plot groups by.
+#
+# One row per non-empty cell (combination of dimension values) holding the
+# non-missing count, the sum and M2 (the sum of squared deviations from the
+# cell mean) of DALYs. Any groupby over a subset of the dimensions is a
+# roll-up of the cells: counts and sums add up, and M2 combines with the
+# cells' spread around the group mean (Chan's parallel formula), so means and
+# standard deviations come out as they would from the rows. group_means()
+# answers from the cube whenever it can (see aggregates.py).
+#
+# Rows whose dimension values are missing are kept in cells of their own so
+# roll-ups over the other dimensions still count them.
+#
+# The cube is saved as a column store next to the cleaned data, with a
+# fingerprint per year of the rows it was built from (the wrapping sum of the
+# row hashes over every dimension and the measure, so it does not depend on
+# row order). On refresh, years whose fingerprint is unchanged keep their
+# cells and only new or changed years are aggregated, so appending a year of
+# data costs one year of work.
+
+CUBE_DIMENSIONS = ['Country', 'Year', 'Disease Category', 'Gender', 'Age Group', 'Income Group', 'Treatment Type']
+CUBE_MEASURE = 'DALYs'
+CUBE_VERSION = 2
+
+class Cube:
+    def __init__(self, cells, dimensions, measure=CUBE_MEASURE, fingerprints=None):
+        # cells: the dimension columns plus 'n', 'sum' and 'm2'; fingerprints:
+        # year -> row fingerprint of the rows the cells came from (None when
+        # unknown, e.g. for a slice)
+        self.cells = cells
+        self.dimensions = list(dimensions)
+        self.measure = measure
+        self.fingerprints = fingerprints
+        # Per-dimension codes and the measure arrays, derived on first use
+        self._codes = {}
+
+    @classmethod
+    def from_frame(cls, df, dimensions=CUBE_DIMENSIONS, measure=CUBE_MEASURE):
+        dims = [d for d in dimensions if d in df.columns]
+        grouped = df[measure].groupby([df[d] for d in dims], observed=True, sort=True, dropna=False)
+        cells = grouped.agg(['count', 'sum'])
+        cells['m2'] = grouped.var(ddof=0).fillna(0.0).to_numpy() * cells['count'].to_numpy()
+        cells = cells.rename(columns={'count': 'n'}).reset_index()
+        return cls(cells, dims, measure, year_fingerprints(df, dims, measure) if 'Year' in dims else None)
+
+    def __len__(self):
+        return len(self.cells)
+
+    def rollup(self, by=()):
+        # count / sum / mean / std / sem per group of `by` (all rows for an
+        # empty `by`), indexed like the equivalent observed, sorted groupby
+        by = [by] if isinstance(by, str) else list(by)
+        self._check(by)
+        return cached(self.cells, ('cube_rollup', tuple(by)), lambda: self._rollup(by))
+
+    def slice(self, dimension, value):
+        # The sub-cube at one value of `dimension`, without that dimension
+        self._check([dimension])
+        cells = self.cells[self.cells[dimension] == value].drop(columns=dimension)
+        return Cube(cells.reset_index(drop=True), [d for d in self.dimensions if d != dimension], self.measure)
+
+    def dice(self, selection):
+        # The sub-cube restricted to {dimension: allowed values}
+        self._check(list(selection))
+        keep = np.ones(len(self.cells), dtype=bool)
+        for dimension, values in selection.items():
+            keep &= self.cells[dimension].isin(values).to_numpy()
+        return Cube(self.cells[keep].reset_index(drop=True), self.dimensions, self.measure)
+
+    def _check(self, dims):
+        missing = [d for d in dims if d not in self.dimensions]
+        if missing:
+            raise KeyError(f"Not cube dimensions: {missing}; the cube has {self.dimensions}")
+
+    def _measures(self):
+        # (n, sum, m2, cell mean) as float arrays; the mean is 0 for empty cells
+        if 'measures' not in self._codes:
+            n = self.cells['n'].to_numpy(dtype=float)
+            total = self.cells['sum'].to_numpy(dtype=float)
+            m2 = self.cells['m2'].to_numpy(dtype=float)
+            self._codes['measures'] = (n, total, m2, np.divide(total, n, out=np.zeros_like(total), where=n > 0))
+        return self._codes['measures']
+
+    def _dimension_codes(self, dim):
+        # (codes per cell, level values) with -1 for missing values
+        if dim not in self._codes:
+            column = self.cells[dim]
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                self._codes[dim] = (column.cat.codes.to_numpy().astype(np.int64), column.array.categories)
+            else:
+                codes, levels = pd.factorize(column, sort=True)
+                self._codes[dim] = (codes.astype(np.int64), levels)
+        return self._codes[dim]
+
+    def _rollup(self, by):
+        n, total, m2, cell_mean = self._measures()
+
+        # Flat group number per cell (mixed radix over the `by` dimensions)
+        flat = np.zeros(len(self.cells), dtype=np.int64)
+        valid = None
+        sizes = []
+        for dim in by:
+            codes, levels = self._dimension_codes(dim)
+            if (codes < 0).any():
+                valid = codes >= 0 if valid is None else valid & (codes >= 0)
+            flat = flat * len(levels) + np.maximum(codes, 0)
+            sizes.append(len(levels))
+        size = int(np.prod(sizes)) if by else 1
+        if valid is not None:
+            flat, n, total, m2, cell_mean = (a[valid] for a in (flat, n, total, m2, cell_mean))
+
+        group_n = np.bincount(flat, n, size)
+        group_sum = np.bincount(flat, total, size)
+        observed = np.bincount(flat, minlength=size) > 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            group_mean = group_sum / group_n
+            # Chan: within-cell M2 plus each cell's spread around its group mean
+            group_m2 = np.bincount(flat, m2 + n * (cell_mean - group_mean[flat]) ** 2, size)
+            std = np.sqrt(np.where(group_n > 1, group_m2 / (group_n - 1), np.nan))
+
+        groups = np.flatnonzero(observed)
+        summary = pd.DataFrame({
+            'count': group_n[groups].astype(np.int64),
+            'sum': group_sum[groups],
+            'mean': group_mean[groups],
+            'std': std[groups],
+        }, index=self._index(by, groups, sizes))
+        summary['sem'] = summary['std'] / np.sqrt(summary['count'])
+        return summary
+
+    def _index(self, by, groups, sizes):
+        if not by:
+            return pd.RangeIndex(len(groups))
+        arrays = []
+        for dim, codes in zip(by, np.unravel_index(groups, sizes)):
+            column, levels = self.cells[dim], self._dimension_codes(dim)[1]
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                arrays.append(pd.Categorical.from_codes(codes, dtype=column.dtype))
+            else:
+                arrays.append(np.asarray(levels)[codes])
+        if len(by) == 1:
+            return pd.Index(arrays[0], name=by[0])
+        return pd.MultiIndex.from_arrays(arrays, names=by)
+
+    def update(self, df):
+        # (cube for df, years aggregated): cells of years whose rows are
+        # unchanged are kept, everything else is rebuilt from df
+        if (set(self.dimensions) != {d for d in CUBE_DIMENSIONS if d in df.columns}
+                or 'Year' not in self.dimensions or self.fingerprints is None):
+            return Cube.from_frame(df), _years(df)
+
+        fingerprints = year_fingerprints(df, self.dimensions, self.measure)
+        changed = {year for year in set(self.fingerprints) | set(fingerprints)
+                   if self.fingerprints.get(year) != fingerprints.get(year)}
+        if not changed:
+            return self, []
+
+        keep = self.cells[~self.cells['Year'].isin(changed)]
+        fresh = Cube.from_frame(df[df['Year'].isin(changed)], self.dimensions, self.measure).cells
+        for dim in self.dimensions:
+            # Align category lists with the new data so the halves concatenate
+            if isinstance(df[dim].dtype, pd.CategoricalDtype):
+                keep = keep.assign(**{dim: keep[dim].cat.set_categories(df[dim].cat.categories)})
+                fresh = fresh.assign(**{dim: fresh[dim].cat.set_categories(df[dim].cat.categories)})
+        cells = pd.concat([keep, fresh], ignore_index=True)
+        cells = cells.sort_values(self.dimensions, kind='stable', na_position='last', ignore_index=True)
+        return Cube(cells, self.dimensions, self.measure, fingerprints), sorted(changed)
+
+    def save(self, path):
+        cells = self.cells.copy(deep=False)
+        cells.attrs = {'cube_version': CUBE_VERSION, 'dimensions': self.dimensions, 'measure': self.measure}
+        if self.fingerprints is not None:
+            # JSON object keys are strings
+            cells.attrs['fingerprints'] = {str(year): value for year, value in self.fingerprints.items()}
+        write_store(cells, path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        # None when there is no cube at path or it was written by another version
+        if not is_store(path):
+            return None
+        cells = open_store(path)
+        if cells.attrs.get('cube_version') != CUBE_VERSION:
+            return None
+        fingerprints = cells.attrs.get('fingerprints')
+        if fingerprints is not None:
+            fingerprints = {int(year): int(value) for year, value in fingerprints.items()}
+        return cls(cells, cells.attrs['dimensions'], cells.attrs['measure'], fingerprints)
+
+def _years(df):
+    return sorted(int(year) for year in df['Year'].dropna().unique()) if 'Year' in df.columns else []
+
+def year_fingerprints(df, dimensions=CUBE_DIMENSIONS, measure=CUBE_MEASURE):
+    # {year: wrapping uint64 sum of the row hashes over the dimensions and the
+    # measure}; any change to a row's values changes its year's fingerprint
+    columns = [d for d in dimensions if d in df.columns] + [measure]
+    hashes = pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+    codes, years = pd.factorize(df['Year'], sort=True)
+    present = codes >= 0
+    codes, hashes = codes[present], hashes[present]
+    order = np.argsort(codes, kind='stable')
+    codes, hashes = codes[order], hashes[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.empty(0, dtype=np.int64)
+    sums = np.add.reduceat(hashes, starts) if len(starts) else hashes
+    return {int(years[code]): int(value) for code, value in zip(codes[starts], sums)}
+
+def cube_path(cleaned_path):
+    return os.path.splitext(str(cleaned_path))[0] + '.cube'
+
+def frame_cube(df):
+    # The cube for df: one attached by refresh_cube / attach_cube, otherwise
+    # built from the rows once per frame
+    return cached(df, ('cube',), lambda: Cube.from_frame(df))
+
+def attach_cube(df, cube):
+    return remember(df, ('cube',), cube)
+
+def refresh_cube(df, path):
+    # Load the cube saved at path, bring it up to date with df (rebuilding only
+    # new or changed years), save it if anything changed and attach it to df.
+    # Returns (cube, years aggregated).
+    cube = Cube.load(path)
+    if cube is None:
+        cube = Cube.from_frame(df)
+        years = _years(df)
+        cube.save(path)
+    else:
+        cube, years = cube.update(df)
+        if years:
+            cube.save(path)
+    return attach_cube(df, cube), years
@@ -1,40 +1,49 @@
-import seaborn as sns
-import matplotlib.pyplot as plt
 import pandas as pd
 
-def plot_dalys_histogram(df):
-    sns.histplot(df['DALYs'], bins=30, kde=True)
-    plt.title("Distribution of DALYs")
-    plt.xlabel("DALYs")
-    plt.savefig("assets/dalys_histogram.png")
-    plt.clf()
+from aggregates import box_stats, group_means, histogram
+from features import with_features
+from figures import draw_bars, draw_boxes, draw_histogram, get_axes, save_figure
+from telemetry import traced
 
-def plot_dalys_by_gender(df):
-    sns.barplot(data=df, x='Gender', y='DALYs', estimator='mean')
-    plt.title("Average DALYs by Gender")
-    plt.savefig("assets/dalys_by_gender.png")
-    plt.clf()
+@traced
+def plot_dalys_histogram(df, ax=None, save_path="assets/dalys_histogram.png"):
+    fig, axes = get_axes(ax)
+    draw_histogram(axes, histogram(df, 'DALYs', bins=30), "DALYs")
+    axes.set_title("Distribution of DALYs")
+    save_figure(fig, ax, save_path)
+    return axes
 
-def plot_dalys_by_age_group(df):
-    sns.boxplot(data=df, x='Age Group', y='DALYs')
-    plt.title("DALYs by Age Group")
-    plt.savefig("assets/dalys_by_age_group.png")
-    plt.clf()
+@traced
+def plot_dalys_by_gender(df, ax=None, save_path="assets/dalys_by_gender.png", ci=None):
+    fig, axes = get_axes(ax)
+    draw_bars(axes, group_means(df, 'Gender', ci=ci), 'Gender')
+    axes.set_title("Average DALYs by Gender")
+    save_figure(fig, ax, save_path)
+    return axes
 
-def plot_dalys_by_category(df):
-    sns.barplot(data=df, x='Disease Category', y='DALYs', estimator='mean')
-    plt.xticks(rotation=45)
-    plt.title("Average DALYs by Disease Category")
-    plt.tight_layout()
-    plt.savefig("assets/dalys_by_category.png")
-    plt.clf()
+@traced
+def plot_dalys_by_age_group(df, ax=None, save_path="assets/dalys_by_age_group.png"):
+    fig, axes = get_axes(ax)
+    draw_boxes(axes, box_stats(df, 'Age Group'), 'Age Group')
+    axes.set_title("DALYs by Age Group")
+    save_figure(fig, ax, save_path)
+    return axes
 
-def plot_dalys_by_disease_type(df):
-    communicable = ['Parasitic', 'Viral', 'Bacterial', 'Infectious']
-    df['Disease Type'] = df['Disease Category'].apply(
-        lambda x: 'Infectious' if x in communicable else 'Non-Communicable'
-    )
-    sns.boxplot(data=df, x='Disease Type', y='DALYs')
-    plt.title("DALYs by Disease Type")
-    plt.savefig("assets/dalys_by_disease_type.png")
-    plt.clf()
+@traced
+def plot_dalys_by_category(df, ax=None, save_path="assets/dalys_by_category.png", ci=None):
+    fig, axes = get_axes(ax)
+    draw_bars(axes, group_means(df, 'Disease Category', ci=ci), 'Disease Category')
+    axes.tick_params(axis='x', rotation=45)
+    axes.set_title("Average DALYs by Disease Category")
+    save_figure(fig, ax, save_path, tight=True)
+    return axes
+
+@traced
+def plot_dalys_by_disease_type(df, ax=None, save_path="assets/dalys_by_disease_type.png"):
+    fig, axes = get_axes(ax)
+    # Derived without touching the caller's frame (a no-op on cleaned data)
+    data = with_features(df, ['Disease Type'])
+    draw_boxes(axes, box_stats(data, 'Disease Type'), 'Disease Type')
+    axes.set_title("DALYs by Disease Type")
+    save_figure(fig, ax, save_path)
+    return axes
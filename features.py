@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+from aggregates import cached
+from quantiles import qcut
+
+# Registry of derived columns.
+#
+# A feature is declared once with the columns it needs and a vectorized
+# function that returns the new Series. Features are computed on first use and
+# memoised with the source frame; callers get them through derive() or
+# with_features(), neither of which modifies the frame they were given.
+# Categorical inputs are mapped through their (few) categories rather than
+# row by row.
+
+COMMUNICABLE = ['Parasitic', 'Viral', 'Bacterial', 'Infectious']
+DISEASE_TYPES = ['Infectious', 'Non-Communicable']
+
+AGE_BANDS = {
+    '0-18': 'Youth',
+    '19-35': 'Working Age',
+    '36-60': 'Working Age',
+    '61+': 'Senior',
+}
+
+FEATURES = {}
+
+def feature(name, requires):
+    def register(fn):
+        FEATURES[name] = (list(requires), fn)
+        return fn
+    return register
+
+def derive(df, name):
+    # The column itself when the frame already has it, else the registered feature
+    if name in df.columns:
+        return df[name]
+    requires, fn = FEATURES[name]
+    missing = [col for col in requires if col not in df.columns]
+    if missing:
+        raise KeyError(f"Feature '{name}' needs columns {missing}")
+    return cached(df, ('feature', name), lambda: fn(df))
+
+def with_features(df, names):
+    # A frame with the requested features added; the same object is returned
+    # on repeated calls so per-frame caches downstream keep hitting
+    names = [name for name in names if name not in df.columns]
+    if not names:
+        return df
+    return cached(df, ('with_features', tuple(names)),
+                  lambda: df.assign(**{name: derive(df, name) for name in names}))
+
+def map_categories(series, mapping, labels, default=None):
+    # Map each distinct value once; the result is categorical over `labels`
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = series.cat.categories
+        codes = series.cat.codes.to_numpy()
+    else:
+        codes, categories = pd.factorize(series)
+    targets = pd.Index(labels)
+    mapped = pd.Index([mapping.get(value, default) for value in categories], dtype=object)
+    lookup = np.append(targets.get_indexer(mapped), targets.get_indexer([default]))
+    # Missing values (code -1) pick up the default through the appended slot
+    return pd.Series(pd.Categorical.from_codes(lookup[codes], categories=labels),
+                     index=series.index, name=series.name)
+
+@feature('Disease Type', requires=['Disease Category'])
+def disease_type(df):
+    mapping = {category: 'Infectious' for category in COMMUNICABLE}
+    return map_categories(df['Disease Category'], mapping, DISEASE_TYPES, default='Non-Communicable').rename('Disease Type')
+
+@feature('Age Band', requires=['Age Group'])
+def age_band(df):
+    labels = list(dict.fromkeys(AGE_BANDS.values()))
+    return map_categories(df['Age Group'], AGE_BANDS, labels).rename('Age Band')
+
+@feature('Income Decile', requires=['Per Capita Income (USD)'])
+def income_decile(df):
+    labels = [f'D{i}' for i in range(1, 11)]
+    # Same bins as pd.qcut, from the column sorted once per frame
+    return qcut(df, 'Per Capita Income (USD)', 10, labels=labels).rename('Income Decile')
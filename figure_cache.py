@@ -0,0 +1,65 @@
+from collections import OrderedDict
+
+# LRU cache of rendered GUI figures.
+#
+# Keys are (dataset fingerprint, plot type, canvas width, canvas height, dpi,
+# CI mode). Values are dicts holding at least the Figure and, once shown, the
+# canvas that already has it rasterised, so switching back to a cached plot
+# only repaints the existing buffer. The cache is bounded by an estimate of
+# the bytes each entry holds (RGBA buffer plus artist overhead).
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+class FigureCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry, nbytes, keep=None):
+        # Returns the entries evicted to make room; `keep` is never evicted
+        # (the entry currently on screen)
+        if key in self._entries:
+            self.total_bytes -= self._entries.pop(key)['nbytes']
+        entry['nbytes'] = nbytes
+        self._entries[key] = entry
+        self.total_bytes += nbytes
+
+        evicted = []
+        for old_key in list(self._entries):
+            if self.total_bytes <= self.max_bytes:
+                break
+            if old_key == key or old_key == keep:
+                continue
+            evicted.append(self._pop(old_key))
+        return evicted
+
+    def evict_where(self, predicate):
+        return [self._pop(key) for key in list(self._entries) if predicate(key)]
+
+    def clear(self):
+        return self.evict_where(lambda key: True)
+
+    def holds(self, canvas):
+        return any(entry.get('canvas') is canvas for entry in self._entries.values())
+
+    def _pop(self, key):
+        entry = self._entries.pop(key)
+        self.total_bytes -= entry['nbytes']
+        return entry
+
+def estimate_figure_bytes(width_px, height_px, pixel_ratio=1.0):
+    # Agg keeps one RGBA buffer; the artists of our plots cost about as much again
+    return int(width_px * height_px * pixel_ratio ** 2 * 4 * 2)
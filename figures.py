@@ -0,0 +1,98 @@
+import numpy as np
+from matplotlib.colors import LogNorm
+from matplotlib.figure import Figure
+
+# Plot functions draw onto the caller's Axes (e.g. the GUI canvas) or onto a
+# standalone Figure that never touches pyplot's global state, which keeps
+# them safe to run in worker processes and threads.
+
+def get_axes(ax=None, figsize=None):
+    if ax is not None:
+        return ax.figure, ax
+    fig = Figure(figsize=figsize)
+    return fig, fig.add_subplot(111)
+
+def save_figure(fig, ax_given, save_path, tight=False):
+    # Figures drawn into a caller's Axes are left for the caller to lay out
+    # and show (possibly on another thread, so no text measuring here)
+    if ax_given is None and save_path:
+        if tight:
+            fig.tight_layout()
+        fig.savefig(save_path)
+
+# Drawing from pre-aggregated summaries (see aggregates.py)
+
+def draw_bars(ax, summary, xlabel, ylabel='DALYs', horizontal=False, errors=True):
+    labels = [str(label) for label in summary.index]
+    positions = range(len(labels))
+    err = None
+    legend = None
+    if errors and 'ci_low' in summary:
+        err = [summary['mean'] - summary['ci_low'], summary['ci_high'] - summary['mean']]
+    if errors:
+        legend = summary.attrs.get('ci_label')
+    if horizontal:
+        ax.barh(positions, summary['mean'], xerr=err, color='C0', ecolor='.26', label=legend)
+        ax.set_yticks(list(positions), labels)
+        ax.invert_yaxis()
+        ax.set_xlabel(ylabel)
+        ax.set_ylabel(xlabel)
+    else:
+        ax.bar(positions, summary['mean'], yerr=err, color='C0', ecolor='.26', label=legend)
+        ax.set_xticks(list(positions), labels)
+        ax.set_xlabel(xlabel)
+        ax.set_ylabel(ylabel)
+    if legend:
+        ax.legend(loc='lower right', fontsize='small')
+
+def draw_lines(ax, summary, x, hue=None, ylabel='DALYs'):
+    # Mean per x (one line per hue level) with a shaded CI band when present
+    table = summary.reset_index()
+    levels = [(None, table)] if hue is None else table.groupby(hue, observed=True, sort=True)
+    for i, (level, rows) in enumerate(levels):
+        color = f"C{i}"
+        ax.plot(rows[x], rows['mean'], color=color, label=None if level is None else str(level))
+        if 'ci_low' in rows:
+            ax.fill_between(rows[x], rows['ci_low'], rows['ci_high'], color=color, alpha=0.2, linewidth=0)
+    ax.set_xlabel(x)
+    ax.set_ylabel(ylabel)
+    label = summary.attrs.get('ci_label')
+    if hue is not None:
+        ax.legend(title=f"{hue} - {label}" if label else hue, fontsize='small')
+    elif label:
+        ax.legend([label], fontsize='small')
+
+def draw_boxes(ax, stats, xlabel, ylabel='DALYs'):
+    ax.bxp(stats, showfliers=True, patch_artist=True, widths=0.6,
+           boxprops={'facecolor': 'C0', 'edgecolor': '.26'},
+           medianprops={'color': '.26'},
+           flierprops={'marker': 'd', 'markerfacecolor': '.26', 'markersize': 4})
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+
+def draw_histogram(ax, hist, xlabel):
+    edges = hist['edges']
+    ax.bar(edges[:-1], hist['counts'], width=edges[1:] - edges[:-1], align='edge',
+           color='C0', alpha=0.5, edgecolor='white', linewidth=0.5)
+    ax.plot(hist['kde_x'], hist['kde_y'], color='C0')
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel('Count')
+
+def draw_density(ax, grid, xlabel, ylabel='DALYs', hue=None):
+    # 2D histogram from lod.density_grid; empty cells are left blank. The
+    # label gives the rows actually binned, which are a thinned sample of
+    # very large frames.
+    counts = np.ma.masked_equal(grid['counts'].T, 0)
+    mesh = ax.pcolormesh(grid['xedges'], grid['yedges'], counts, cmap='viridis',
+                         norm=LogNorm(vmin=1, vmax=max(counts.max(), 1)), rasterized=True)
+    colorbar = ax.figure.colorbar(mesh, ax=ax)
+    if grid['binned'] < grid['rows']:
+        colorbar.set_label(f"Rows per cell (sample of {grid['binned']:,} of {grid['rows']:,} rows)")
+    else:
+        colorbar.set_label(f"Rows per cell (n={grid['rows']:,})")
+    if hue is not None:
+        # Every row is binned together; say so where the hue legend would be
+        ax.plot([], [], ' ', label=f"All {hue} values combined")
+        ax.legend(fontsize='small')
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
@@ -5,42 +5,20 @@ from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                             QHBoxLayout, QPushButton, QComboBox, QLabel, 
                             QFileDialog, QMessageBox, QSizePolicy, QStyle)
 from PyQt5.QtCore import Qt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
-import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
-from scipy.stats import pearsonr
+import functools
+import importlib
 
 project_root = Path(__file__).parent.parent.resolve()
 sys.path.append(str(project_root))
 
+# Only Qt and the small GUI helpers are imported up front so the window
+# appears quickly; matplotlib is imported with the first canvas or figure, and
+# pandas, scipy, seaborn and the analysis modules by the tasks that first need
+# them (on worker threads).
 try:
-    from visualization import (
-        plot_income_vs_dalys,
-        plot_education_vs_dalys,
-        plot_urbanization_vs_dalys,
-        plot_correlation_matrix,
-        plot_treatment_vs_dalys,
-        plot_country_vs_dalys,
-        plot_healthcare_vs_dalys,
-        plot_dalys_over_time,
-        plot_dalys_over_time_by_income,
-        plot_dalys_vs_hospital_beds,
-        plot_dalys_vs_access
-    )
-    from eda import (
-        plot_dalys_histogram,
-        plot_dalys_by_gender,
-        plot_dalys_by_age_group,
-        plot_dalys_by_category,
-        plot_dalys_by_disease_type
-    )
-    from preprocessing import (
-        load_data,
-        preprocess_data,
-        save_cleaned_data
-    )
+    import telemetry
+    from gui_workers import JobRunner, TelemetryBridge
+    from figure_cache import FigureCache, estimate_figure_bytes
 except ImportError as e:
     print(f"Import error: {e}")
     print("Current Python path:", sys.path)
@@ -120,16 +98,170 @@ class TitleBar(QWidget):
             self.parent.showMaximized()
             self.maximize_btn.setIcon(self.style().standardIcon(QStyle.SP_TitleBarNormalButton))
 
-class MplCanvas(FigureCanvas):
-    def __init__(self, parent=None, width=10, height=8, dpi=100):
-        self.fig = Figure(figsize=(width, height), dpi=dpi)
-        super().__init__(self.fig)
-        self.axes = self.fig.add_subplot(111)
+def make_canvas(parent=None, width=10, height=8, dpi=100, figure=None):
+    # A figure built in a worker thread can be handed over ready-made
+    return _canvas_class()(parent, width, height, dpi, figure)
+
+@functools.cache
+def _canvas_class():
+    # The matplotlib Qt backend is imported when the first canvas is made
+    from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+    from matplotlib.figure import Figure
+
+    class MplCanvas(FigureCanvas):
+        def __init__(self, parent, width, height, dpi, figure):
+            self.fig = figure if figure is not None else Figure(figsize=(width, height), dpi=dpi)
+            super().__init__(self.fig)
+            self.setParent(parent)
+            self.axes = self.fig.axes[0] if self.fig.axes else self.fig.add_subplot(111)
+
+        def clear(self):
+            self.fig.clf()
+            self.axes = self.fig.add_subplot(111)
+            self.draw()
+
+    return MplCanvas
+
+# Combo box label -> (module, plot function); every function accepts ax=.
+# Modules are imported on first use.
+PLOT_FUNCTIONS = {
+    "DALYs Histogram": ('eda', 'plot_dalys_histogram'),
+    "DALYs by Gender": ('eda', 'plot_dalys_by_gender'),
+    "DALYs by Age Group": ('eda', 'plot_dalys_by_age_group'),
+    "DALYs by Disease Category": ('eda', 'plot_dalys_by_category'),
+    "DALYs by Disease Type": ('eda', 'plot_dalys_by_disease_type'),
+    "Income vs DALYs": ('visualization', 'plot_income_vs_dalys'),
+    "Education vs DALYs": ('visualization', 'plot_education_vs_dalys'),
+    "Urbanization vs DALYs": ('visualization', 'plot_urbanization_vs_dalys'),
+    "Correlation Matrix": ('visualization', 'plot_correlation_matrix'),
+    "DALYs by Treatment": ('visualization', 'plot_treatment_vs_dalys'),
+    "Top Countries by DALYs": ('visualization', 'plot_country_vs_dalys'),
+    "DALYs vs Doctors": ('visualization', 'plot_healthcare_vs_dalys'),
+    "DALYs Over Time": ('visualization', 'plot_dalys_over_time'),
+    "DALYs Over Time by Income": ('visualization', 'plot_dalys_over_time_by_income'),
+    "DALYs vs Hospital Beds": ('visualization', 'plot_dalys_vs_hospital_beds'),
+    "DALYs vs Healthcare Access": ('visualization', 'plot_dalys_vs_access'),
+}
+
+# Trace lines shown in the status bar tooltip
+TELEMETRY_TOOLTIP_LINES = 15
+# How long closing the window waits for cancelled jobs to stop
+CLOSE_TIMEOUT_MS = 5000
+
+def plot_function(plot_type):
+    module, name = PLOT_FUNCTIONS[plot_type]
+    return getattr(importlib.import_module(module), name)
+
+# ---------------------------------------------------------------------------
+# Background tasks. Each runs on the thread pool and receives the Job first,
+# which it uses to report progress and to bail out when cancelled.
+# ---------------------------------------------------------------------------
+
+def upload_task(job, file_path, cleaned_path):
+    from cache import entry_key, load_cached, store_cached
+    from preprocessing import load_data, preprocess_data, save_cleaned_data
+
+    with telemetry.stage('gui.upload', path=file_path) as record:
+        # Reuse the cleaned frame if this exact file was processed before
+        job.progress(f"Checking cache for {os.path.basename(file_path)}...")
+        data = load_cached(file_path)
+        record['cached'] = data is not None
+        if data is None:
+            job.progress(f"Reading {os.path.basename(file_path)}...")
+            raw_df = load_data(file_path)
+            record['rows_in'] = len(raw_df)
+            job.progress("Preprocessing...")
+            data = preprocess_data(raw_df)
+            job.check()
+            store_cached(data, file_path)
+            # Keep the memory-mapped copy rather than the private one
+            data = load_cached(file_path)
+
+        # Auto-save cleaned data
+        job.progress("Saving cleaned data...")
+        save_cleaned_data(data, cleaned_path)
+        store_cached(data, cleaned_path, stage='parsed')
+        fingerprint = entry_key(cleaned_path, stage='parsed')
+        warm_statistics(job, data, cleaned_path)
+        record['rows_out'] = len(data)
+    return data, fingerprint, f"Uploaded and processed: {os.path.basename(file_path)}"
+
+def load_task(job, cleaned_path):
+    import pandas as pd
+    from cache import entry_key, load_cached, store_cached
+    from schema import apply_schema, parse_dtypes
+
+    if not os.path.exists(cleaned_path):
+        raise FileNotFoundError(f"No cleaned data at {cleaned_path}; upload a CSV file first")
+    with telemetry.stage('gui.load', path=cleaned_path) as record:
+        job.progress("Loading preprocessed data...")
+        data = load_cached(cleaned_path, stage='parsed')
+        record['cached'] = data is not None
+        if data is None:
+            job.progress("Parsing cleaned_data.csv...")
+            data = apply_schema(pd.read_csv(cleaned_path, dtype=parse_dtypes()), report=True)
+            job.check()
+            store_cached(data, cleaned_path, stage='parsed')
+            data = load_cached(cleaned_path, stage='parsed')
+        warm_statistics(job, data, cleaned_path)
+        record['rows_out'] = len(data)
+    return data, entry_key(cleaned_path, stage='parsed'), "Loaded preprocessed data"
+
+def plot_task(job, data, plot_type, figsize, dpi, key=None):
+    # Builds the figure off-screen; the window attaches it to a canvas and
+    # draws it on the GUI thread. `key` is passed through for the figure cache.
+    from matplotlib.figure import Figure
+    with telemetry.stage('gui.plot', rows_in=data, plot=plot_type):
+        job.progress(f"Building {plot_type}...")
+        fig = Figure(figsize=figsize, dpi=dpi)
+        plot_function(plot_type)(data, ax=fig.add_subplot(111))
+        job.progress("Computing statistics...")
+        stats_text = stats_panel_text(data, plot_type)
+    return key, plot_type, fig, stats_text
+
+def warm_statistics(job, data, cleaned_path):
+    # Moments for every column pair plus the DALYs median, computed once per
+    # dataset so the stats panel never rescans the frame, and the aggregate
+    # cube the summary plots roll up (saved next to the cleaned data)
+    from cube import cube_path, refresh_cube
+    from moments import frame_median, frame_moments
+
+    job.progress("Computing statistics...")
+    frame_moments(data)
+    frame_median(data, 'DALYs')
+    job.check()
+    job.progress("Loading aggregate cube...")
+    refresh_cube(data, cube_path(cleaned_path))
+
+def stats_panel_text(data, plot_type):
+    from moments import frame_median, frame_moments
+
+    stats_text = f"<b>Analysis of {plot_type}:</b><br>"
+    
+    try:
+        moments = frame_moments(data)
+        if plot_type in ["Income vs DALYs", "Education vs DALYs", "Urbanization vs DALYs"]:
+            x_col = {
+                "Income vs DALYs": "Per Capita Income (USD)",
+                "Education vs DALYs": "Education Index",
+                "Urbanization vs DALYs": "Urbanization Rate (%)"
+            }[plot_type]
+            
+            corr, p = moments.pearson(x_col, 'DALYs')
+            stats_text += f"Pearson correlation: {corr:.5f} (p={p:.3e})<br>"
         
-    def clear(self):
-        self.fig.clf()
-        self.axes = self.fig.add_subplot(111)
-        self.draw()
+        
+        stats_text += (
+            f"<br><b>Global Statistics:</b><br>"
+            f"Mean DALYs: {moments.mean_of('DALYs'):.1f}<br>"
+            f"Median DALYs: {frame_median(data, 'DALYs'):.1f}<br>"
+            f"Std Dev: {moments.std('DALYs'):.1f}"
+        )
+        
+    except Exception as e:
+        stats_text += f"<br>Statistical analysis failed: {str(e)}"
+    
+    return stats_text
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -151,6 +283,36 @@ class MainWindow(QMainWindow):
         self.init_ui()
         self.add_stats_panel()
         
+        # Background workers: one for data loading, one for plotting
+        self.data_runner = JobRunner(parent=self)
+        self.data_runner.progress.connect(self.statusBar().showMessage)
+        self.data_runner.result.connect(self.on_data_loaded)
+        self.data_runner.error.connect(
+            lambda msg: QMessageBox.critical(self, "Error", f"Data loading failed:\n{msg}"))
+        self.data_runner.busy.connect(self.on_busy_changed)
+        
+        self.plot_runner = JobRunner(parent=self)
+        self.plot_runner.progress.connect(self.statusBar().showMessage)
+        self.plot_runner.result.connect(self.on_plot_ready)
+        self.plot_runner.error.connect(
+            lambda msg: QMessageBox.critical(self, "Error", f"Plot failed: {msg}"))
+        self.plot_runner.busy.connect(self.on_busy_changed)
+        
+        # Rendered figures for the current dataset, plus background prefetch
+        # of the neighbouring entries in the plot list
+        self.data_fingerprint = None
+        self.data_version = 0
+        self.figure_cache = FigureCache()
+        self.prefetch_queue = []
+        self.prefetch_runner = JobRunner(parent=self)
+        self.prefetch_runner.result.connect(self.on_prefetch_ready)
+        self.prefetch_runner.error.connect(lambda msg: self.prefetch_next())
+        
+        # Stage timings from the pipeline, shown at the right of the status bar
+        self.telemetry_bridge = TelemetryBridge(self)
+        self.telemetry_bridge.record.connect(self.on_telemetry)
+        telemetry.add_listener(self.telemetry_bridge)
+        
     def init_ui(self):
         # Control panel
         control_panel = QWidget()
@@ -194,6 +356,19 @@ class MainWindow(QMainWindow):
         control_layout.addWidget(QLabel("Choose Plot:"))
         control_layout.addWidget(self.plot_selector)
         
+        # Error bar mode for the mean plots
+        self.ci_selector = QComboBox()
+        self.ci_modes = {
+            "Analytic SE": 'se',
+            "Bootstrap (subsample)": 'bootstrap',
+            "No CI": 'none',
+        }
+        self.ci_selector.addItems(list(self.ci_modes))
+        self.ci_selector.setToolTip("Error bars for mean plots")
+        self.ci_selector.currentTextChanged.connect(self.change_ci_mode)
+        control_layout.addWidget(QLabel("Error Bars:"))
+        control_layout.addWidget(self.ci_selector)
+        
         # Plot button
         self.plot_btn = QPushButton("Generate Plot")
         self.plot_btn.clicked.connect(self.generate_plot)
@@ -206,14 +381,22 @@ class MainWindow(QMainWindow):
         self.export_btn.setEnabled(False)
         control_layout.addWidget(self.export_btn)
         
+        # Cancel button for background work
+        self.cancel_btn = QPushButton("Cancel")
+        self.cancel_btn.clicked.connect(self.cancel_jobs)
+        self.cancel_btn.setEnabled(False)
+        control_layout.addWidget(self.cancel_btn)
+        
         self.layout.addWidget(control_panel)
         
         # Matplotlib canvas
-        self.canvas = MplCanvas(self)
+        self.canvas = make_canvas(self)
         self.layout.addWidget(self.canvas)
         
         # Status bar
         self.statusBar().showMessage("Ready")
+        self.telemetry_label = QLabel("")
+        self.statusBar().addPermanentWidget(self.telemetry_label)
     
     def add_stats_panel(self):
         self.stats_panel = QWidget()
@@ -226,6 +409,12 @@ class MainWindow(QMainWindow):
         
         self.layout.addWidget(self.stats_panel)
     
+    def change_ci_mode(self, label):
+        from aggregates import set_ci_mode
+        set_ci_mode(self.ci_modes[label])
+        if self.current_plot and self.data is not None:
+            self.generate_plot()
+    
     def upload_data(self):
         options = QFileDialog.Options()
         file_path, _ = QFileDialog.getOpenFileName(
@@ -237,37 +426,30 @@ class MainWindow(QMainWindow):
         )
         
         if file_path:
-            try:
-                # Use existing preprocessing pipeline
-                raw_df = load_data(file_path)
-                self.data = preprocess_data(raw_df)
-                
-                # Auto-save cleaned data
-                cleaned_path = os.path.join(project_root, "data", "cleaned_data.csv")
-                save_cleaned_data(self.data, cleaned_path)
-                
-                self.statusBar().showMessage(f"Uploaded and processed: {os.path.basename(file_path)}")
-                self.plot_btn.setEnabled(True)
-                
-            except Exception as e:
-                QMessageBox.critical(self, "Upload Failed", f"Error processing file:\n{str(e)}")
+            cleaned_path = os.path.join(project_root, "data", "cleaned_data.csv")
+            self.stop_plotting()
+            self.data_runner.start(upload_task, file_path, cleaned_path)
 
     def load_data(self):
-        try:
-            
-            cleaned_path = os.path.join(project_root, "data", "cleaned_data.csv")
-            if os.path.exists(cleaned_path):
-                self.data = pd.read_csv(cleaned_path)
-                self.statusBar().showMessage("Loaded preprocessed data")
-            else:
-                # Fallback to sample data
-                self.data = self.load_sample_data()
-                
-            self.plot_btn.setEnabled(True)
-            
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Data loading failed: {str(e)}")
+        cleaned_path = os.path.join(project_root, "data", "cleaned_data.csv")
+        self.stop_plotting()
+        self.data_runner.start(load_task, cleaned_path)
 
+    def on_data_loaded(self, result):
+        self.data, fingerprint, message = result
+        # Unknown provenance (no cache entry): fall back to a load counter
+        self.data_version += 1
+        fingerprint = fingerprint or f"session-{self.data_version}"
+        if fingerprint != self.data_fingerprint:
+            self.release(self.figure_cache.clear())
+        self.data_fingerprint = fingerprint
+        self.statusBar().showMessage(message)
+        self.plot_btn.setEnabled(True)
+
+    def figure_key(self, plot_type):
+        from aggregates import get_ci_mode
+        return (self.data_fingerprint, plot_type, self.canvas.width(), self.canvas.height(),
+                self.canvas.fig.dpi, get_ci_mode())
 
     def generate_plot(self):
         if self.data is None:
@@ -275,115 +457,144 @@ class MainWindow(QMainWindow):
             return
             
         plot_type = self.plot_selector.currentText()
+        if plot_type not in PLOT_FUNCTIONS:
+            QMessageBox.warning(self, "Warning", "Please select a valid plot type")
+            return
         
+        key = self.figure_key(plot_type)
+        entry = self.figure_cache.get(key)
+        if entry is not None:
+            self.plot_runner.cancel()
+            self.show_entry(entry)
+            self.schedule_prefetch(plot_type)
+            return
+        
+        # A newer request supersedes any plot still being built, and the
+        # user's plot takes priority over prefetching
+        self.prefetch_runner.cancel()
+        self.plot_runner.start(plot_task, self.data, plot_type, *self.figure_geometry(), key=key)
+
+    def figure_geometry(self):
+        dpi = 100
+        figsize = (max(self.canvas.width(), 100) / dpi, max(self.canvas.height(), 100) / dpi)
+        return figsize, dpi
+
+    def on_plot_ready(self, result):
+        key, plot_type, fig, stats_text = result
+        entry = {'plot_type': plot_type, 'figure': fig, 'canvas': None, 'stats_text': stats_text}
         try:
-            # Clear previous plot
-            self.canvas.clear()
-            
-            # Generate the selected plot
-            if plot_type == "DALYs Histogram":
-                sns.histplot(self.data['DALYs'], bins=30, kde=True, ax=self.canvas.axes)
-                self.canvas.axes.set_title("Distribution of DALYs")
-                
-            elif plot_type == "DALYs by Gender":
-                sns.barplot(data=self.data, x='Gender', y='DALYs', 
-                           estimator='mean', ax=self.canvas.axes)
-                self.canvas.axes.set_title("Average DALYs by Gender")
-                
-            elif plot_type == "DALYs by Age Group":
-                sns.boxplot(data=self.data, x='Age Group', y='DALYs', ax=self.canvas.axes)
-                self.canvas.axes.set_title("DALYs by Age Group")
-                
-            elif plot_type == "DALYs by Disease Category":
-                sns.barplot(data=self.data, x='Disease Category', y='DALYs', 
-                           estimator='mean', ax=self.canvas.axes)
-                self.canvas.axes.set_title("Average DALYs by Disease Category")
-                self.canvas.axes.tick_params(axis='x', rotation=45)
-                
-            elif plot_type == "DALYs by Disease Type":
-                communicable = ['Parasitic', 'Viral', 'Bacterial', 'Infectious']
-                self.data['Disease Type'] = self.data['Disease Category'].apply(
-                    lambda x: 'Infectious' if x in communicable else 'Non-Communicable'
-                )
-                sns.boxplot(data=self.data, x='Disease Type', y='DALYs', ax=self.canvas.axes)
-                self.canvas.axes.set_title("DALYs by Disease Type")
-                
-            elif plot_type == "Income vs DALYs":
-                plot_income_vs_dalys(self.data, ax=self.canvas.axes)
-                
-            elif plot_type == "Education vs DALYs":
-                plot_education_vs_dalys(self.data, ax=self.canvas.axes)
-                
-            elif plot_type == "Urbanization vs DALYs":
-                plot_urbanization_vs_dalys(self.data, ax=self.canvas.axes)
-                
-            elif plot_type == "Correlation Matrix":
-                plot_correlation_matrix(self.data, ax=self.canvas.axes)
-                
-            elif plot_type == "DALYs by Treatment":
-                plot_treatment_vs_dalys(self.data, ax=self.canvas.axes)
-                
-            elif plot_type == "Top Countries by DALYs":
-                plot_country_vs_dalys(self.data, ax=self.canvas.axes)
-                
-            elif plot_type == "DALYs vs Doctors":
-                plot_healthcare_vs_dalys(self.data, ax=self.canvas.axes)
-                
-            elif plot_type == "DALYs Over Time":
-                plot_dalys_over_time(self.data, ax=self.canvas.axes)
-            
-            elif plot_type == "DALYs Over Time by Income":
-                plot_dalys_over_time_by_income(self.data, ax=self.canvas.axes)
-                
-            elif plot_type == "DALYs vs Hospital Beds":
-                plot_dalys_vs_hospital_beds(self.data, ax=self.canvas.axes)
-                
-            elif plot_type == "DALYs vs Healthcare Access":
-                plot_dalys_vs_access(self.data, ax=self.canvas.axes)
-                
-            else:
-                QMessageBox.warning(self, "Warning", "Please select a valid plot type")
-                return
-                
-            # Adjust layout and draw
-            self.canvas.fig.tight_layout()
-            self.canvas.draw()
-            self.current_plot = plot_type
-            self.export_btn.setEnabled(True)
-            self.statusBar().showMessage(f"Generated: {plot_type}")
-            
-            # Update statistics panel
-            self.update_stats_panel(plot_type)
-            
+            self.show_entry(entry)
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Plot failed: {str(e)}")
-    
-    def update_stats_panel(self, plot_type):
-        stats_text = f"<b>Analysis of {plot_type}:</b><br>"
+            return
+        self.store_entry(key, entry)
+        self.schedule_prefetch(plot_type)
+
+    def show_entry(self, entry):
+        if entry['canvas'] is None:
+            # Lay out and rasterise once on the GUI thread; the canvas keeps
+            # the buffer so later visits only repaint it
+            entry['canvas'] = make_canvas(self, figure=entry['figure'])
+            entry['canvas'].fig.tight_layout()
+            self.set_canvas(entry['canvas'])
+            self.canvas.draw()
+        else:
+            self.set_canvas(entry['canvas'])
         
-        try:
-            if plot_type in ["Income vs DALYs", "Education vs DALYs", "Urbanization vs DALYs"]:
-                x_col = {
-                    "Income vs DALYs": "Per Capita Income (USD)",
-                    "Education vs DALYs": "Education Index",
-                    "Urbanization vs DALYs": "Urbanization Rate (%)"
-                }[plot_type]
-                
-                corr, p = pearsonr(self.data[x_col], self.data['DALYs'])
-                stats_text += f"Pearson correlation: {corr:.5f} (p={p:.3e})<br>"
-            
-            
-            stats_text += (
-                f"<br><b>Global Statistics:</b><br>"
-                f"Mean DALYs: {self.data['DALYs'].mean():.1f}<br>"
-                f"Median DALYs: {self.data['DALYs'].median():.1f}<br>"
-                f"Std Dev: {self.data['DALYs'].std():.1f}"
-            )
-            
-        except Exception as e:
-            stats_text += f"<br>Statistical analysis failed: {str(e)}"
+        plot_type = entry['plot_type']
+        self.current_plot = plot_type
+        self.export_btn.setEnabled(True)
+        self.statusBar().showMessage(f"Generated: {plot_type}")
         
-        self.stats_label.setText(stats_text)
+        # Update statistics panel
+        self.stats_label.setText(entry['stats_text'])
+
+    def set_canvas(self, canvas):
+        if canvas is self.canvas:
+            return
+        old = self.canvas
+        self.layout.replaceWidget(old, canvas)
+        old.setParent(None)
+        if not self.figure_cache.holds(old):
+            old.deleteLater()
+        canvas.show()
+        self.canvas = canvas
+
+    def store_entry(self, key, entry):
+        width, height = self.canvas.width(), self.canvas.height()
+        nbytes = estimate_figure_bytes(width, height, self.canvas.devicePixelRatioF())
+        current = self.figure_key(self.current_plot) if self.current_plot else None
+        self.release(self.figure_cache.put(key, entry, nbytes, keep=current))
+
+    def release(self, entries):
+        for entry in entries:
+            canvas = entry.get('canvas')
+            if canvas is not None and canvas is not self.canvas:
+                canvas.deleteLater()
+
+    def schedule_prefetch(self, plot_type):
+        # Analysts usually step through the list, so warm the neighbours
+        names = list(PLOT_FUNCTIONS)
+        i = names.index(plot_type)
+        neighbours = [names[j] for j in (i + 1, i - 1) if 0 <= j < len(names)]
+        self.prefetch_queue = [name for name in neighbours if self.figure_key(name) not in self.figure_cache]
+        if not self.prefetch_runner.is_running():
+            self.prefetch_next()
+
+    def prefetch_next(self):
+        if not self.prefetch_queue or self.data is None:
+            return
+        plot_type = self.prefetch_queue.pop(0)
+        key = self.figure_key(plot_type)
+        self.prefetch_runner.start(plot_task, self.data, plot_type, *self.figure_geometry(), key=key)
+
+    def on_prefetch_ready(self, result):
+        key, plot_type, fig, stats_text = result
+        if key[0] == self.data_fingerprint:
+            entry = {'plot_type': plot_type, 'figure': fig, 'canvas': None, 'stats_text': stats_text}
+            self.store_entry(key, entry)
+        self.prefetch_next()
+
+    def stop_plotting(self):
+        self.plot_runner.cancel()
+        self.prefetch_runner.cancel()
+        self.prefetch_queue = []
+
+    def cancel_jobs(self):
+        self.data_runner.cancel()
+        self.stop_plotting()
+        self.statusBar().showMessage("Cancelled")
+
+    def on_busy_changed(self, _):
+        busy = self.data_runner.is_running() or self.plot_runner.is_running()
+        self.cancel_btn.setEnabled(busy)
+        self.upload_btn.setEnabled(not self.data_runner.is_running())
+        self.load_btn.setEnabled(not self.data_runner.is_running())
+    
+    def on_telemetry(self, record):
+        # The last finished top-level stage; the tooltip lists the recent trace
+        # (jobs superseded by a newer request are left out)
+        if record.get('depth', 0) > 0 or record.get('error') == 'Cancelled':
+            return
+        text = telemetry.format_record(record, indent=False)
+        self.telemetry_label.setText(f"{record['plot']}: {text}" if 'plot' in record else text)
+        recent = telemetry.records()[-TELEMETRY_TOOLTIP_LINES:]
+        self.telemetry_label.setToolTip("<pre>" + "\n".join(telemetry.format_record(r) for r in recent) + "</pre>")
+
+    def closeEvent(self, event):
+        # Jobs still on the pool would otherwise emit through signal objects
+        # Qt deletes on shutdown: cancel them all and let them finish first
+        self.data_runner.cancel()
+        self.stop_plotting()
+        for runner in (self.data_runner, self.plot_runner, self.prefetch_runner):
+            if not runner.wait(CLOSE_TIMEOUT_MS):
+                print("Background jobs did not stop in time")
+                break
+        telemetry.remove_listener(self.telemetry_bridge)
+        super().closeEvent(event)
+
+    def update_stats_panel(self, plot_type):
+        self.stats_label.setText(stats_panel_text(self.data, plot_type))
     
     def export_plot(self):
         if not self.current_plot:
@@ -410,7 +621,8 @@ class MainWindow(QMainWindow):
         
         if file_path:
             try:
-                self.canvas.fig.savefig(file_path, bbox_inches='tight')
+                with telemetry.stage('gui.export', path=file_path, plot=self.current_plot):
+                    self.canvas.fig.savefig(file_path, bbox_inches='tight')
                 self.statusBar().showMessage(f"Plot saved to {file_path}")
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Failed to save: {str(e)}")
@@ -0,0 +1,132 @@
+import traceback
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal, pyqtSlot
+
+# Background execution for the GUI.
+#
+# Long operations (parsing, preprocessing, building a figure) run as Jobs on a
+# QThreadPool. A job reports progress through signals that the window shows in
+# its status bar, can be cancelled cooperatively, and carries a generation
+# number so the window can drop results that a newer request has superseded.
+
+class Cancelled(Exception):
+    pass
+
+class WorkerSignals(QObject):
+    progress = pyqtSignal(int, str)
+    result = pyqtSignal(int, object)
+    error = pyqtSignal(int, str)
+    finished = pyqtSignal(int)
+
+class Job(QRunnable):
+    def __init__(self, generation, fn, *args, **kwargs):
+        super().__init__()
+        self.generation = generation
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = WorkerSignals()
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    # Called by the task function between steps
+    def progress(self, message):
+        self.check()
+        self.signals.progress.emit(self.generation, message)
+
+    def check(self):
+        if self._cancelled:
+            raise Cancelled()
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            value = self.fn(self, *self.args, **self.kwargs)
+            if not self._cancelled:
+                self.signals.result.emit(self.generation, value)
+        except Cancelled:
+            pass
+        except Exception as e:
+            traceback.print_exc()
+            if not self._cancelled:
+                self.signals.error.emit(self.generation, str(e))
+        finally:
+            self.signals.finished.emit(self.generation)
+
+class TelemetryBridge(QObject):
+    # Telemetry listeners run on whichever thread finished the stage; the
+    # signal carries each record over to the GUI thread
+    record = pyqtSignal(object)
+
+    def __call__(self, record):
+        self.record.emit(record)
+
+class JobRunner(QObject):
+    # One runner per kind of work ("data", "plot"). Starting a new job cancels
+    # the previous one of the same kind and bumps the generation, so late
+    # results from the old job are ignored.
+    progress = pyqtSignal(str)
+    result = pyqtSignal(object)
+    error = pyqtSignal(str)
+    busy = pyqtSignal(bool)
+
+    def __init__(self, pool=None, parent=None):
+        super().__init__(parent)
+        self.pool = pool or QThreadPool.globalInstance()
+        self.generation = 0
+        self.current = None
+        # Keep Python references until the pool is done with each job
+        self._running = set()
+
+    def start(self, fn, *args, **kwargs):
+        self.cancel()
+        self.generation += 1
+        job = Job(self.generation, fn, *args, **kwargs)
+        job.signals.progress.connect(self._on_progress)
+        job.signals.result.connect(self._on_result)
+        job.signals.error.connect(self._on_error)
+        job.signals.finished.connect(self._on_finished)
+        job.signals.finished.connect(lambda _, job=job: self._running.discard(job))
+        self.current = job
+        self._running.add(job)
+        self.busy.emit(True)
+        self.pool.start(job)
+        return job
+
+    def cancel(self):
+        if self.current is not None:
+            self.current.cancel()
+            self.current = None
+            self.busy.emit(False)
+
+    def is_running(self):
+        return self.current is not None
+
+    def wait(self, msecs=-1):
+        # Block until the pool has no jobs left (False on timeout)
+        return self.pool.waitForDone(msecs)
+
+    def _is_current(self, generation):
+        return self.current is not None and generation == self.generation
+
+    def _on_progress(self, generation, message):
+        if self._is_current(generation):
+            self.progress.emit(message)
+
+    def _on_result(self, generation, value):
+        if self._is_current(generation):
+            self.result.emit(value)
+
+    def _on_error(self, generation, message):
+        if self._is_current(generation):
+            self.error.emit(message)
+
+    def _on_finished(self, generation):
+        if self._is_current(generation):
+            self.current = None
+            self.busy.emit(False)
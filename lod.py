@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+
+from aggregates import cached
+
+# Level of detail for the scatter plots.
+#
+# How many points an Axes can show usefully depends on its size in pixels, so
+# the point budget is derived from the canvas:
+#   'points'  - the frame fits in the budget; every row is drawn
+#   'sample'  - a seeded sample of `budget` rows, stratified so each Disease
+#               Category keeps its share of the data
+#   'density' - too many rows for a readable sample; the full data is binned
+#               into a 2D histogram (one cell per few pixels) and drawn as an
+#               image, so tails and dense cores both stay visible; it has
+#               no hue, and the legend says the categories are combined
+# Samples and grids are memoised per frame, and rows beyond DENSITY_MAX_ROWS
+# are thinned with a fixed seed, so drawing time stays bounded and the same
+# data always gives the same picture.
+
+LOD_MODES = ('auto', 'points', 'sample', 'density')
+SAMPLE_SEED = 42
+SAMPLE_BY = 'Disease Category'
+POINTS_PER_PIXEL = 0.03
+MIN_POINTS = 1000
+MAX_POINTS = 20000
+# Beyond this many rows per budgeted point a sample shows too little of the data
+DENSITY_RATIO = 50
+DENSITY_MAX_ROWS = 5_000_000
+PIXELS_PER_BIN = 4
+
+def point_budget(axes):
+    area = axes.bbox.width * axes.bbox.height
+    return int(np.clip(area * POINTS_PER_PIXEL, MIN_POINTS, MAX_POINTS))
+
+def choose_mode(n_rows, budget, mode='auto'):
+    if mode not in LOD_MODES:
+        raise ValueError(f"Unknown level-of-detail mode {mode!r}; expected one of {LOD_MODES}")
+    if mode != 'auto':
+        return mode
+    if n_rows <= budget:
+        return 'points'
+    if n_rows <= budget * DENSITY_RATIO:
+        return 'sample'
+    return 'density'
+
+def stratified_sample(df, n, by=SAMPLE_BY, seed=SAMPLE_SEED):
+    if len(df) <= n:
+        return df
+    if by not in df.columns:
+        return cached(df, ('lod_sample', None, n, seed), lambda: df.sample(n, random_state=seed))
+    return cached(df, ('lod_sample', by, n, seed), lambda: _stratified_sample(df, n, by, seed))
+
+def _stratified_sample(df, n, by, seed):
+    codes, _ = pd.factorize(df[by])
+    # Missing labels form their own stratum
+    codes = np.where(codes < 0, codes.max() + 1, codes)
+    counts = np.bincount(codes)
+
+    # Proportional quotas, rounded by largest remainder so they sum to n
+    quota = counts * n / len(df)
+    take = np.floor(quota).astype(int)
+    extra = n - take.sum()
+    take[np.argsort(-(quota - take), kind='stable')[:extra]] += 1
+
+    # Random order within each stratum; keep the first `take` rows of each
+    keys = np.random.default_rng(seed).random(len(df))
+    order = np.lexsort((keys, codes))
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    rank = np.arange(len(df)) - starts[codes[order]]
+    picked = np.sort(order[rank < take[codes[order]]])
+    return df.iloc[picked]
+
+def density_grid(df, x, y, bins):
+    return cached(df, ('lod_density', x, y, bins), lambda: _density_grid(df, x, y, bins))
+
+def _density_grid(df, x, y, bins):
+    xs = df[x].to_numpy(dtype=float)
+    ys = df[y].to_numpy(dtype=float)
+    finite = np.isfinite(xs) & np.isfinite(ys)
+    xs, ys = xs[finite], ys[finite]
+    rows = len(xs)
+    if rows > DENSITY_MAX_ROWS:
+        keep = np.random.default_rng(SAMPLE_SEED).random(rows) < DENSITY_MAX_ROWS / rows
+        xs, ys = xs[keep], ys[keep]
+    counts, xedges, yedges = np.histogram2d(xs, ys, bins=bins)
+    return {'counts': counts, 'xedges': xedges, 'yedges': yedges, 'rows': rows, 'binned': len(xs)}
+
+def level_of_detail(df, x, y, axes, mode='auto'):
+    # ('points' | 'sample', frame) or ('density', grid) for drawing df on axes
+    budget = point_budget(axes)
+    mode = choose_mode(len(df), budget, mode)
+    if mode == 'density':
+        bins = (max(int(axes.bbox.width // PIXELS_PER_BIN), 10), max(int(axes.bbox.height // PIXELS_PER_BIN), 10))
+        return mode, density_grid(df, x, y, bins)
+    if mode == 'sample':
+        return mode, stratified_sample(df, budget)
+    return mode, df
@@ -1,33 +1,12 @@
+import argparse
 import os
 import sys
 from pathlib import Path
-from PyQt5.QtWidgets import QApplication
 
-def run_cli_analysis(data_path=None):
+def run_cli_analysis(data_path=None, chunksize=None, workers=None, targets=None, force=False, ci=None,
+                     quantiles='exact'):
     try:
-        from preprocessing import load_data, preprocess_data, save_cleaned_data
-        from visualization import (
-            plot_income_vs_dalys,
-            plot_education_vs_dalys,
-            plot_urbanization_vs_dalys,
-            plot_correlation_matrix,
-            plot_treatment_vs_dalys,
-            plot_country_vs_dalys,
-            run_regression,
-            plot_healthcare_vs_dalys,
-            plot_dalys_over_time,
-            plot_dalys_over_time_by_income,
-            plot_dalys_vs_hospital_beds,
-            plot_dalys_vs_access,
-            healthcare_correlation_summary
-        )
-        from eda import (
-            plot_dalys_histogram,
-            plot_dalys_by_gender,
-            plot_dalys_by_age_group,
-            plot_dalys_by_category,
-            plot_dalys_by_disease_type
-        )
+        from build import run_build
 
         print("\n=== Starting Analysis ===")
         
@@ -42,45 +21,84 @@ def run_cli_analysis(data_path=None):
         # Create assets path
         assets_dir = Path(__file__).parent / "assets"
 
-        # Data pipeline
-        print(f"\nLoading data from: {data_path}")
-        df = load_data(data_path)
-        df_cleaned = preprocess_data(df)
-        save_cleaned_data(df_cleaned, 'data/cleaned_data.csv')
-
-        # Analysis
-        print("\nRunning statistical analysis...")
-        run_regression(df_cleaned, save_path='data/analysis_results.txt')
-        healthcare_correlation_summary(df_cleaned, save_path='data/analysis_results.txt')
-
-        # Visualizations
-        print("\nGenerating visualizations...")
-        plot_income_vs_dalys(df_cleaned)
-        plot_education_vs_dalys(df_cleaned)
-        plot_urbanization_vs_dalys(df_cleaned)
-        plot_correlation_matrix(df_cleaned)
-        plot_treatment_vs_dalys(df_cleaned)
-        plot_country_vs_dalys(df_cleaned)
-        plot_healthcare_vs_dalys(df_cleaned) # type: ignore
-        plot_dalys_over_time(df_cleaned) # type: ignore
-        plot_dalys_over_time_by_income(df_cleaned)
-        plot_dalys_vs_hospital_beds(df_cleaned)
-        plot_dalys_vs_access(df_cleaned)
+        # Only the artifacts whose inputs changed (or that are missing) are rebuilt
+        status = run_build(data_path, targets=targets, assets_dir=assets_dir, chunksize=chunksize,
+                           workers=workers, ci=ci, force=force, quantiles=quantiles)
+        failed = [target for target, state in status.items() if state == 'failed']
+        for target, state in status.items():
+            print(f"  {target:<24} {state}")
+
+        import telemetry
+        if telemetry.enabled() and telemetry.records():
+            print("\nStage timings:")
+            print(telemetry.summary(depth=1))
 
         print("\n=== Analysis Complete ===")
         print("Results saved to:")
         print(f"- Cleaned data: data/cleaned_data.csv")
-        print(f"- Analysis results: data/analysis_results.txt")
+        print(f"- Analysis results: data/analysis_results.txt (+ .json)")
         print(f"- Visualizations: assets/")
-        return True
+        return not failed
 
     except Exception as e:
         print(f"\n!!! Analysis Failed !!!\nError: {str(e)}", file=sys.stderr)
         return False
 
+def run_cli_append(files, data_path=None, workers=None, recompute=False, tolerance=None):
+    try:
+        from build import run_append
+
+        print("\n=== Appending Data ===")
+        if data_path is None:
+            data_path = Path(__file__).parent / "data" / "Global Health Statistics.csv"
+        data_path = Path(data_path).absolute()
+        for path in [data_path] + [Path(f) for f in files]:
+            if not path.exists():
+                raise FileNotFoundError(f"Data file not found at: {path}")
+
+        # The new rows are cleaned with the stored statistics; the report and
+        # figures are then rebuilt from the extended data
+        status, drift = run_append(data_path, files, assets_dir=Path(__file__).parent / "assets",
+                                   workers=workers, recompute=recompute, tolerance=tolerance)
+        for target, state in status.items():
+            print(f"  {target:<24} {state}")
+        return 'failed' not in status.values()
+
+    except Exception as e:
+        print(f"\n!!! Append Failed !!!\nError: {str(e)}", file=sys.stderr)
+        return False
+
+def run_server(cleaned_path=None, host=None, port=None, workers=None, cache_mb=None, ci=None):
+    try:
+        import server
+
+        if cleaned_path is None:
+            cleaned_path = Path(__file__).parent / "data" / "cleaned_data.csv"
+        cache_bytes = server.CACHE_MAX_BYTES if cache_mb is None else int(cache_mb * 1024 * 1024)
+        server.serve(Path(cleaned_path).absolute(), host=host or server.DEFAULT_HOST,
+                     port=server.DEFAULT_PORT if port is None else port, workers=workers,
+                     cache_bytes=cache_bytes, ci=ci)
+        return True
+    except KeyboardInterrupt:
+        print("\nServer stopped")
+        return True
+    except Exception as e:
+        print(f"\n!!! Server Failed !!!\nError: {str(e)}", file=sys.stderr)
+        return False
+
+def is_headless():
+    # No display to open a window on (servers, CI, ssh without forwarding)
+    if os.environ.get('QT_QPA_PLATFORM') in ('offscreen', 'minimal'):
+        return True
+    if sys.platform.startswith('linux'):
+        return not (os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY'))
+    return False
+
 def run_gui():
     try:
-        from gui import MainWindow 
+        # Qt is only loaded when a window is actually wanted
+        from PyQt5.QtWidgets import QApplication
+        from gui import MainWindow
         app = QApplication(sys.argv)
         window = MainWindow()
         window.show()
@@ -89,10 +107,86 @@ def run_gui():
         print(f"Failed to launch GUI: {str(e)}", file=sys.stderr)
         return False
 
-if __name__ == "__main__":
-    if len(sys.argv) > 1 and sys.argv[1] == 'gui':
+def configure_telemetry(args):
+    import telemetry
+    if args.no_telemetry:
+        telemetry.set_enabled(False)
+    telemetry.set_echo(args.verbose)
+    if args.trace and telemetry.enabled():
+        # atexit also covers the GUI, which leaves through sys.exit
+        import atexit
+        atexit.register(telemetry.write_trace, args.trace)
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Global Disease Burden Analyzer")
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="print the import-time breakdown and fail if over budget")
+    parser.add_argument('--trace', metavar='PATH', help="write the per-stage telemetry as JSON on exit")
+    parser.add_argument('--verbose', action='store_true', help="print every pipeline stage as it finishes")
+    parser.add_argument('--no-telemetry', action='store_true',
+                        help="turn stage telemetry off (same as GDB_TELEMETRY=0)")
+    commands = parser.add_subparsers(dest='command')
+
+    run = commands.add_parser('run', help="build the cleaned data, report and figures (default)")
+    run.add_argument('targets', nargs='*', metavar='TARGET',
+                     help="what to build: all (default), figures, cleaned, report or a figure name")
+    run.add_argument('--data', help="raw CSV (default: data/Global Health Statistics.csv)")
+    run.add_argument('--chunksize', type=int, help="clean and analyse in chunks of this many rows")
+    run.add_argument('--workers', type=int, help="worker processes (default: one per CPU)")
+    run.add_argument('--quantiles', choices=['exact', 'sketch'], default='exact',
+                     help="with --chunksize: exact quartiles and income edges, or KLL sketches with a stated error bound")
+    run.add_argument('--ci', choices=['se', 'bootstrap', 'none'], help="error bars for mean plots")
+    run.add_argument('--force', action='store_true', help="rebuild even if up to date")
+    run.add_argument('--no-gui', action='store_true', help="do not open the GUI afterwards")
+
+    append = commands.add_parser('append', help="add new raw files (e.g. a new year) without cleaning the history again")
+    append.add_argument('files', nargs='*', metavar='CSV', help="raw CSV files with years not in the data yet")
+    append.add_argument('--data', help="raw CSV the cleaned data was built from (default: data/Global Health Statistics.csv)")
+    append.add_argument('--workers', type=int, help="worker processes (default: one per CPU)")
+    append.add_argument('--recompute', action='store_true',
+                        help="clean every year again if the derived columns drifted past the tolerance")
+    append.add_argument('--tolerance', type=float, help="largest acceptable drift (default: 0.01)")
+
+    serve = commands.add_parser('serve', help="serve statistics, aggregates and figures over a local HTTP/JSON API")
+    serve.add_argument('--data', help="cleaned CSV to serve (default: data/cleaned_data.csv)")
+    serve.add_argument('--host', help="address to bind (default: 127.0.0.1)")
+    serve.add_argument('--port', type=int, help="port to listen on, 0 for any free one (default: 8050)")
+    serve.add_argument('--workers', type=int, help="render worker processes (default: one per CPU)")
+    serve.add_argument('--cache-mb', type=float, help="response cache size in MB (default: 64)")
+    serve.add_argument('--ci', choices=['se', 'bootstrap', 'none'], help="default error bars for mean plots")
+
+    commands.add_parser('gui', help="open the GUI")
+    commands.add_parser('targets', help="list build targets")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    configure_telemetry(args)
+    if args.profile_startup:
+        from startup import report_startup
+        return 0 if report_startup() else 1
+    if args.command == 'gui':
+        return 0 if run_gui() is not False else 1
+    if args.command == 'append':
+        return 0 if run_cli_append(args.files, args.data, workers=args.workers, recompute=args.recompute,
+                                   tolerance=args.tolerance) else 1
+    if args.command == 'serve':
+        return 0 if run_server(args.data, args.host, args.port, workers=args.workers, cache_mb=args.cache_mb,
+                               ci=args.ci) else 1
+    if args.command == 'targets':
+        from build import available_targets
+        print("\n".join(['all', 'figures'] + available_targets()))
+        return 0
+
+    if args.command is None:
+        # Bare `main.py`: full build, then the GUI when there is a display
+        args = build_parser().parse_args(['run'])
+    ok = run_cli_analysis(args.data, chunksize=args.chunksize, workers=args.workers,
+                          targets=args.targets, force=args.force, ci=args.ci, quantiles=args.quantiles)
+    if ok and not args.no_gui and not is_headless():
+        # Auto-launch GUI after successful analysis
         run_gui()
-    else:
-        if run_cli_analysis():
-            # Auto-launch GUI after successful analysis
-            run_gui()
\ No newline at end of file
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,277 @@
+import os
+import multiprocessing as mp
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from aggregates import cached
+from preprocessing import DEFAULT_CHUNKSIZE
+
+# Mergeable first and second moments for the numeric columns used in the
+# stats panel and the reports.
+#
+# One vectorized pass gives n, the mean vector and the co-moment matrix
+# C = sum((x - mean)(x - mean)^T) for every column pair over the rows where
+# all the columns are present, plus each column's own count, mean and M2
+# over the rows where that column is present. Covariances, Pearson
+# correlations and regressions are read from the former, so every pair uses
+# the same rows; a column's mean, variance and std from the latter, so they
+# agree with df[col].mean() / .std() whatever is missing elsewhere. New rows
+# are folded in with the pairwise (Chan / Welford) merge instead of rescanning.
+
+MOMENT_COLS = [
+    'DALYs',
+    'Per Capita Income (USD)',
+    'Education Index',
+    'Urbanization Rate (%)',
+    'Healthcare Access (%)',
+    'Hospital Beds per 1000',
+    'Doctors per 1000',
+]
+
+class Moments:
+    def __init__(self, columns, n=0, mean=None, comoment=None, marginal=None):
+        # marginal: (count, mean, M2) per column over its own present rows;
+        # the complete-case figures when not given
+        self.columns = list(columns)
+        k = len(self.columns)
+        self.n = n
+        self.mean = np.zeros(k) if mean is None else np.asarray(mean, dtype=float)
+        self.comoment = np.zeros((k, k)) if comoment is None else np.asarray(comoment, dtype=float)
+        if marginal is None:
+            marginal = (np.full(k, n), self.mean, np.diag(self.comoment))
+        self.marginal_n, self.marginal_mean, self.marginal_m2 = (np.asarray(a, dtype=float) for a in marginal)
+        self._index = {col: i for i, col in enumerate(self.columns)}
+
+    @classmethod
+    def from_frame(cls, df, columns=None):
+        columns = [col for col in (columns or MOMENT_COLS) if col in df.columns]
+        x = df[columns].to_numpy(dtype=float)
+        present = ~np.isnan(x)
+        # Complete cases for the pairs, so every pair is computed over the same rows
+        moments = cls.from_array(x[present.all(axis=1)], columns)
+        counts = present.sum(axis=0)
+        means = np.divide(np.where(present, x, 0.0).sum(axis=0), counts,
+                          out=np.zeros(len(columns)), where=counts > 0)
+        m2 = (np.where(present, x - means, 0.0) ** 2).sum(axis=0)
+        moments.marginal_n, moments.marginal_mean, moments.marginal_m2 = counts.astype(float), means, m2
+        return moments
+
+    @classmethod
+    def from_array(cls, x, columns):
+        n = len(x)
+        if n == 0:
+            return cls(columns)
+        mean = x.mean(axis=0)
+        centered = x - mean
+        return cls(columns, n, mean, centered.T @ centered)
+
+    def merge(self, other):
+        if other.columns != self.columns:
+            raise ValueError("Cannot merge moments over different columns")
+        if other.n == 0 and not other.marginal_n.any():
+            return self
+        if self.n == 0 and not self.marginal_n.any():
+            return other
+        n = self.n + other.n
+        if n:
+            delta = other.mean - self.mean
+            mean = self.mean + delta * other.n / n
+            comoment = self.comoment + other.comoment + np.outer(delta, delta) * self.n * other.n / n
+        else:
+            mean, comoment = self.mean, self.comoment
+        return Moments(self.columns, n, mean, comoment, self._merge_marginal(other))
+
+    def _merge_marginal(self, other):
+        # The same merge, column by column
+        na, nb = self.marginal_n, other.marginal_n
+        n = na + nb
+        delta = other.marginal_mean - self.marginal_mean
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(n > 0, self.marginal_mean + delta * np.where(n > 0, nb / n, 0.0), 0.0)
+            m2 = self.marginal_m2 + other.marginal_m2 + np.where(n > 0, delta ** 2 * na * nb / n, 0.0)
+        return n, mean, m2
+
+    def update(self, df):
+        # Moments of the current rows plus df's rows
+        return self.merge(Moments.from_frame(df, self.columns))
+
+    def mean_of(self, col):
+        return self.marginal_mean[self._index[col]]
+
+    def var(self, col, ddof=1):
+        i = self._index[col]
+        return self.marginal_m2[i] / (self.marginal_n[i] - ddof)
+
+    def std(self, col, ddof=1):
+        return np.sqrt(self.var(col, ddof))
+
+    def cov(self, a, b, ddof=1):
+        return self.comoment[self._index[a], self._index[b]] / (self.n - ddof)
+
+    def pearson(self, a, b):
+        # Same statistic and two-sided p-value as scipy.stats.pearsonr
+        i, j = self._index[a], self._index[b]
+        r = self.comoment[i, j] / np.sqrt(self.comoment[i, i] * self.comoment[j, j])
+        r = float(np.clip(r, -1.0, 1.0))
+        dof = self.n - 2
+        if abs(r) == 1.0:
+            return r, 0.0
+        from scipy import stats
+        t = r * np.sqrt(dof / (1 - r * r))
+        return r, float(2 * stats.t.sf(abs(t), dof))
+
+    def ols(self, x_cols, y_col):
+        # Least squares with intercept from the centred normal equations:
+        # beta = Cxx^-1 Cxy, intercept = mean(y) - beta . mean(x)
+        xi = [self._index[col] for col in x_cols]
+        yi = self._index[y_col]
+        cxx = self.comoment[np.ix_(xi, xi)]
+        cxy = self.comoment[xi, yi]
+        coef = np.linalg.solve(cxx, cxy)
+        intercept = self.mean[yi] - coef @ self.mean[xi]
+        r2 = (cxy @ coef) / self.comoment[yi, yi]
+        return coef, float(intercept), float(r2)
+
+    def correlation_matrix(self):
+        d = np.sqrt(np.diag(self.comoment))
+        return pd.DataFrame(self.comoment / np.outer(d, d), index=self.columns, columns=self.columns)
+
+    def to_dict(self):
+        return {'columns': self.columns, 'n': int(self.n),
+                'mean': self.mean.tolist(), 'comoment': self.comoment.tolist(),
+                'marginal': [a.tolist() for a in (self.marginal_n, self.marginal_mean, self.marginal_m2)]}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d['columns'], d['n'], d['mean'], d['comoment'], d.get('marginal'))
+
+def frame_moments(df):
+    # Moments of a frame, computed on first use and memoised with the frame
+    return cached(df, 'moments', lambda: Moments.from_frame(df))
+
+def frame_median(df, col='DALYs'):
+    return cached(df, ('median', col), lambda: df[col].median())
+
+# ---------------------------------------------------------------------------
+# Out-of-core accumulation
+#
+# A CSV is split into byte ranges on line boundaries; each range is parsed in
+# bounded chunks and reduced to partial accumulators, and the partials are
+# merged. Ranges can be handled by separate worker processes, so neither the
+# parse nor the data ever has to fit in one process. Merging is exact up to
+# floating point summation order.
+# ---------------------------------------------------------------------------
+
+def csv_moments(path, columns=None, chunksize=DEFAULT_CHUNKSIZE, workers=None):
+    columns = list(columns or MOMENT_COLS)
+    partials = map_csv_ranges(_range_moments, path, workers, columns, chunksize)
+    total = Moments(columns)
+    for part in partials:
+        total = total.merge(part)
+    return total
+
+def map_csv_ranges(fn, path, workers, *args):
+    # fn(path, start, end, *args) for each range, results in file order
+    workers = workers or 1
+    ranges = csv_byte_ranges(path, workers)
+    if workers <= 1 or len(ranges) <= 1:
+        return [fn(path, start, end, *args) for start, end in ranges]
+
+    ctx = mp.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        futures = [pool.submit(fn, path, start, end, *args) for start, end in ranges]
+        return [future.result() for future in futures]
+
+def csv_byte_ranges(path, parts):
+    # Split the data records (after the header) into about `parts` ranges. A
+    # newline ends a record only outside quotes (quoted fields may span lines),
+    # so boundaries track the quote parity from the start of the file.
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        start, quoted = _next_record(f, 0, False)
+        bounds = [start]
+        pos = start
+        for i in range(1, parts):
+            target = start + (size - start) * i // parts
+            if target <= pos:
+                continue
+            quoted = _skip_to(f, pos, target, quoted)
+            pos, quoted = _next_record(f, target, quoted)
+            if pos < size:
+                bounds.append(pos)
+    bounds.append(size)
+    return [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+_SCAN_BLOCK = 1 << 20
+_QUOTE_OR_NEWLINE = re.compile(rb'["\n]')
+
+def _skip_to(f, pos, target, quoted):
+    # Quote state at `target`, reading on from `pos` in state `quoted`
+    f.seek(pos)
+    while pos < target:
+        block = f.read(min(_SCAN_BLOCK, target - pos))
+        if not block:
+            break
+        quoted ^= block.count(b'"') % 2 == 1
+        pos += len(block)
+    return quoted
+
+def _next_record(f, pos, quoted):
+    # (offset just past the next record-ending newline at or after `pos`, quote
+    # state there); the end of the file if there is none
+    f.seek(pos)
+    while True:
+        block = f.read(_SCAN_BLOCK)
+        if not block:
+            return pos, quoted
+        for match in _QUOTE_OR_NEWLINE.finditer(block):
+            if match.group() == b'"':
+                quoted = not quoted
+            elif not quoted:
+                return pos + match.end(), quoted
+        pos += len(block)
+
+def read_csv_range(path, start, end, chunksize=DEFAULT_CHUNKSIZE, usecols=None, dtype=None):
+    names = list(pd.read_csv(path, nrows=0).columns)
+    with open(path, 'rb') as f:
+        f.seek(start)
+        reader = pd.read_csv(_RangeFile(f, end), header=None, names=names, usecols=usecols,
+                             dtype=dtype, chunksize=chunksize)
+        for chunk in reader:
+            yield chunk
+
+class _RangeFile:
+    # Read-only view of [current position, end) of a binary file
+    def __init__(self, f, end):
+        self.f = f
+        self.end = end
+
+    def read(self, size=-1):
+        remaining = self.end - self.f.tell()
+        if remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        return self.f.read(size)
+
+    def __iter__(self):
+        while True:
+            line = self.readline()
+            if not line:
+                return
+            yield line
+
+    def readline(self, size=-1):
+        remaining = self.end - self.f.tell()
+        if remaining <= 0:
+            return b''
+        return self.f.readline(remaining if size is None or size < 0 else min(size, remaining))
+
+def _range_moments(path, start, end, columns, chunksize):
+    total = Moments(columns)
+    for chunk in read_csv_range(path, start, end, chunksize, usecols=columns):
+        total = total.merge(Moments.from_frame(chunk, columns))
+    return total
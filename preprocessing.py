@@ -1,52 +1,508 @@
 import pandas as pd
 import numpy as np
+import json
 import os
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
 
-def load_data(filepath):
-    df = pd.read_csv(filepath)
-    print(" Initial Data Overview:")
-    print(df.info())
+from dedup import DuplicateFilter, drop_duplicates
+from features import disease_type
+from quantiles import QuantileSketch, ValueCounts, iqr_summary, qcut_edges, sorted_column
+from schema import INTEGER_COLS, ORDERED_CATEGORIES, apply_schema, parse_dtypes
+from telemetry import enabled, stage
+
+# Columns touched by the cleaning steps
+MEDIAN_IMPUTE_COLS = ['Education Index', 'Urbanization Rate (%)']
+REQUIRED_COLS = ['DALYs', 'Per Capita Income (USD)']
+NORM_COLS = {
+    'Income_Norm': 'Per Capita Income (USD)',
+    'Education_Norm': 'Education Index',
+    'Urbanization_Norm': 'Urbanization Rate (%)',
+}
+INCOME_LABELS = ORDERED_CATEGORIES['Income Group']
+
+DEFAULT_CHUNKSIZE = 250_000
+
+# Bump whenever the cleaning logic changes so cached cleaned frames are rebuilt
+PREPROCESSING_VERSION = 4
+
+def load_data(filepath, chunksize=None, compact=True):
+    # Categorical / float32 columns are decoded at parse time (see schema.py)
+    dtype = parse_dtypes() if compact else None
+    # With a chunksize the caller gets an iterator of DataFrames instead
+    if chunksize:
+        return pd.read_csv(filepath, chunksize=chunksize, dtype=dtype)
+    with stage('load_data', path=str(filepath)) as record:
+        df = pd.read_csv(filepath, dtype=dtype)
+        if compact:
+            df = apply_schema(df, report=True)
+        record['rows_out'] = len(df)
+        record['columns'] = len(df.columns)
     return df
 
 def preprocess_data(df):
-    print("\n Missing Values Before Cleaning:")
-    print(df.isnull().sum())
+    with stage('preprocess', rows_in=df) as record:
+        if enabled():
+            record['missing_before'] = _missing_counts(df)
 
-    # Handling Missing Values: Impute or Drop
-    df['Education Index'] = df['Education Index'].fillna(df['Education Index'].median())
-    df['Urbanization Rate (%)'] = df['Urbanization Rate (%)'].fillna(df['Urbanization Rate (%)'].median())
-    df = df.dropna(subset=['DALYs', 'Per Capita Income (USD)'])
+        # Handling Missing Values: Impute or Drop
+        with stage('preprocess.impute', rows_in=df) as step:
+            medians = {col: df[col].median() for col in MEDIAN_IMPUTE_COLS}
+            df = _impute(df, medians)
+            step['rows_out'] = len(df)
+        if enabled():
+            record['missing_after'] = _missing_counts(df)
 
-    print("\n Missing Values After Imputation:")
-    print(df.isnull().sum())
+        # Data Cleaning
+        with stage('preprocess.dedup', rows_in=df) as step:
+            # Same rows as df.drop_duplicates(), from 64-bit row fingerprints (see dedup.py)
+            df, step['duplicates'] = drop_duplicates(df)
+            df['Year'] = df['Year'].astype(INTEGER_COLS['Year'])
+            step['rows_out'] = len(df)
 
-    # Data Cleaning
-    df = df.drop_duplicates()
-    df['Year'] = df['Year'].astype(int)
+        with stage('preprocess.stats', rows_in=df) as step:
+            iqr, moments, income_edges = _cleaning_stats(df)
+            step['outliers'] = iqr['outliers']
+        with stage('preprocess.features', rows_in=df) as step:
+            df = _add_features(df, moments, income_edges)
+            step['rows_out'] = len(df)
+        # Kept with the frame so the analysis report does not recompute them,
+        # and so appended rows can be cleaned the same way (see append_rows)
+        df.attrs['dalys_iqr'] = dict(iqr, rows=len(df))
+        df.attrs['cleaning'] = _applied_stats(medians, moments, income_edges)
+        record['rows_out'] = len(df)
+    return df
 
-    # Outlier Detection: Using IQR for DALYs
-    Q1 = df['DALYs'].quantile(0.25)
-    Q3 = df['DALYs'].quantile(0.75)
-    IQR = Q3 - Q1
-    lower = Q1 - 1.5 * IQR
-    upper = Q3 + 1.5 * IQR
-    outliers = df[(df['DALYs'] < lower) | (df['DALYs'] > upper)]
-    print(f"\n⚠️ Outliers in DALYs: {len(outliers)} rows")
+def _missing_counts(missing):
+    # Non-zero missing-value counts per column, from a frame or from isnull().sum()
+    if isinstance(missing, pd.DataFrame):
+        missing = missing.isnull().sum()
+    return {col: int(n) for col, n in missing.items() if n}
 
+def _cleaning_stats(df):
+    # Outlier Detection: Using IQR for DALYs. Both quantile columns are sorted
+    # once and memoised with the frame (see quantiles.py).
+    iqr = iqr_summary(sorted_column(df, 'DALYs'))
 
     # Data Transformation: Normalization (Z-score)
-    df['Income_Norm'] = (df['Per Capita Income (USD)'] - df['Per Capita Income (USD)'].mean()) / df['Per Capita Income (USD)'].std()
-    df['Education_Norm'] = (df['Education Index'] - df['Education Index'].mean()) / df['Education Index'].std()
-    df['Urbanization_Norm'] = (df['Urbanization Rate (%)'] - df['Urbanization Rate (%)'].mean()) / df['Urbanization Rate (%)'].std()
+    moments = {src: _mean_std(df[src]) for src in NORM_COLS.values()}
 
-    # Feature Engineering
-    communicable = ['Parasitic', 'Viral', 'Bacterial', 'Infectious']
-    df['Disease Type'] = df['Disease Category'].apply(lambda x: 'Infectious' if x in communicable else 'Non-Communicable')
-    df['Income Group'] = pd.qcut(df['Per Capita Income (USD)'], 3, labels=['Low', 'Medium', 'High'])
+    # Feature Engineering: the tertile edges pd.qcut would use
+    income_edges = qcut_edges(sorted_column(df, 'Per Capita Income (USD)'), len(INCOME_LABELS))
+    return iqr, moments, income_edges
 
-    return df
+def _impute(df, medians):
+    for col, median in medians.items():
+        df[col] = df[col].fillna(median)
+    return df.dropna(subset=REQUIRED_COLS)
+
+def _applied_stats(medians, moments, income_edges):
+    # The statistics a cleaned frame was produced with, as plain JSON values
+    return {'medians': {col: float(value) for col, value in medians.items()},
+            'moments': {src: [float(mean), float(std)] for src, (mean, std) in moments.items()},
+            'income_edges': [float(edge) for edge in income_edges]}
+
+def _mean_std(series):
+    # float32 source columns are normalised in float64
+    values = series.astype('float64')
+    return values.mean(), values.std()
+
+def _add_features(df, moments, income_edges):
+    for name, src in NORM_COLS.items():
+        mean, std = moments[src]
+        df[name] = (df[src].astype('float64') - mean) / std
+
+    df['Disease Type'] = disease_type(df)
+    # Same binning pd.qcut performs, but with edges that may come from a previous pass
+    df['Income Group'] = pd.cut(df['Per Capita Income (USD)'], income_edges, labels=INCOME_LABELS, include_lowest=True)
+    return apply_schema(df)
 
 def save_cleaned_data(df, path='data/cleaned_data.csv'):
     os.makedirs(os.path.dirname(path), exist_ok=True)
-    df.to_csv(path, index=False)
+    with stage('save_cleaned_data', rows_in=df, path=path):
+        df.to_csv(path, index=False)
     print(f"\nCleaned data saved to: {path}")
+
+# ---------------------------------------------------------------------------
+# Partitioned (multi-process) pipeline
+#
+# Produces exactly the frame preprocess_data returns. Duplicate rows always
+# share their Year, so each Year partition can be imputed and deduplicated on
+# its own. The medians are taken from the whole frame first and broadcast; the
+# post-cleaning statistics (IQR, z-score mean/std, income tertile edges) are
+# computed once on the merged partitions, which are put back in original row
+# order so the sums run in the same order as the serial path.
+# ---------------------------------------------------------------------------
+
+PARALLEL_MIN_ROWS = 500_000
+
+def preprocess_data_parallel(df, workers=None, partition_by='Year'):
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(df) < PARALLEL_MIN_ROWS:
+        return preprocess_data(df)
+
+    with stage('preprocess', rows_in=df, workers=workers, partition_by=partition_by) as record:
+        if enabled():
+            record['missing_before'] = _missing_counts(df)
+        medians = {col: df[col].median() for col in MEDIAN_IMPUTE_COLS}
+
+        partitions = [df.iloc[rows] for rows in df.groupby(partition_by, sort=True, dropna=False, observed=True).indices.values()]
+        ctx = mp.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=min(workers, len(partitions)), mp_context=ctx) as pool:
+            with stage('preprocess.clean_partitions', rows_in=df, partitions=len(partitions)) as step:
+                cleaned = list(pool.map(_clean_partition, partitions, [medians] * len(partitions)))
+                del partitions
+                step['rows_out'] = sum(len(part) for part, _, _ in cleaned)
+                step['duplicates'] = sum(removed for _, _, removed in cleaned)
+            record['missing_after'] = _missing_counts(sum(missing for _, missing, _ in cleaned))
+
+            with stage('preprocess.stats', rows_in=sum(len(part) for part, _, _ in cleaned)) as step:
+                merged = pd.concat([part for part, _, _ in cleaned]).sort_index(kind='stable')
+                iqr, moments, income_edges = _cleaning_stats(merged)
+                del merged
+                step['outliers'] = iqr['outliers']
+
+            parts = [part for part, _, _ in cleaned]
+            del cleaned
+            with stage('preprocess.features', rows_in=sum(len(part) for part in parts)) as step:
+                featured = pool.map(_add_features, parts, [moments] * len(parts), [income_edges] * len(parts))
+                df = pd.concat(list(featured)).sort_index(kind='stable')
+
+                # Partitions may have seen different category sets; concat leaves those
+                # columns as plain values and apply_schema re-derives them globally
+                df = apply_schema(df)
+                step['rows_out'] = len(df)
+        df.attrs['dalys_iqr'] = dict(iqr, rows=len(df))
+        df.attrs['cleaning'] = _applied_stats(medians, moments, income_edges)
+        record['rows_out'] = len(df)
+    return df
+
+def _clean_partition(part, medians):
+    part = _impute(part, medians)
+    missing = part.isnull().sum()
+    part, removed = drop_duplicates(part)
+    part['Year'] = part['Year'].astype(INTEGER_COLS['Year'])
+    return part, missing, removed
+
+# ---------------------------------------------------------------------------
+# Streaming (chunked) pipeline
+#
+# Produces the same cleaned_data.csv as preprocess_data + save_cleaned_data
+# (rows, order and values; the z-score columns can differ in the last bit
+# because the sums run in a different order) while holding at most one chunk
+# of rows in memory. The global statistics are accumulated exactly:
+#   - medians / quantiles from merged value counts (the source columns are
+#     rounded, so the count tables stay small)
+#   - means / stds with Chan's parallel merge of (n, mean, M2)
+# With quantiles='sketch' the DALYs quartiles and the income tertile edges
+# come from KLL sketches instead (bounded memory for any number of distinct
+# values, rank error stated in the telemetry); see quantiles.py.
+# Duplicate removal depends on the imputed values, so the reader makes three
+# passes: medians and dtypes, then cleaning statistics plus a 1-bit keep mask
+# per row, then the transform-and-write pass.
+# ---------------------------------------------------------------------------
+
+def preprocess_data_streaming(filepath, out_path='data/cleaned_data.csv', chunksize=DEFAULT_CHUNKSIZE, quantiles='exact'):
+    sketch = quantiles == 'sketch'
+    with stage('preprocess_streaming', path=str(filepath), chunksize=chunksize, quantiles=quantiles) as record:
+        # Pass 1: column dtypes across all chunks and medians for imputation
+        with stage('preprocess_streaming.scan') as step:
+            dtypes = {}
+            median_counts = {col: None for col in MEDIAN_IMPUTE_COLS}
+            missing = None
+            rows_in = 0
+            for chunk in load_data(filepath, chunksize=chunksize):
+                for col, dtype in chunk.dtypes.items():
+                    dtypes[col] = _common_dtype(dtypes.get(col), dtype)
+                for col in MEDIAN_IMPUTE_COLS:
+                    median_counts[col] = _merge_counts(median_counts[col], chunk[col])
+                counts = chunk.isnull().sum()
+                missing = counts if missing is None else missing + counts
+                rows_in += len(chunk)
+            medians = {col: _median_from_counts(counts) for col, counts in median_counts.items()}
+            step['rows_out'] = rows_in
+        record['rows_in'] = rows_in
+        record['missing_before'] = _missing_counts(missing)
+
+        # Pass 2: impute, drop and deduplicate; collect the post-cleaning statistics
+        with stage('preprocess_streaming.stats', rows_in=rows_in) as step:
+            duplicates = DuplicateFilter()
+            keep_masks = []
+            moments = {src: (0, 0.0, 0.0) for src in NORM_COLS.values()}
+            dalys_counts = QuantileSketch() if sketch else None
+            income_counts = QuantileSketch() if sketch else None
+            years = set()
+            for chunk in _read_typed(filepath, chunksize, dtypes):
+                chunk = _impute(chunk, medians)
+                keep = duplicates(chunk)
+                keep_masks.append(np.packbits(keep))
+
+                chunk = chunk[keep]
+                for src in moments:
+                    moments[src] = _merge_moments(moments[src], chunk[src].to_numpy(dtype=float))
+                if sketch:
+                    dalys_counts.update(chunk['DALYs'])
+                    income_counts.update(chunk['Per Capita Income (USD)'])
+                else:
+                    dalys_counts = _merge_counts(dalys_counts, chunk['DALYs'])
+                    income_counts = _merge_counts(income_counts, chunk['Per Capita Income (USD)'])
+                years.update(int(year) for year in chunk['Year'].dropna().unique())
+            step['duplicates'] = duplicates.removed
+            del duplicates
+
+            dalys_quantiles = dalys_counts if sketch else ValueCounts(dalys_counts)
+            income_quantiles = income_counts if sketch else ValueCounts(income_counts)
+            iqr = iqr_summary(dalys_quantiles)
+            step['outliers'] = iqr['outliers']
+            step['rank_error'] = max(iqr['rank_error'], income_quantiles.rank_error())
+
+            norm_stats = {src: (mean, np.sqrt(m2 / (n - 1))) for src, (n, mean, m2) in moments.items()}
+            income_edges = qcut_edges(income_quantiles, len(INCOME_LABELS))
+            step['rows_out'] = len(dalys_quantiles)
+
+        # Pass 3: apply the global statistics chunk by chunk and write out
+        with stage('preprocess_streaming.write', rows_in=rows_in, path=out_path) as step:
+            os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
+            rows = 0
+            for i, chunk in enumerate(_read_typed(filepath, chunksize, dtypes)):
+                chunk = _impute(chunk, medians)
+                keep = np.unpackbits(keep_masks[i], count=len(chunk)).astype(bool)
+                chunk = chunk[keep]
+                chunk['Year'] = chunk['Year'].astype(INTEGER_COLS['Year'])
+                chunk = _add_features(chunk, norm_stats, income_edges)
+                chunk.to_csv(out_path, index=False, mode='w' if i == 0 else 'a', header=(i == 0))
+                rows += len(chunk)
+            step['rows_out'] = rows
+        record['rows_out'] = rows
+
+        # The exact accumulators are what an append needs to carry on from;
+        # sketches are not, so a sketched dataset is cleaned again before one
+        if not sketch:
+            applied = _applied_stats(medians, norm_stats, income_edges)
+            CleaningState(median_counts, moments, dalys_counts, income_counts, applied, years).save(
+                cleaning_state_path(out_path))
+        elif os.path.exists(cleaning_state_path(out_path)):
+            os.remove(cleaning_state_path(out_path))
+
+    print(f"\nCleaned data saved to: {out_path} ({rows} rows)")
+    return out_path
+
+def _read_typed(filepath, chunksize, dtypes):
+    return pd.read_csv(filepath, chunksize=chunksize, dtype=dtypes)
+
+def _common_dtype(current, new):
+    # Categories differ per chunk; let each read infer its own
+    if isinstance(new, pd.CategoricalDtype):
+        return 'category'
+    if current is None:
+        return new
+    if pd.api.types.is_numeric_dtype(current) and pd.api.types.is_numeric_dtype(new):
+        return np.result_type(current, new)
+    # Text wins over numbers, as it would when parsing the whole file at once
+    return new if pd.api.types.is_numeric_dtype(current) else current
+
+def _merge_counts(counts, values):
+    new = values.value_counts(dropna=True)
+    if counts is None:
+        return new.sort_index()
+    return counts.add(new, fill_value=0).sort_index()
+
+def _median_from_counts(counts):
+    n = int(counts.sum())
+    if n % 2:
+        return _value_at(counts, n // 2)
+    return (_value_at(counts, n // 2 - 1) + _value_at(counts, n // 2)) / 2
+
+def _value_at(counts, rank):
+    cumulative = counts.cumsum().to_numpy()
+    return counts.index[np.searchsorted(cumulative, rank, side='right')]
+
+def _merge_moments(acc, values):
+    n_a, mean_a, m2_a = acc
+    n_b = len(values)
+    if n_b == 0:
+        return acc
+    mean_b = values.mean()
+    m2_b = ((values - mean_b) ** 2).sum()
+    n = n_a + n_b
+    delta = mean_b - mean_a
+    return n, mean_a + delta * n_b / n, m2_a + m2_b + delta ** 2 * n_a * n_b / n
+
+# ---------------------------------------------------------------------------
+# Incremental append
+#
+# Adds rows (typically a new year's release) to a cleaned dataset without
+# reprocessing the history. CleaningState holds the accumulators behind every
+# global cleaning statistic, in the mergeable form the streaming pipeline
+# uses (value counts for the medians and quantiles, (n, mean, M2) for the
+# z-score moments), plus the statistics the stored rows were cleaned with.
+# New rows are cleaned with those applied statistics, so old and new rows
+# stay comparable, while the accumulators are merged so the statistics a
+# full recompute would use stay known exactly. drift() measures how far the
+# derived columns are from what a full recompute would give; past
+# DRIFT_TOLERANCE the dataset should be cleaned again from all sources.
+#
+# Duplicate rows always share their Year, so appended rows only need to be
+# deduplicated among themselves; rows for a year already in the cleaned data
+# are rejected.
+# ---------------------------------------------------------------------------
+
+CLEANING_STATE_VERSION = 1
+# Largest drift (share of rows for the medians and income group edges, share
+# of a standard deviation for the z-scores) that does not call for a recompute
+DRIFT_TOLERANCE = 0.01
+
+class CleaningState:
+    def __init__(self, impute_counts, moments, dalys_counts, income_counts, applied, years):
+        # impute_counts: {column: value counts} over the raw rows
+        # moments: {column: (n, mean, M2)}, dalys_counts / income_counts: value
+        # counts, all over the cleaned rows
+        # applied: medians / moments / income_edges the rows were cleaned with
+        self.impute_counts = impute_counts
+        self.moments = moments
+        self.dalys_counts = dalys_counts
+        self.income_counts = income_counts
+        self.applied = applied
+        self.years = set(years)
+
+    @classmethod
+    def from_frame(cls, raw_counts, cleaned):
+        # raw_counts: impute_counts() of the raw frame, taken before cleaning;
+        # cleaned: the frame preprocess_data returned for it
+        moments = {src: _merge_moments((0, 0.0, 0.0), cleaned[src].to_numpy(dtype=float))
+                   for src in NORM_COLS.values()}
+        return cls(raw_counts, moments, _merge_counts(None, cleaned['DALYs']),
+                   _merge_counts(None, cleaned['Per Capita Income (USD)']),
+                   cleaned.attrs['cleaning'], _frame_years(cleaned))
+
+    def merge(self, raw_counts, cleaned):
+        # State after appending `cleaned` (cleaned from a raw frame with
+        # impute_counts raw_counts); the applied statistics are unchanged
+        impute = {col: self.impute_counts[col].add(raw_counts[col], fill_value=0).sort_index()
+                  for col in MEDIAN_IMPUTE_COLS}
+        moments = {src: _merge_moments(acc, cleaned[src].to_numpy(dtype=float))
+                   for src, acc in self.moments.items()}
+        return CleaningState(impute, moments, _merge_counts(self.dalys_counts, cleaned['DALYs']),
+                             _merge_counts(self.income_counts, cleaned['Per Capita Income (USD)']),
+                             self.applied, self.years | _frame_years(cleaned))
+
+    def current(self):
+        # The statistics a full recompute over every row so far would apply
+        norm_stats = {src: (mean, np.sqrt(m2 / (n - 1))) for src, (n, mean, m2) in self.moments.items()}
+        income_edges = qcut_edges(ValueCounts(self.income_counts), len(INCOME_LABELS))
+        medians = {col: _median_from_counts(counts) for col, counts in self.impute_counts.items()}
+        return _applied_stats(medians, norm_stats, income_edges)
+
+    def iqr(self):
+        # The DALYs outlier statistics over every row, as preprocess_data records them
+        return iqr_summary(ValueCounts(self.dalys_counts))
+
+    def drift(self):
+        # {derived column: drift} between the applied and the current statistics
+        applied, current = self.applied, self.current()
+        drift = {}
+        for col, counts in self.impute_counts.items():
+            # Share of the values lying between the applied and the current median
+            drift[f'{col} (imputed)'] = _share_between(counts, applied['medians'][col], current['medians'][col])
+        for name, src in NORM_COLS.items():
+            (mean, std), (new_mean, new_std) = applied['moments'][src], current['moments'][src]
+            drift[name] = max(abs(new_mean - mean) / std, abs(new_std / std - 1))
+        # Share of the rows that would move to another income group
+        inner = zip(applied['income_edges'][1:-1], current['income_edges'][1:-1])
+        drift['Income Group'] = sum(_share_between(self.income_counts, old, new) for old, new in inner)
+        return drift
+
+    def save(self, path):
+        state = {
+            'version': CLEANING_STATE_VERSION,
+            'impute_counts': {col: _counts_to_json(counts) for col, counts in self.impute_counts.items()},
+            'moments': {src: [int(n), float(mean), float(m2)] for src, (n, mean, m2) in self.moments.items()},
+            'dalys_counts': _counts_to_json(self.dalys_counts),
+            'income_counts': _counts_to_json(self.income_counts),
+            'applied': self.applied,
+            'years': sorted(int(year) for year in self.years),
+        }
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        # None when there is no state at path or it was written by another version
+        try:
+            with open(path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get('version') != CLEANING_STATE_VERSION:
+            return None
+        return cls({col: _counts_from_json(counts) for col, counts in state['impute_counts'].items()},
+                   {src: tuple(acc) for src, acc in state['moments'].items()},
+                   _counts_from_json(state['dalys_counts']), _counts_from_json(state['income_counts']),
+                   state['applied'], state['years'])
+
+def cleaning_state_path(cleaned_path):
+    return os.path.splitext(str(cleaned_path))[0] + '.state.json'
+
+def impute_counts(df):
+    # Value counts of the imputed columns over raw rows, for CleaningState
+    return {col: _merge_counts(None, df[col]) for col in MEDIAN_IMPUTE_COLS}
+
+def append_rows(df, state):
+    # Clean the raw rows in df the way the stored rows were cleaned.
+    # Returns (cleaned rows, updated state).
+    years = _frame_years(df)
+    overlap = years & state.years
+    if overlap:
+        raise ValueError(f"Years {sorted(overlap)} are already in the cleaned data; "
+                         "add them to the raw data and rebuild instead")
+
+    with stage('append.clean', rows_in=df, years=sorted(years)) as record:
+        raw_counts = impute_counts(df)
+        applied = state.applied
+        df = _impute(df, applied['medians'])
+        df, record['duplicates'] = drop_duplicates(df)
+        df['Year'] = df['Year'].astype(INTEGER_COLS['Year'])
+
+        moments = {src: tuple(stats) for src, stats in applied['moments'].items()}
+        # Open outer edges: incomes beyond the stored range land in the lowest
+        # or highest group, as they would after a recompute
+        income_edges = np.array(applied['income_edges'])
+        income_edges[0], income_edges[-1] = -np.inf, np.inf
+        df = _add_features(df, moments, income_edges)
+        record['rows_out'] = len(df)
+    return df, state.merge(raw_counts, df)
+
+def concat_rows(df, rows):
+    # df with rows appended. Categorical columns take the union of both
+    # category lists (sorted, as parsing gives them; ordered lists keep their
+    # order) so they stay categorical without re-encoding the history.
+    for col in df.columns:
+        a, b = df[col].dtype, rows[col].dtype
+        if not (isinstance(a, pd.CategoricalDtype) and isinstance(b, pd.CategoricalDtype)):
+            continue
+        if a.categories.equals(b.categories):
+            continue
+        if a.ordered:
+            categories = a.categories.append(b.categories.difference(a.categories))
+        else:
+            categories = a.categories.union(b.categories)
+        df = df.assign(**{col: df[col].cat.set_categories(categories)})
+        rows = rows.assign(**{col: rows[col].cat.set_categories(categories)})
+    return apply_schema(pd.concat([df, rows], ignore_index=True))
+
+def _frame_years(df):
+    return {int(year) for year in df['Year'].dropna().unique()}
+
+def _share_between(counts, a, b):
+    # Share of the counted values in (min(a, b), max(a, b)]
+    lo, hi = min(a, b), max(a, b)
+    return float(counts[(counts.index > lo) & (counts.index <= hi)].sum() / counts.sum())
+
+def _counts_to_json(counts):
+    return {'values': counts.index.tolist(), 'counts': counts.to_numpy().tolist()}
+
+def _counts_from_json(counts):
+    return pd.Series(counts['counts'], index=pd.Index(counts['values'], dtype='float64'), dtype='float64')
@@ -0,0 +1,227 @@
+import numpy as np
+import pandas as pd
+
+from aggregates import cached
+
+# Quantiles for the IQR outlier bounds and the income groups.
+#
+# Exact, in memory: sorted_column() sorts a column's non-missing values once
+# per frame and memoises them with it, after which any number of quantiles,
+# outlier counts and qcut edges are index lookups and binary searches.
+# Quantiles interpolate linearly between order statistics, exactly as
+# Series.quantile does.
+#
+# Exact, streaming: ValueCounts answers the same questions from merged value
+# counts, which stay small because the source columns are rounded.
+#
+# Approximate, streaming: QuantileSketch is a KLL sketch for columns too
+# large or too finely valued to count. It keeps O(k log(n / k)) items, is
+# updated chunk by chunk and merged across workers, and a quantile it returns
+# has a rank within rank_error() * n of the true one (99% confidence). Until
+# its first compaction it holds every value and is exact.
+#
+# All three share quantile() / count_outside() / rank_error() / method, so
+# iqr_summary() and the reports do not care which one they were given.
+
+# Sketch size: the rank error shrinks roughly as 1 / k
+SKETCH_K = 200
+# Smallest compactor, as in the reference KLL implementation
+SKETCH_MIN_WIDTH = 8
+# Compactor capacities shrink by this factor per level below the top
+SKETCH_DECAY = 2 / 3
+
+def _interpolate(values, qs):
+    # Linear interpolation between order statistics of sorted `values`,
+    # computed the way np.quantile does
+    n = len(values)
+    pos = np.asarray(qs, dtype=float) * (n - 1)
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.minimum(lo + 1, n - 1)
+    return _lerp(values[lo], values[hi], pos - lo)
+
+def _lerp(a, b, t):
+    # np.quantile's interpolation, so results match it to the last bit
+    diff = b - a
+    return np.where(t >= 0.5, b - diff * (1 - t), a + diff * t)
+
+def _result(values, q):
+    # A float for a scalar q, an array otherwise
+    return float(values[0]) if np.ndim(q) == 0 else values
+
+class SortedColumn:
+    method = 'exact'
+
+    def __init__(self, values):
+        values = np.asarray(values, dtype=float)
+        self.values = np.sort(values[~np.isnan(values)])
+
+    def __len__(self):
+        return len(self.values)
+
+    def quantile(self, q):
+        return _result(_interpolate(self.values, np.atleast_1d(q)), q)
+
+    def count_outside(self, lower, upper):
+        # Values below lower or above upper
+        below = np.searchsorted(self.values, lower, side='left')
+        above = len(self.values) - np.searchsorted(self.values, upper, side='right')
+        return int(below + above)
+
+    def rank_error(self):
+        return 0.0
+
+class ValueCounts:
+    method = 'exact'
+
+    def __init__(self, counts):
+        # counts: value -> count Series (as from value_counts), any order
+        counts = counts.sort_index()
+        self.values = counts.index.to_numpy(dtype=float)
+        self.cumulative = counts.to_numpy().cumsum()
+
+    def __len__(self):
+        return int(self.cumulative[-1]) if len(self.cumulative) else 0
+
+    def quantile(self, q):
+        qs = np.atleast_1d(np.asarray(q, dtype=float))
+        pos = qs * (len(self) - 1)
+        lo = np.floor(pos)
+        hi = np.minimum(lo + 1, len(self) - 1)
+        return _result(_lerp(self._value_at(lo), self._value_at(hi), pos - lo), q)
+
+    def _value_at(self, ranks):
+        return self.values[np.searchsorted(self.cumulative, ranks, side='right')]
+
+    def count_outside(self, lower, upper):
+        below = np.searchsorted(self.values, lower, side='left')
+        above = np.searchsorted(self.values, upper, side='right')
+        total = len(self)
+        inside = (self.cumulative[above - 1] if above else 0) - (self.cumulative[below - 1] if below else 0)
+        return int(total - inside)
+
+    def rank_error(self):
+        return 0.0
+
+class QuantileSketch:
+    method = 'kll'
+
+    def __init__(self, k=SKETCH_K, seed=0):
+        self.k = k
+        # levels[h] holds items that each stand for 2**h values
+        self.levels = [np.empty(0)]
+        self.n = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self.compacted = False
+        # Seeded, so a run gives the same sketch every time
+        self._rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return self.n
+
+    def update(self, values):
+        # Adds the non-missing values (in place); returns the sketch
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if len(values):
+            self.n += len(values)
+            self.min = min(self.min, values.min())
+            self.max = max(self.max, values.max())
+            self.levels[0] = np.concatenate([self.levels[0], values])
+            self._compress()
+        return self
+
+    def merge(self, other):
+        # Adds another sketch's values (in place); returns the sketch
+        if other.k != self.k:
+            raise ValueError(f"Cannot merge sketches with k={self.k} and k={other.k}")
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, items in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], items])
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.compacted = self.compacted or other.compacted
+        self._compress()
+        return self
+
+    def _capacity(self, h):
+        depth = len(self.levels) - h - 1
+        return max(SKETCH_MIN_WIDTH, int(np.ceil(self.k * SKETCH_DECAY ** depth)))
+
+    def _compress(self):
+        # Any over-full level keeps one of its sorted items if their number is
+        # odd and passes every other one of the rest (even or odd positions at
+        # random) up a level, where each counts twice
+        h = 0
+        while h < len(self.levels):
+            items = self.levels[h]
+            if len(items) > self._capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                odd = len(items) % 2
+                promoted = items[odd + self._rng.integers(2)::2]
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+                self.levels[h] = items[:odd]
+                self.compacted = True
+            h += 1
+
+    def _cdf(self):
+        # (sorted items, cumulative weight)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        return items[order], np.cumsum(weights[order])
+
+    def quantile(self, q):
+        if not self.compacted:
+            return SortedColumn(self.levels[0]).quantile(q)
+        qs = np.atleast_1d(np.asarray(q, dtype=float))
+        items, cumulative = self._cdf()
+        # The item holding the lower order statistic of each quantile
+        index = np.searchsorted(cumulative, qs * (self.n - 1), side='right')
+        values = items[np.minimum(index, len(items) - 1)]
+        values = np.where(qs <= 0, self.min, np.where(qs >= 1, self.max, values))
+        return _result(values, q)
+
+    def count_outside(self, lower, upper):
+        if not self.compacted:
+            return SortedColumn(self.levels[0]).count_outside(lower, upper)
+        items, cumulative = self._cdf()
+        below = np.searchsorted(items, lower, side='left')
+        above = np.searchsorted(items, upper, side='right')
+        inside = (cumulative[above - 1] if above else 0) - (cumulative[below - 1] if below else 0)
+        return int(self.n - inside)
+
+    def rank_error(self):
+        # Normalised rank error at 99% confidence, from the error model of the
+        # reference KLL implementation (Apache DataSketches); 0 while exact
+        return 2.296 / self.k ** 0.9723 if self.compacted else 0.0
+
+def sorted_column(df, col):
+    # A column's sorted values, computed on first use and memoised with the frame
+    return cached(df, ('sorted', col), lambda: SortedColumn(df[col].to_numpy(dtype=float, na_value=np.nan)))
+
+def iqr_bounds(q1, q3):
+    iqr = q3 - q1
+    return q1 - 1.5 * iqr, q3 + 1.5 * iqr
+
+def iqr_summary(quantiles):
+    # IQR outlier statistics from any of the quantile engines above, with the
+    # method and rank error behind them
+    q1, q3 = quantiles.quantile([0.25, 0.75])
+    lower, upper = iqr_bounds(q1, q3)
+    return {'q1': float(q1), 'q3': float(q3), 'lower': float(lower), 'upper': float(upper),
+            'outliers': quantiles.count_outside(lower, upper), 'rows': len(quantiles),
+            'quantiles': quantiles.method, 'rank_error': quantiles.rank_error()}
+
+def qcut_edges(quantiles, q):
+    # The bin edges pd.qcut uses for q equal-count bins
+    return np.asarray(quantiles.quantile(np.linspace(0, 1, q + 1)))
+
+def qcut(df, col, q, labels=None):
+    # pd.qcut(df[col], q), from the memoised sorted column
+    edges = qcut_edges(sorted_column(df, col), q)
+    return pd.cut(df[col], edges, labels=labels, include_lowest=True)
@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+
+# Batched per-group least squares.
+#
+# For each group the regression needs only n, the mean vector and the
+# co-moment matrix of [features..., target]. GroupedMoments builds these for
+# every group at once (one factorize plus a handful of bincounts), merges
+# partial results from chunks with the same pairwise update as moments.Moments,
+# and solves all the 3x3 normal equations in one stacked np.linalg.solve.
+
+REGRESSION_FEATURES = ['Per Capita Income (USD)', 'Education Index', 'Urbanization Rate (%)']
+REGRESSION_TARGET = 'DALYs'
+GROUPINGS = ['Country', 'Year', 'Income Group']
+
+class GroupedMoments:
+    def __init__(self, by, columns, groups, n, mean, comoment):
+        self.by = by
+        self.columns = list(columns)
+        self.groups = pd.Index(groups)
+        self.n = np.asarray(n, dtype=float)
+        self.mean = np.asarray(mean, dtype=float)
+        self.comoment = np.asarray(comoment, dtype=float)
+
+    @classmethod
+    def from_frame(cls, df, by, columns=None):
+        columns = list(columns or REGRESSION_FEATURES + [REGRESSION_TARGET])
+        x = df[columns].to_numpy(dtype=float)
+        codes, groups = pd.factorize(df[by], sort=True)
+        valid = (codes >= 0) & ~np.isnan(x).any(axis=1)
+        codes, x = codes[valid], x[valid]
+        g = len(groups)
+        k = len(columns)
+
+        n = np.bincount(codes, minlength=g).astype(float)
+        sums = np.stack([np.bincount(codes, weights=x[:, i], minlength=g) for i in range(k)], axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = sums / n[:, None]
+        centered = x - mean[codes]
+        comoment = np.empty((g, k, k))
+        for i in range(k):
+            for j in range(i, k):
+                comoment[:, i, j] = comoment[:, j, i] = np.bincount(codes, weights=centered[:, i] * centered[:, j], minlength=g)
+
+        # Unobserved categories carry no rows
+        present = n > 0
+        return cls(by, columns, groups[present], n[present], mean[present], comoment[present])
+
+    def merge(self, other):
+        if other.columns != self.columns or other.by != self.by:
+            raise ValueError("Cannot merge grouped moments over different groups or columns")
+        groups = self.groups.union(other.groups)
+        a = self._reindexed(groups)
+        b = other._reindexed(groups)
+        n = a.n + b.n
+        with np.errstate(invalid='ignore', divide='ignore'):
+            weight = np.where(n > 0, b.n / n, 0.0)
+            cross = np.where(n > 0, a.n * b.n / n, 0.0)
+        delta = b.mean - a.mean
+        mean = a.mean + delta * weight[:, None]
+        comoment = a.comoment + b.comoment + np.einsum('gi,gj->gij', delta, delta) * cross[:, None, None]
+        return GroupedMoments(self.by, self.columns, groups, n, mean, comoment)
+
+    def _reindexed(self, groups):
+        pos = self.groups.get_indexer(groups)
+        found = pos >= 0
+        k = len(self.columns)
+        n = np.zeros(len(groups))
+        mean = np.zeros((len(groups), k))
+        comoment = np.zeros((len(groups), k, k))
+        n[found] = self.n[pos[found]]
+        mean[found] = self.mean[pos[found]]
+        comoment[found] = self.comoment[pos[found]]
+        return GroupedMoments(self.by, self.columns, groups, n, mean, comoment)
+
+    def ols(self, features=None, target=REGRESSION_TARGET):
+        # Tidy table: one row per group with n, intercept, coefficients and R²
+        features = list(features or REGRESSION_FEATURES)
+        xi = [self.columns.index(col) for col in features]
+        yi = self.columns.index(target)
+        cxx = self.comoment[:, xi][:, :, xi]
+        cxy = self.comoment[:, xi, yi]
+        cyy = self.comoment[:, yi, yi]
+
+        coef = np.full((len(self.groups), len(features)), np.nan)
+        # Need more rows than parameters and a non-degenerate design
+        fit = self.n > len(features) + 1
+        fit &= np.abs(np.linalg.det(cxx)) > 0
+        if fit.any():
+            try:
+                coef[fit] = np.linalg.solve(cxx[fit], cxy[fit][..., None])[..., 0]
+            except np.linalg.LinAlgError:
+                coef[fit] = np.einsum('gij,gj->gi', np.linalg.pinv(cxx[fit]), cxy[fit])
+
+        intercept = self.mean[:, yi] - np.einsum('gi,gi->g', coef, self.mean[:, xi])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            r2 = np.einsum('gi,gi->g', cxy, coef) / cyy
+
+        table = pd.DataFrame({'grouping': self.by, 'group': self.groups.astype(str), 'n': self.n.astype(int),
+                              'intercept': intercept})
+        for i, col in enumerate(features):
+            table[col] = coef[:, i]
+        table['r2'] = r2
+        return table
+
+def grouped_moments(df, groupings=None):
+    return {by: GroupedMoments.from_frame(df, by) for by in (groupings or GROUPINGS) if by in df.columns}
+
+def grouped_regression(df, groupings=None):
+    return regression_table(grouped_moments(df, groupings))
+
+def regression_table(moments_by_grouping):
+    tables = [gm.ols() for gm in moments_by_grouping.values()]
+    return pd.concat(tables, ignore_index=True) if tables else pd.DataFrame()
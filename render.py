@@ -0,0 +1,176 @@
+import io
+import os
+import time
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+import telemetry
+from aggregates import get_ci_mode, set_ci_mode
+from store import open_store, store_path
+
+# Every figure the CLI produces: target name -> (module, function, file name)
+RENDER_TARGETS = {
+    'dalys_histogram': ('eda', 'plot_dalys_histogram', 'dalys_histogram.png'),
+    'dalys_by_gender': ('eda', 'plot_dalys_by_gender', 'dalys_by_gender.png'),
+    'dalys_by_age_group': ('eda', 'plot_dalys_by_age_group', 'dalys_by_age_group.png'),
+    'dalys_by_category': ('eda', 'plot_dalys_by_category', 'dalys_by_category.png'),
+    'dalys_by_disease_type': ('eda', 'plot_dalys_by_disease_type', 'dalys_by_disease_type.png'),
+    'income_regression': ('visualization', 'plot_income_vs_dalys', 'income_regression.png'),
+    'education_vs_dalys': ('visualization', 'plot_education_vs_dalys', 'education_vs_dalys.png'),
+    'urbanization_vs_dalys': ('visualization', 'plot_urbanization_vs_dalys', 'urbanization_vs_dalys.png'),
+    'correlation_matrix': ('visualization', 'plot_correlation_matrix', 'correlation_matrix.png'),
+    'dalys_by_treatment': ('visualization', 'plot_treatment_vs_dalys', 'dalys_by_treatment.png'),
+    'top_countries_dalys': ('visualization', 'plot_country_vs_dalys', 'top_countries_dalys.png'),
+    'dalys_vs_doctors': ('visualization', 'plot_healthcare_vs_dalys', 'dalys_vs_doctors.png'),
+    'dalys_over_time': ('visualization', 'plot_dalys_over_time', 'dalys_over_time.png'),
+    'dalys_time_income': ('visualization', 'plot_dalys_over_time_by_income', 'dalys_time_income.png'),
+    'dalys_vs_beds': ('visualization', 'plot_dalys_vs_hospital_beds', 'dalys_vs_beds.png'),
+    'dalys_vs_access': ('visualization', 'plot_dalys_vs_access', 'dalys_vs_access.png'),
+}
+
+def render_all(df, assets_dir='assets', targets=None, workers=None, ci=None, cube=None):
+    # Render the selected figures (all by default) and return
+    # {target: (path, seconds)}; failures are reported per target. `cube` is
+    # the path of a saved aggregate cube for df, which workers load instead
+    # of aggregating the rows again.
+    targets = list(targets or RENDER_TARGETS)
+    os.makedirs(assets_dir, exist_ok=True)
+    workers = min(workers or os.cpu_count() or 1, len(targets))
+
+    if ci is not None:
+        set_ci_mode(ci)
+    if workers <= 1:
+        return dict(_render_one(df, name, assets_dir) for name in targets)
+
+    results = {}
+    parent = telemetry.current_stage()
+    pool, blocks = render_pool(df, workers, cube)
+    try:
+        with pool:
+            futures = {pool.submit(_render_shared, name, assets_dir): name for name in targets}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    _, results[name], trace = future.result()
+                    # Worker-side stages join this process' trace
+                    telemetry.extend(trace, parent=parent)
+                except Exception as e:
+                    print(f"Failed to render {name}: {e}")
+    finally:
+        release_blocks(blocks)
+    return results
+
+def render_pool(df, workers, cube=None):
+    # (process pool whose workers hold df, shared memory blocks to release
+    # once the pool is shut down). A frame opened from a column store is
+    # passed as its path and workers map the same files; anything else is
+    # copied once into shared memory.
+    source = store_path(df)
+    blocks, spec = ([], source) if source else share_frame(df)
+    try:
+        ctx = mp.get_context('spawn')
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                                   initargs=(spec, get_ci_mode(), telemetry.enabled(), cube))
+    except Exception:
+        release_blocks(blocks)
+        raise
+    return pool, blocks
+
+def release_blocks(blocks):
+    for block in blocks:
+        block.close()
+        block.unlink()
+
+# ---------------------------------------------------------------------------
+# Shared-memory frame handoff
+#
+# Each column is copied once into a shared memory block (categoricals and
+# text as integer codes plus a small category list). Workers map the blocks
+# and wrap them in a DataFrame without copying, so the frame is never pickled.
+# ---------------------------------------------------------------------------
+
+def share_frame(df):
+    blocks, spec = [], []
+    for col in df.columns:
+        s = df[col]
+        categories, ordered = None, False
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            values = s.cat.codes.to_numpy()
+            categories, ordered = list(s.cat.categories), s.cat.ordered
+        elif pd.api.types.is_numeric_dtype(s.dtype):
+            values = s.to_numpy()
+        else:
+            cat = s.astype('category')
+            values = cat.cat.codes.to_numpy()
+            categories = list(cat.cat.categories)
+
+        block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[:] = values
+        blocks.append(block)
+        spec.append((col, block.name, values.dtype.str, len(values), categories, ordered))
+    return blocks, spec
+
+def attach_frame(spec):
+    blocks, columns = [], {}
+    for col, name, dtype, length, categories, ordered in spec:
+        block = shared_memory.SharedMemory(name=name)
+        blocks.append(block)
+        values = np.ndarray((length,), dtype=np.dtype(dtype), buffer=block.buf)
+        values.flags.writeable = False
+        if categories is not None:
+            values = pd.Categorical.from_codes(values, categories=categories, ordered=ordered)
+        columns[col] = values
+    return blocks, pd.DataFrame(columns, copy=False)
+
+# Worker-side state: one attached (or mapped) frame per process
+_worker_frame = None
+_worker_blocks = None
+
+def _init_worker(spec, ci_mode, trace=True, cube=None):
+    global _worker_frame, _worker_blocks
+    import matplotlib
+    matplotlib.use('Agg')
+    set_ci_mode(ci_mode)
+    telemetry.set_enabled(trace)
+    if isinstance(spec, str):
+        _worker_frame = open_store(spec)
+    elif spec is not None:
+        _worker_blocks, _worker_frame = attach_frame(spec)
+    if cube is not None and _worker_frame is not None:
+        from cube import Cube, attach_cube
+        saved = Cube.load(cube)
+        if saved is not None:
+            attach_cube(_worker_frame, saved)
+
+def _render_shared(name, assets_dir):
+    telemetry.clear()
+    name, result = _render_one(_worker_frame, name, assets_dir)
+    return name, result, telemetry.records()
+
+def render_png(name, ci=None):
+    # Worker task: (PNG bytes of one figure, worker trace), drawn as the CLI
+    # saves it, with error bars in the given CI mode
+    telemetry.clear()
+    if ci is not None:
+        set_ci_mode(ci)
+    import importlib
+    module, func, _ = RENDER_TARGETS[name]
+    plot = getattr(importlib.import_module(module), func)
+    buffer = io.BytesIO()
+    with telemetry.stage(f'render.{name}', rows_in=_worker_frame, ci=get_ci_mode()):
+        plot(_worker_frame, save_path=buffer)
+    return buffer.getvalue(), telemetry.records()
+
+def _render_one(df, name, assets_dir):
+    import importlib
+    module, func, filename = RENDER_TARGETS[name]
+    plot = getattr(importlib.import_module(module), func)
+    path = os.path.join(assets_dir, filename)
+    start = time.perf_counter()
+    with telemetry.stage(f'render.{name}', rows_in=df, path=path):
+        plot(df, save_path=path)
+    return name, (path, time.perf_counter() - start)
@@ -0,0 +1,214 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from moments import Moments, MOMENT_COLS, frame_moments, map_csv_ranges, read_csv_range
+from preprocessing import DEFAULT_CHUNKSIZE, INCOME_LABELS, _merge_counts
+from quantiles import QuantileSketch, ValueCounts, iqr_summary, sorted_column
+from regression import REGRESSION_FEATURES, grouped_moments, regression_table
+from telemetry import stage
+
+# Analysis report: missing data, DALYs outliers, the income/education/
+# urbanization regression and the healthcare correlations.
+#
+# Everything comes from one pass over the frame: the regression and the
+# correlations are solved from the cached moments (see moments.py) and the
+# IQR bounds are the ones preprocess_data already computed (the report states
+# how their quartiles were obtained and the rank error). The text file
+# keeps the layout of analysis_results.txt; the same numbers, plus the time
+# spent on each section (also recorded as telemetry stages), are written as
+# JSON next to it, and the per-group regressions (see regression.py) as a CSV
+# table.
+
+CORRELATION_PAIRS = {
+    'Healthcare Access': 'Healthcare Access (%)',
+    'Hospital Beds per 1000': 'Hospital Beds per 1000',
+}
+
+@contextmanager
+def _timed(report, section):
+    start = time.perf_counter()
+    with stage(f'report.{section}', rows_in=report.get('rows')):
+        yield
+    report['timings'][section] = time.perf_counter() - start
+
+def build_report(df):
+    report = {'rows': len(df), 'timings': {}}
+
+    with _timed(report, 'missing'):
+        report['missing'] = df.isnull().sum()
+
+    with _timed(report, 'outliers'):
+        report['outliers'] = dalys_outliers(df)
+
+    with _timed(report, 'moments'):
+        moments = frame_moments(df)
+        grouped = grouped_moments(df)
+
+    _add_model_sections(report, moments, grouped)
+    return report
+
+def _add_model_sections(report, moments, grouped):
+    with _timed(report, 'regression'):
+        coef, intercept, r2 = moments.ols(REGRESSION_FEATURES, 'DALYs')
+        report['regression'] = {'features': REGRESSION_FEATURES, 'coefficients': coef,
+                                'intercept': intercept, 'r2': r2}
+
+    with _timed(report, 'correlations'):
+        report['correlations'] = {}
+        for label, col in CORRELATION_PAIRS.items():
+            r, p = moments.pearson(col, 'DALYs')
+            report['correlations'][label] = {'column': col, 'r': r, 'p': p}
+        report['correlation_matrix'] = moments.correlation_matrix()
+
+    with _timed(report, 'grouped_regression'):
+        report['grouped_regression'] = regression_table(grouped)
+
+def build_report_streaming(path, chunksize=DEFAULT_CHUNKSIZE, workers=None, quantiles='exact'):
+    # The same report for a cleaned CSV of any size: each byte range of the file
+    # is reduced to missing counts, DALYs value counts (or a KLL sketch with
+    # quantiles='sketch') and moments (in parallel with workers > 1), and the
+    # merged partials give the statistics.
+    report = {'timings': {}}
+
+    with _timed(report, 'scan'):
+        partials = map_csv_ranges(_range_partials, path, workers, chunksize, quantiles)
+        rows, missing, dalys_counts, moments, grouped = 0, None, None, Moments(MOMENT_COLS), {}
+        for part_rows, part_missing, part_counts, part_moments, part_grouped in partials:
+            rows += part_rows
+            missing = part_missing if missing is None else missing + part_missing
+            if dalys_counts is None:
+                dalys_counts = part_counts
+            elif quantiles == 'sketch':
+                dalys_counts.merge(part_counts)
+            else:
+                dalys_counts = dalys_counts.add(part_counts, fill_value=0)
+            moments = moments.merge(part_moments)
+            grouped = _merge_grouped(grouped, part_grouped)
+        if not rows:
+            raise ValueError(f"{path} has no data rows to report on")
+        report['rows'] = rows
+        report['missing'] = missing
+
+    with _timed(report, 'outliers'):
+        dalys_quantiles = dalys_counts if quantiles == 'sketch' else ValueCounts(dalys_counts)
+        report['outliers'] = dict(iqr_summary(dalys_quantiles), rows=rows)
+
+    _add_model_sections(report, moments, grouped)
+    return report
+
+def _range_partials(path, start, end, chunksize, quantiles='exact'):
+    missing, moments, grouped, rows = None, Moments(MOMENT_COLS), {}, 0
+    # Seeded by the range, so every run of the same split gives the same sketch
+    dalys_counts = QuantileSketch(seed=start) if quantiles == 'sketch' else None
+    # Income groups keep their Low < Medium < High order, as in the cleaned frame
+    dtype = {'Income Group': pd.CategoricalDtype(INCOME_LABELS, ordered=True)}
+    for chunk in read_csv_range(path, start, end, chunksize, dtype=dtype):
+        counts = chunk.isnull().sum()
+        missing = counts if missing is None else missing + counts
+        if quantiles == 'sketch':
+            dalys_counts.update(chunk['DALYs'])
+        else:
+            dalys_counts = _merge_counts(dalys_counts, chunk['DALYs'])
+        moments = moments.merge(Moments.from_frame(chunk, MOMENT_COLS))
+        grouped = _merge_grouped(grouped, grouped_moments(chunk))
+        rows += len(chunk)
+    return rows, missing, dalys_counts, moments, grouped
+
+def _merge_grouped(total, part):
+    return {by: total[by].merge(gm) if by in total else gm for by, gm in part.items()}
+
+def dalys_outliers(df):
+    # Reuse the bounds from preprocess_data when the frame is the one it returned
+    stats = df.attrs.get('dalys_iqr')
+    if stats is not None and stats.get('rows') == len(df):
+        return stats
+
+    return dict(iqr_summary(sorted_column(df, 'DALYs')), rows=len(df))
+
+def format_report(report):
+    outliers = report['outliers']
+    regression = report['regression']
+    lines = [
+        "========== MISSING DATA REPORT ==========\n",
+        "\n\nAfter Cleaning:\n",
+        str(report['missing']),
+        "\n\n",
+        "========== OUTLIER REPORT ==========\n",
+        f"Lower Bound: {outliers['lower']:.2f}, Upper Bound: {outliers['upper']:.2f}\n",
+        f"Outliers Detected: {outliers['outliers']} rows\n",
+        f"Quartiles: {quantile_method(outliers)}\n\n",
+        "========== REGRESSION RESULTS ==========\n",
+        f"Coefficients: {regression['coefficients']}\n",
+        f"Intercept: {regression['intercept']:.2f}\n",
+        f"R² Score: {regression['r2']:.10f}  (scientific: {regression['r2']:.2e})\n",
+        "\n========== HEALTHCARE INFRASTRUCTURE CORRELATIONS ==========\n",
+    ]
+    for label, corr in report['correlations'].items():
+        lines.append(f"{label} vs DALYs:\n")
+        lines.append(f"  Correlation: {corr['r']:.4f}, p-value: {corr['p']:.4e}\n")
+
+    grouped = report.get('grouped_regression')
+    if grouped is not None and len(grouped):
+        lines.append("\n========== GROUPED REGRESSION ==========\n")
+        for by, table in grouped.groupby('grouping', sort=False):
+            fitted = table.dropna(subset=['r2'])
+            lines.append(f"By {by}: {len(fitted)} of {len(table)} groups fitted, "
+                         f"median R² {fitted['r2'].median():.2e} (max {fitted['r2'].max():.2e})\n")
+            if len(table) <= 10:
+                for _, row in table.iterrows():
+                    coefs = np.array([row[col] for col in REGRESSION_FEATURES])
+                    lines.append(f"  {row['group']}: n={row['n']}, Intercept: {row['intercept']:.2f}, "
+                                 f"Coefficients: {coefs}, R²: {row['r2']:.2e}\n")
+    return "".join(lines)
+
+def quantile_method(stats):
+    # How the quartiles behind the IQR bounds were obtained, and their error
+    if stats.get('quantiles', 'exact') == 'exact':
+        return "exact (rank error 0)"
+    return f"KLL sketch, rank error within ±{stats['rank_error']:.2%} of rows (99% confidence)"
+
+def report_json(report):
+    regression = report['regression']
+    return {
+        'rows': report['rows'],
+        'missing': {col: int(n) for col, n in report['missing'].items()},
+        'outliers': report['outliers'],
+        'regression': {
+            'features': regression['features'],
+            'coefficients': dict(zip(regression['features'], np.asarray(regression['coefficients']).tolist())),
+            'intercept': regression['intercept'],
+            'r2': regression['r2'],
+        },
+        'correlations': report['correlations'],
+        'correlation_matrix': report['correlation_matrix'].to_dict(),
+        'grouped_regression': {
+            by: {'groups': len(table), 'fitted': int(table['r2'].notna().sum()),
+                 'median_r2': float(table['r2'].median())}
+            for by, table in report['grouped_regression'].groupby('grouping', sort=False)
+        },
+        'timings': report['timings'],
+    }
+
+def write_report(report, save_path='data/analysis_results.txt', json_path=None):
+    regression = report['regression']
+    print("Regression Coefficients:", regression['coefficients'])
+    print("Intercept:", regression['intercept'])
+    print("R² Score:", regression['r2'])
+
+    os.makedirs(os.path.dirname(save_path) or '.', exist_ok=True)
+    with open(save_path, "w") as f:
+        f.write(format_report(report))
+
+    base = os.path.splitext(save_path)[0]
+    json_path = json_path or base + '.json'
+    with open(json_path, "w") as f:
+        json.dump(report_json(report), f, indent=2)
+    report['grouped_regression'].to_csv(base + '_grouped.csv', index=False)
+
+    print(f"\nFull summary saved to: {save_path} (JSON: {json_path}, per-group fits: {base}_grouped.csv)")
+    return save_path, json_path
@@ -0,0 +1,108 @@
+import sys
+import numpy as np
+import pandas as pd
+
+# Compact dtype schema for the Global Health Statistics frame.
+# Low-cardinality text becomes categorical, bounded-precision measures
+# (rates, indices, per-1000 ratios, all rounded to 2 decimals in the source)
+# become float32 and integer columns are downcast when their range allows.
+# DALYs, income, education and urbanization stay float64: they feed the
+# regression and the z-scores, and float32 would shift those results.
+
+CATEGORICAL_COLS = [
+    'Country',
+    'Disease Name',
+    'Disease Category',
+    'Age Group',
+    'Gender',
+    'Treatment Type',
+    'Availability of Vaccines/Treatment',
+    'Disease Type',
+    'Income Group',
+]
+
+# Categoricals whose values have a natural order (parsing sorts them
+# alphabetically, which would put High before Low)
+ORDERED_CATEGORIES = {
+    'Income Group': ['Low', 'Medium', 'High'],
+}
+
+FLOAT32_COLS = [
+    'Prevalence Rate (%)',
+    'Incidence Rate (%)',
+    'Mortality Rate (%)',
+    'Healthcare Access (%)',
+    'Doctors per 1000',
+    'Hospital Beds per 1000',
+    'Recovery Rate (%)',
+    'Improvement in 5 Years (%)',
+]
+
+INTEGER_COLS = {
+    'Year': 'int16',
+    'Population Affected': 'int32',
+    'Average Treatment Cost (USD)': 'int32',
+}
+
+def parse_dtypes():
+    # dtype mapping for pd.read_csv; integers are left to apply_schema because
+    # a missing value would make the parse fail
+    dtypes = {col: 'category' for col in CATEGORICAL_COLS}
+    dtypes.update({col: 'float32' for col in FLOAT32_COLS})
+    return dtypes
+
+def apply_schema(df, report=False):
+    for col in CATEGORICAL_COLS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    for col, categories in ORDERED_CATEGORIES.items():
+        if col in df.columns and _fits_categories(df[col], categories):
+            df[col] = df[col].astype(pd.CategoricalDtype(categories, ordered=True))
+    for col in FLOAT32_COLS:
+        if col in df.columns and df[col].dtype == np.float64:
+            df[col] = df[col].astype('float32')
+    for col, dtype in INTEGER_COLS.items():
+        if col in df.columns and _fits_integer(df[col], dtype):
+            df[col] = df[col].astype(dtype)
+
+    if report:
+        compact, baseline = memory_report(df)
+        print(f"Memory: {compact / 1e6:.1f} MB with compact schema "
+              f"(saved {(baseline - compact) / 1e6:.1f} MB vs {baseline / 1e6:.1f} MB as object/64-bit)")
+    return df
+
+def memory_report(df):
+    # Returns (current bytes, bytes the same frame would take with Python
+    # strings and 64-bit numerics) without materialising the wide version
+    compact = int(df.memory_usage(index=False, deep=True).sum())
+    baseline = 0
+    for col in df.columns:
+        s = df[col]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            cat_sizes = np.array([sys.getsizeof(str(v)) for v in s.cat.categories])
+            counts = s.cat.codes.value_counts()
+            counts = counts[counts.index >= 0]
+            baseline += int((cat_sizes[counts.index.to_numpy()] * counts.to_numpy()).sum()) + 8 * len(s)
+        elif pd.api.types.is_numeric_dtype(s.dtype):
+            baseline += 8 * len(s)
+        else:
+            baseline += int(s.memory_usage(index=False, deep=True))
+    return compact, baseline
+
+def _fits_categories(series, categories):
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype) and dtype.ordered and list(dtype.categories) == categories:
+        return False
+    # Values outside the list would be lost, so such columns are left alone
+    return set(series.dropna().unique()) <= set(categories)
+
+def _fits_integer(series, dtype):
+    if not pd.api.types.is_numeric_dtype(series.dtype) or series.dtype == dtype:
+        return False
+    if series.isna().any():
+        return False
+    values = series.to_numpy()
+    if not np.array_equal(values, np.round(values)):
+        return False
+    info = np.iinfo(dtype)
+    return len(values) == 0 or (values.min() >= info.min and values.max() <= info.max)
@@ -0,0 +1,451 @@
+import asyncio
+import json
+import math
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import numpy as np
+import pandas as pd
+
+import telemetry
+from aggregates import CI_MODES, box_stats, get_ci_mode, group_means, histogram
+
+# Read-only analysis server.
+#
+# `main.py serve` loads the cleaned data once (the memory-mapped parsed copy,
+# see store.py) with its moments and aggregate cube, and answers over a local
+# HTTP/JSON API:
+#   GET /                        dataset summary, endpoints and cache counters
+#   GET /stats                   the analysis report (as in analysis_results.json)
+#   GET /aggregates              figure names
+#   GET /aggregates/<figure>     the table a figure is drawn from
+#   GET /render/<figure>.png     the figure, as the CLI saves it
+# Mean plots take ?ci=se|bootstrap|none; the histogram and the scatter
+# aggregates take ?bins=N.
+#
+# One asyncio loop accepts connections and parses requests. Queries of the
+# frame run one at a time on a single thread, where they share the per-frame
+# memo (see aggregates.py); figures are drawn by a bounded pool of render
+# processes that map the same column store, and renders beyond RENDER_QUEUE
+# waiting are refused with 503. Responses are kept in an LRU cache keyed by
+# the normalised query and bounded in bytes, and identical requests that
+# arrive while one is being answered wait for it rather than repeat it. The
+# data does not change while the server runs, so nothing is invalidated.
+#
+# There is no authentication: the server binds to localhost unless told
+# otherwise.
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8050
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+# Renders queued or running before new ones are refused
+RENDER_QUEUE = 32
+# Seconds an idle keep-alive connection is held open
+IDLE_TIMEOUT = 30
+MAX_HEADERS = 100
+MAX_BINS = 500
+
+# What each figure is drawn from: figure -> (kind, column(s))
+FIGURE_AGGREGATES = {
+    'dalys_histogram': ('histogram', 'DALYs'),
+    'dalys_by_gender': ('means', 'Gender'),
+    'dalys_by_age_group': ('boxes', 'Age Group'),
+    'dalys_by_category': ('means', 'Disease Category'),
+    'dalys_by_disease_type': ('boxes', 'Disease Type'),
+    'income_regression': ('scatter', 'Per Capita Income (USD)'),
+    'education_vs_dalys': ('scatter', 'Education Index'),
+    'urbanization_vs_dalys': ('scatter', 'Urbanization Rate (%)'),
+    'correlation_matrix': ('correlation', ['DALYs', 'Per Capita Income (USD)', 'Education Index',
+                                           'Urbanization Rate (%)']),
+    'dalys_by_treatment': ('boxes', 'Treatment Type'),
+    'top_countries_dalys': ('top_means', 'Country'),
+    'dalys_vs_doctors': ('scatter', 'Doctors per 1000'),
+    'dalys_over_time': ('means', 'Year'),
+    'dalys_time_income': ('means', ['Year', 'Income Group']),
+    'dalys_vs_beds': ('scatter', 'Hospital Beds per 1000'),
+    'dalys_vs_access': ('scatter', 'Healthcare Access (%)'),
+}
+DEFAULT_BINS = {'histogram': 30, 'scatter': 50}
+TOP_GROUPS = 10
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class ResponseCache:
+    # LRU of finished responses (status, content type, body), bounded by the
+    # bytes of their bodies
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        response = self._entries.get(key)
+        if response is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return response
+
+    def put(self, key, response):
+        size = len(response[2])
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self.total_bytes -= len(self._entries.pop(key)[2])
+        self._entries[key] = response
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes:
+            _, old = self._entries.popitem(last=False)
+            self.total_bytes -= len(old[2])
+
+    def stats(self):
+        return {'entries': len(self), 'bytes': self.total_bytes, 'max_bytes': self.max_bytes,
+                'hits': self.hits, 'misses': self.misses}
+
+# ---------------------------------------------------------------------------
+# Answers. These run on the query thread and return JSON-able values.
+# ---------------------------------------------------------------------------
+
+def load_cleaned(cleaned_path):
+    # The parsed, memory-mapped copy of the cleaned CSV (written on first
+    # use), with the moments, the DALYs median and the aggregate cube warm
+    from cache import load_cached, store_cached
+    from cube import cube_path, refresh_cube
+    from moments import frame_median, frame_moments
+    from schema import apply_schema, parse_dtypes
+
+    if not os.path.exists(cleaned_path):
+        raise FileNotFoundError(f"No cleaned data at {cleaned_path}; run 'main.py run' first")
+    with telemetry.stage('server.load', path=str(cleaned_path)) as record:
+        df = load_cached(cleaned_path, stage='parsed')
+        record['cached'] = df is not None
+        if df is None:
+            print(f"Parsing {cleaned_path}...")
+            store_cached(apply_schema(pd.read_csv(cleaned_path, dtype=parse_dtypes())), cleaned_path,
+                         stage='parsed')
+            df = load_cached(cleaned_path, stage='parsed')
+        frame_moments(df)
+        frame_median(df, 'DALYs')
+        refresh_cube(df, cube_path(cleaned_path))
+        record['rows_out'] = len(df)
+    return df
+
+def statistics(df):
+    # The analysis report plus the global DALYs figures of the GUI stats panel
+    from moments import frame_median, frame_moments
+    from report import build_report, report_json
+    moments = frame_moments(df)
+    stats = report_json(build_report(df))
+    stats['dalys'] = {'mean': moments.mean_of('DALYs'), 'median': frame_median(df, 'DALYs'),
+                      'std': moments.std('DALYs')}
+    return stats
+
+def figure_aggregates(df, name, ci=None, bins=None):
+    # The summary figure `name` is drawn from (see eda.py / visualization.py)
+    from features import with_features
+    from lod import density_grid
+    from moments import frame_moments
+
+    kind, columns = FIGURE_AGGREGATES[name]
+    result = {'figure': name, 'kind': kind, 'columns': columns}
+    if kind == 'means':
+        summary = group_means(df, columns, ci=ci)
+        result.update(ci=summary.attrs['ci'], ci_label=summary.attrs['ci_label'], groups=summary)
+    elif kind == 'top_means':
+        summary = group_means(df, columns, ci='none').sort_values('mean', ascending=False).head(TOP_GROUPS)
+        result['groups'] = summary
+    elif kind == 'boxes':
+        result['groups'] = box_stats(with_features(df, [columns]), columns)
+    elif kind == 'histogram':
+        result.update(bins=bins, **histogram(df, columns, bins=bins))
+    elif kind == 'correlation':
+        result['matrix'] = frame_moments(df).correlation_matrix().loc[columns, columns].to_dict()
+    else:
+        moments = frame_moments(df)
+        r, p = moments.pearson(columns, 'DALYs')
+        coef, intercept, r2 = moments.ols([columns], 'DALYs')
+        grid = density_grid(df, columns, 'DALYs', (bins, bins))
+        result.update(rows=grid['rows'], pearson={'r': r, 'p': p},
+                      regression={'slope': coef[0], 'intercept': intercept, 'r2': r2},
+                      density={'xedges': grid['xedges'], 'yedges': grid['yedges'], 'counts': grid['counts']})
+    return result
+
+def _jsonable(value):
+    # Plain JSON values; tables become lists of records and NaN / inf null
+    if isinstance(value, pd.DataFrame):
+        return _jsonable(value.reset_index().to_dict(orient='records'))
+    if isinstance(value, pd.Series):
+        return _jsonable(value.to_dict())
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return _jsonable(value.tolist())
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+def _json_response(name, fn, df, *args):
+    with telemetry.stage(f'server.{name}', rows_in=df):
+        body = json.dumps(_jsonable(fn(df, *args)), allow_nan=False).encode()
+    return 200, 'application/json', body
+
+def _error(status, message):
+    return status, 'application/json', json.dumps({'error': message, 'status': status}).encode()
+
+# ---------------------------------------------------------------------------
+# HTTP
+# ---------------------------------------------------------------------------
+
+class AnalysisServer:
+    def __init__(self, df, cube=None, workers=None, cache_bytes=CACHE_MAX_BYTES, render_queue=RENDER_QUEUE,
+                 log=True):
+        # cube: path of the saved aggregate cube, loaded by the render workers
+        self.df = df
+        self.cube = cube
+        self.workers = workers or os.cpu_count() or 1
+        self.cache = ResponseCache(cache_bytes)
+        self.render_queue = render_queue
+        self.rendering = 0
+        self.log = log
+        self._pending = {}
+        self._queries = ThreadPoolExecutor(max_workers=1, thread_name_prefix='query')
+        self._pool = None
+        self._blocks = []
+        self._server = None
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        # Returns the bound (host, port); port 0 picks a free one
+        from render import render_pool
+        self._pool, self._blocks = render_pool(self.df, self.workers, self.cube)
+        self._server = await asyncio.start_server(self._connection, host, port)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def serve_forever(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        host, port = await self.start(host, port)
+        print(f"Serving {len(self.df):,} rows on http://{host}:{port}/ "
+              f"({self.workers} render workers; Ctrl+C to stop)", flush=True)
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self):
+        from render import release_blocks
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        self._queries.shutdown(wait=False, cancel_futures=True)
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+        release_blocks(self._blocks)
+        self._blocks = []
+
+    async def _connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(_read_request(reader), IDLE_TIMEOUT)
+                except HttpError as e:
+                    writer.write(_encode(_error(e.status, str(e)), keep_alive=False))
+                    await writer.drain()
+                    break
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+                    break
+                if request is None:
+                    break
+                method, target, version, headers = request
+                start = time.perf_counter()
+                response, cached = await self.respond(method, target)
+                keep_alive = (version == 'HTTP/1.1' and method in ('GET', 'HEAD')
+                              and headers.get('connection', '').lower() != 'close')
+                writer.write(_encode(response, keep_alive, head=method == 'HEAD'))
+                await writer.drain()
+                if self.log:
+                    print(f"{method} {target} {response[0]} {len(response[2]):,} B "
+                          f"{(time.perf_counter() - start) * 1000:.0f} ms{' (cached)' if cached else ''}",
+                          flush=True)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, method, target):
+        # (response, whether it came from the cache)
+        if method not in ('GET', 'HEAD'):
+            return _error(405, f"{method} is not supported; the API is read-only"), False
+        try:
+            key, compute = self.route(target)
+        except HttpError as e:
+            return _error(e.status, str(e)), False
+        if key is None:
+            return await compute(), False
+        response = self.cache.get(key)
+        if response is not None:
+            return response, True
+        try:
+            return await self._answer(key, compute), False
+        except HttpError as e:
+            return _error(e.status, str(e)), False
+        except Exception as e:
+            return _error(500, f"{type(e).__name__}: {e}"), False
+
+    async def _answer(self, key, compute):
+        # One computation per key at a time; later requests for the same key
+        # wait for it (shielded, so a client hanging up does not cancel it)
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._compute(key, compute))
+            self._pending[key] = pending
+            pending.add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(pending)
+
+    async def _compute(self, key, compute):
+        response = await compute()
+        self.cache.put(key, response)
+        return response
+
+    def route(self, target):
+        # (cache key or None, coroutine function answering the request)
+        url = urlsplit(target)
+        path = unquote(url.path).rstrip('/') or '/'
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        parts = path.strip('/').split('/')
+
+        if path == '/':
+            return None, self._index
+        if path == '/stats':
+            return ('stats',), lambda: self._query('stats', statistics)
+        if path == '/aggregates':
+            return ('aggregates',), self._figures
+        if len(parts) == 2 and parts[0] == 'aggregates':
+            name = _figure(parts[1])
+            kind = FIGURE_AGGREGATES[name][0]
+            ci = _ci(query) if kind == 'means' else None
+            bins = _bins(query, DEFAULT_BINS[kind]) if kind in DEFAULT_BINS else None
+            return ('aggregates', name, ci, bins), lambda: self._query('aggregates', figure_aggregates, name, ci, bins)
+        if len(parts) == 2 and parts[0] == 'render':
+            if not parts[1].endswith('.png'):
+                raise HttpError(404, "Figures are served as /render/<figure>.png")
+            name = _figure(parts[1][:-len('.png')])
+            ci = _ci(query) if FIGURE_AGGREGATES[name][0] == 'means' else None
+            return ('render', name, ci), lambda: self._render(name, ci)
+        raise HttpError(404, f"No such resource: {path}")
+
+    async def _query(self, name, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._queries, _json_response, name, fn, self.df, *args)
+
+    async def _render(self, name, ci):
+        from render import render_png
+        if self.rendering >= self.render_queue:
+            raise HttpError(503, f"{self.rendering} renders queued; retry shortly")
+        self.rendering += 1
+        try:
+            png, trace = await asyncio.wrap_future(self._pool.submit(render_png, name, ci))
+        finally:
+            self.rendering -= 1
+        # Worker-side stages join this process' trace
+        telemetry.extend(trace)
+        return 200, 'image/png', png
+
+    async def _index(self):
+        df = self.df
+        index = {
+            'rows': len(df),
+            'columns': {col: str(dtype) for col, dtype in df.dtypes.items()},
+            'figures': list(FIGURE_AGGREGATES),
+            'ci_modes': list(CI_MODES),
+            'default_ci': get_ci_mode(),
+            'endpoints': ['/', '/stats', '/aggregates', '/aggregates/<figure>', '/render/<figure>.png'],
+            'cache': self.cache.stats(),
+            'renders': {'workers': self.workers, 'in_progress': self.rendering, 'queue': self.render_queue},
+        }
+        return 200, 'application/json', json.dumps(_jsonable(index)).encode()
+
+    async def _figures(self):
+        figures = {name: {'kind': kind, 'columns': columns} for name, (kind, columns) in FIGURE_AGGREGATES.items()}
+        return 200, 'application/json', json.dumps(figures).encode()
+
+def _figure(name):
+    if name not in FIGURE_AGGREGATES:
+        raise HttpError(404, f"Unknown figure {name!r}; GET /aggregates for the list")
+    return name
+
+def _ci(query):
+    ci = query.get('ci', get_ci_mode())
+    if ci not in CI_MODES:
+        raise HttpError(400, f"Unknown CI mode {ci!r}; expected one of {list(CI_MODES)}")
+    return ci
+
+def _bins(query, default):
+    try:
+        bins = int(query.get('bins', default))
+    except ValueError:
+        raise HttpError(400, "bins must be an integer")
+    if not 1 <= bins <= MAX_BINS:
+        raise HttpError(400, f"bins must be between 1 and {MAX_BINS}")
+    return bins
+
+async def _read_request(reader):
+    # (method, target, version, headers) or None at end of stream. Requests
+    # carry no body: anything but GET / HEAD is answered and the connection closed.
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    parts = line.decode('latin-1').split()
+    if len(parts) != 3 or not parts[2].startswith('HTTP/'):
+        raise HttpError(400, "Malformed request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if not line.strip():
+            break
+        if len(headers) >= MAX_HEADERS:
+            raise HttpError(431, "Too many headers")
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    method, target, version = parts
+    return method, target, version, headers
+
+def _encode(response, keep_alive, head=False):
+    status, content_type, body = response
+    lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+             f"Content-Type: {content_type}",
+             f"Content-Length: {len(body)}",
+             f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    if status == 503:
+        lines.append("Retry-After: 1")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + (b'' if head else body)
+
+def serve(cleaned_path='data/cleaned_data.csv', host=DEFAULT_HOST, port=DEFAULT_PORT, workers=None,
+          cache_bytes=CACHE_MAX_BYTES, ci=None):
+    from aggregates import set_ci_mode
+    from cube import cube_path
+    if ci is not None:
+        set_ci_mode(ci)
+    print(f"Loading {cleaned_path}...")
+    df = load_cleaned(cleaned_path)
+    server = AnalysisServer(df, cube=cube_path(cleaned_path), workers=workers, cache_bytes=cache_bytes)
+    asyncio.run(server.serve_forever(host, port))
@@ -0,0 +1,55 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+# Import-time profile of the entry modules.
+#
+# Each module is imported in a fresh interpreter with `python -X importtime`,
+# so nothing already loaded in this process hides its cost. The imports the
+# module makes itself are summed by top-level package. report_startup()
+# prints the breakdown and returns False when an import takes longer than the
+# budget (`python main.py --profile-startup`); tests/test_startup.py holds
+# both modules to the same budget.
+
+STARTUP_MODULES = ('main', 'gui')
+# Seconds until the GUI module is importable (the window can be built)
+STARTUP_BUDGET = 1.0
+
+def profile_imports(module):
+    env = dict(os.environ, QT_QPA_PLATFORM=os.environ.get('QT_QPA_PLATFORM', 'offscreen'))
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                          cwd=Path(__file__).parent, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr.strip().splitlines()[-1]}")
+
+    # Lines come children first, indented two spaces per level; the direct
+    # imports of the profiled module are the level-1 lines just before it
+    total, children, packages = 0.0, [], {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        seconds = int(cumulative) / 1e6
+        if depth == 1:
+            children.append((name.strip(), seconds))
+        elif depth == 0:
+            total += seconds
+            if name.strip() == module:
+                for child, child_seconds in children:
+                    root = child.split('.')[0]
+                    packages[root] = packages.get(root, 0) + child_seconds
+            children = []
+    return total, dict(sorted(packages.items(), key=lambda item: -item[1]))
+
+def report_startup(modules=STARTUP_MODULES, budget=STARTUP_BUDGET, top=10):
+    within_budget = True
+    for module in modules:
+        total, packages = profile_imports(module)
+        status = "ok" if total <= budget else f"OVER BUDGET ({budget:.2f} s)"
+        print(f"\nimport {module}: {total:.3f} s {status}")
+        for name, seconds in list(packages.items())[:top]:
+            print(f"  {name:<28} {seconds:8.3f} s")
+        within_budget &= total <= budget
+    return within_budget
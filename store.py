@@ -0,0 +1,230 @@
+import json
+import os
+import shutil
+import weakref
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Memory-mapped column store.
+#
+# A frame is saved as a directory holding one .npy file per column plus
+# meta.json (column order, dtypes, category lists, df.attrs). Categorical and
+# text columns are stored as integer codes. open_store() maps every file
+# read-only and wraps the maps in a DataFrame without copying, so opening
+# costs the same for any number of rows: pages are read from disk when a
+# column is first touched, and every process that opens the same store (the
+# CLI, the GUI, render workers, several viewers) shares one copy of them in
+# the OS page cache. The columns are read-only: assigning a column replaces
+# it with a private array, writing into one raises, and the files are never
+# modified.
+#
+# Writing a frame that is itself an unmodified opened store hard-links the
+# column files instead of rewriting them.
+
+STORE_VERSION = 1
+META_NAME = "meta.json"
+
+# Opened frames -> their store directory, so callers can hand the path to
+# another process instead of the data
+_opened = {}
+
+def write_store(df, path):
+    path = Path(path)
+    tmp = path.with_name(path.name + '.tmp')
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    source = store_path(df)
+    if source is not None:
+        _link_files(Path(source), tmp)
+    else:
+        meta = {'version': STORE_VERSION, 'rows': len(df), 'columns': [], 'attrs': _jsonable(df.attrs)}
+        for i, col in enumerate(df.columns):
+            values, categories, ordered = _column_values(df[col])
+            filename = f"{i}.npy"
+            np.save(tmp / filename, np.ascontiguousarray(values), allow_pickle=False)
+            meta['columns'].append({'name': col, 'file': filename, 'dtype': values.dtype.str,
+                                    'categories': categories, 'ordered': ordered})
+        with open(tmp / META_NAME, 'w') as f:
+            json.dump(meta, f)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+    return path
+
+def write_store_chunks(chunks, path, attrs=None):
+    # write_store for a frame that arrives as chunks of rows with the same
+    # columns, so it never has to be in memory at once. Each column is
+    # spooled to disk as it comes; numeric columns take the dtype all chunks
+    # fit in and categorical / text columns are coded against the union of
+    # the chunks' values, renumbered at the end to the sorted order parsing
+    # gives (ordered categoricals keep their order).
+    path = Path(path)
+    tmp = path.with_name(path.name + '.tmp')
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    columns = None
+    rows = 0
+    for chunk in chunks:
+        if columns is None:
+            columns = [_SpooledColumn(tmp / f"{i}.part", col) for i, col in enumerate(chunk.columns)]
+        for column in columns:
+            column.append(chunk[column.name])
+        rows += len(chunk)
+    if columns is None:
+        raise ValueError("No chunks to write")
+
+    meta = {'version': STORE_VERSION, 'rows': rows, 'columns': [], 'attrs': _jsonable(attrs or {})}
+    for i, column in enumerate(columns):
+        filename = f"{i}.npy"
+        dtype, categories, ordered = column.finish(tmp / filename)
+        meta['columns'].append({'name': column.name, 'file': filename, 'dtype': dtype.str,
+                                'categories': categories, 'ordered': ordered})
+    with open(tmp / META_NAME, 'w') as f:
+        json.dump(meta, f)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+    return path
+
+class _SpooledColumn:
+    # One column of write_store_chunks: raw values appended to a part file,
+    # with the dtype of each chunk's segment, copied into the .npy at the end
+
+    def __init__(self, path, name):
+        self.path = path
+        self.name = name
+        self.segments = []
+        self.categories = None
+        self.ordered = False
+        self._index = {}
+        self._file = open(path, 'wb')
+
+    def append(self, s):
+        if isinstance(s.dtype, pd.CategoricalDtype) or not (isinstance(s.dtype, np.dtype) and s.dtype.kind in 'biufcmM'):
+            values = self._codes(s)
+        elif self.categories is not None:
+            raise ValueError(f"Column {self.name!r} is categorical in one chunk and numeric in another")
+        else:
+            values = np.ascontiguousarray(s.to_numpy())
+        self._file.write(values.tobytes())
+        self.segments.append((values.dtype, len(values)))
+
+    def _codes(self, s):
+        # Codes into the categories seen so far (new ones are added at the end)
+        cat = s if isinstance(s.dtype, pd.CategoricalDtype) else s.astype('category')
+        if self.categories is None:
+            if self.segments:
+                raise ValueError(f"Column {self.name!r} is numeric in one chunk and categorical in another")
+            self.categories = []
+            self.ordered = bool(cat.cat.ordered)
+        lookup = np.empty(len(cat.cat.categories) + 1, dtype=np.int32)
+        lookup[-1] = -1
+        for i, value in enumerate(cat.cat.categories.tolist()):
+            if value not in self._index:
+                self._index[value] = len(self.categories)
+                self.categories.append(value)
+            lookup[i] = self._index[value]
+        return lookup[cat.cat.codes.to_numpy()]
+
+    def finish(self, target):
+        # Writes the .npy file; returns (dtype, categories or None, ordered)
+        self._file.close()
+        remap = None
+        if self.categories is None:
+            dtype = np.result_type(*[dtype for dtype, _ in self.segments]) if self.segments else np.dtype('float64')
+            categories = None
+        else:
+            categories = self.categories if self.ordered else sorted(self.categories)
+            position = {value: i for i, value in enumerate(categories)}
+            remap = np.array([position[value] for value in self.categories] + [-1], dtype=np.int32)
+            dtype = np.dtype(np.int8 if len(categories) < 127 else np.int16 if len(categories) < 32767 else np.int32)
+
+        out = np.lib.format.open_memmap(target, mode='w+', dtype=dtype, shape=(sum(n for _, n in self.segments),))
+        start, offset = 0, 0
+        for segment_dtype, n in self.segments:
+            values = np.fromfile(self.path, dtype=segment_dtype, count=n, offset=offset)
+            if remap is not None:
+                values = remap[values]
+            out[start:start + n] = values
+            start += n
+            offset += n * segment_dtype.itemsize
+        out.flush()
+        del out
+        os.remove(self.path)
+        return dtype, categories, self.ordered
+
+def open_store(path):
+    path = Path(path)
+    with open(path / META_NAME) as f:
+        meta = json.load(f)
+    if meta.get('version') != STORE_VERSION:
+        raise ValueError(f"{path} has store version {meta.get('version')}, expected {STORE_VERSION}")
+
+    columns = {}
+    for spec in meta['columns']:
+        # A plain ndarray view keeps the map alive without the memmap subclass
+        values = np.load(path / spec['file'], mmap_mode='r', allow_pickle=False).view(np.ndarray)
+        if spec['categories'] is not None:
+            # validate=False: checking the codes would read every page
+            dtype = pd.CategoricalDtype(spec['categories'], ordered=spec['ordered'])
+            values = pd.Categorical.from_codes(values, dtype=dtype, validate=False)
+        columns[spec['name']] = values
+    df = pd.DataFrame(columns, copy=False)
+    df.attrs.update(meta['attrs'])
+
+    frame_id = id(df)
+    _opened[frame_id] = (weakref.ref(df), str(path), _buffers(df))
+    weakref.finalize(df, _opened.pop, frame_id, None)
+    return df
+
+def store_path(df):
+    # The store directory `df` was opened from, if it is that very frame and
+    # every column still reads from the mapped files (assigning to a column,
+    # or writing into it, swaps in a private array)
+    entry = _opened.get(id(df))
+    if entry is None or entry[0]() is not df or _buffers(df) != entry[2]:
+        return None
+    return entry[1]
+
+def _buffers(df):
+    # Data address of each column (of the codes, for categoricals)
+    buffers = []
+    for col in df.columns:
+        values = df[col].array
+        values = values.codes if isinstance(values, pd.Categorical) else df[col].to_numpy()
+        buffers.append((col, values.__array_interface__['data'][0]))
+    return tuple(buffers)
+
+def is_store(path):
+    return (Path(path) / META_NAME).exists()
+
+def _column_values(s):
+    # (numpy array, categories or None, ordered)
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return s.cat.codes.to_numpy(), s.cat.categories.tolist(), bool(s.cat.ordered)
+    if isinstance(s.dtype, np.dtype) and s.dtype.kind in 'biufcmM':
+        return s.to_numpy(), None, False
+    # Text and extension dtypes are kept as codes into their distinct values
+    cat = s.astype('category')
+    return cat.cat.codes.to_numpy(), cat.cat.categories.tolist(), False
+
+def _link_files(source, target):
+    for file in source.iterdir():
+        try:
+            os.link(file, target / file.name)
+        except OSError:
+            # Different file system (or no hard links): fall back to a copy
+            shutil.copy2(file, target / file.name)
+
+def _jsonable(value):
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
@@ -0,0 +1,214 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from itertools import count
+
+# Pipeline telemetry.
+#
+# `with stage(name, rows_in=df) as record:` times a block and appends one
+# record to the trace: wall time, CPU time of the calling thread, change in
+# resident memory and in the peak-RSS high-water mark, rows in and out (the
+# block sets record['rows_out']), the enclosing stage and any extra details
+# the block adds. Records go to an in-memory trace (written as JSON with
+# write_trace), are printed one per line when echo is on, and are passed to
+# listeners such as the GUI status bar.
+#
+# GDB_TELEMETRY=0 (or set_enabled(False)) turns it off: stage() then does one
+# flag check and yields a throwaway dict, and callers skip any detail that
+# costs a scan of the data by checking enabled() first.
+#
+# Work done in worker processes is not seen by this process' trace; callers
+# that care ship the worker's records back and extend() them in.
+
+TELEMETRY_ENV = 'GDB_TELEMETRY'
+MAX_RECORDS = 10_000
+
+_enabled = os.environ.get(TELEMETRY_ENV, '1') != '0'
+_echo = False
+_records = deque(maxlen=MAX_RECORDS)
+_listeners = []
+_lock = threading.Lock()
+_local = threading.local()
+_started = time.time()
+_ids = count(1)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+def enabled():
+    return _enabled
+
+def set_enabled(flag):
+    global _enabled
+    _enabled = bool(flag)
+
+def set_echo(flag):
+    global _echo
+    _echo = bool(flag)
+
+def add_listener(fn):
+    _listeners.append(fn)
+
+def remove_listener(fn):
+    if fn in _listeners:
+        _listeners.remove(fn)
+
+def rows(obj):
+    if obj is None or isinstance(obj, int):
+        return obj
+    try:
+        return len(obj)
+    except TypeError:
+        return None
+
+@contextmanager
+def stage(name, rows_in=None, **details):
+    if not _enabled:
+        yield {}
+        return
+
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    parent = stack[-1] if stack else None
+    record = {'stage': name, 'id': f"{os.getpid()}-{next(_ids)}",
+              'parent': parent['stage'] if parent else None, 'parent_id': parent['id'] if parent else None,
+              'depth': len(stack), 'rows_in': rows(rows_in), 'rows_out': None, **details}
+    stack.append(record)
+    record['start'] = time.time()
+    rss, peak = _memory()
+    cpu = time.thread_time()
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record['error'] = type(e).__name__
+        raise
+    finally:
+        record['wall'] = time.perf_counter() - start
+        record['cpu'] = time.thread_time() - cpu
+        rss_after, peak_after = _memory()
+        record['rss_delta'] = rss_after - rss if rss is not None and rss_after is not None else None
+        record['peak_rss_delta'] = peak_after - peak if peak is not None else None
+        record['rows_out'] = rows(record['rows_out'])
+        stack.pop()
+        _emit(record)
+
+def traced(fn=None, name=None):
+    # Decorator form of stage(); rows_in is the length of the first argument
+    # (the DataFrame for every plot and pipeline function)
+    if fn is None:
+        return lambda fn: traced(fn, name)
+    label = name or f"{fn.__module__}.{fn.__name__}"
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return fn(*args, **kwargs)
+        with stage(label, rows_in=args[0] if args else None):
+            return fn(*args, **kwargs)
+    return wrapper
+
+def current_stage():
+    # The innermost open stage record on this thread, or None
+    stack = getattr(_local, 'stack', None)
+    return stack[-1] if stack else None
+
+def extend(records, parent=None):
+    # Records produced elsewhere (a worker process), nested under the
+    # `parent` record
+    if not _enabled:
+        return
+    offset = parent['depth'] + 1 if parent else 0
+    for record in records:
+        record = dict(record, depth=record.get('depth', 0) + offset)
+        if parent and record['parent'] is None:
+            record['parent'], record['parent_id'] = parent['stage'], parent['id']
+        _emit(record)
+
+def records():
+    with _lock:
+        return list(_records)
+
+def clear():
+    with _lock:
+        _records.clear()
+
+def write_trace(path):
+    trace = {
+        'pid': os.getpid(),
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(_started)),
+        'argv': sys.argv,
+        'stages': records(),
+    }
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(trace, f, indent=2, default=str)
+    return path
+
+def format_record(record, indent=True):
+    parts = [f"{record['wall']:.3f} s", f"cpu {record['cpu']:.3f} s"]
+    if record.get('peak_rss_delta'):
+        parts.append(f"peak +{record['peak_rss_delta'] / 1e6:.1f} MB")
+    elif record.get('rss_delta') is not None:
+        parts.append(f"rss {record['rss_delta'] / 1e6:+.1f} MB")
+    if record.get('rows_in') is not None or record.get('rows_out') is not None:
+        rows_in = '-' if record.get('rows_in') is None else f"{record['rows_in']:,}"
+        rows_out = '-' if record.get('rows_out') is None else f"{record['rows_out']:,}"
+        parts.append(f"rows {rows_in} -> {rows_out}")
+    if record.get('error'):
+        parts.append(f"failed ({record['error']})")
+    if not indent:
+        return f"{record['stage']} " + ", ".join(parts)
+    pad = "  " * record.get('depth', 0)
+    return f"{pad}{record['stage']:<{max(36 - len(pad), 1)}} " + ", ".join(parts)
+
+def summary(depth=0):
+    # Text table of the recorded stages down to `depth` levels of nesting;
+    # each stage is listed above the stages it contains, siblings in start order
+    shown = [r for r in records() if r.get('depth', 0) <= depth]
+    ids = {r['id'] for r in shown}
+    children = {}
+    for r in sorted(shown, key=lambda r: r['start']):
+        children.setdefault(r['parent_id'] if r['parent_id'] in ids else None, []).append(r)
+    lines, pending = [], list(reversed(children.get(None, [])))
+    while pending:
+        r = pending.pop()
+        lines.append(format_record(r))
+        pending.extend(reversed(children.get(r['id'], [])))
+    return "\n".join(lines)
+
+def _emit(record):
+    with _lock:
+        _records.append(record)
+    if _echo:
+        print(format_record(record), flush=True)
+    for listener in list(_listeners):
+        try:
+            listener(record)
+        except Exception:
+            # Telemetry must never break the work it observes
+            pass
+
+def _memory():
+    # (current RSS, peak RSS) in bytes; None where the platform has no cheap source
+    rss = None
+    try:
+        with open('/proc/self/statm') as f:
+            rss = int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        pass
+    peak = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        peak *= 1 if sys.platform == 'darwin' else 1024
+    return rss, peak
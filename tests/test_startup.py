@@ -0,0 +1,18 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from startup import STARTUP_BUDGET, STARTUP_MODULES, profile_imports
+
+@pytest.mark.parametrize('module', STARTUP_MODULES)
+def test_import_within_budget(module):
+    total, packages = profile_imports(module)
+    assert total <= STARTUP_BUDGET, f"import {module} took {total:.3f} s: {packages}"
+
+def test_gui_imports_no_matplotlib():
+    # The canvas backend is imported with the first canvas, not with the module
+    _, packages = profile_imports('gui')
+    assert 'matplotlib' not in packages
@@ -1,159 +1,130 @@
-import seaborn as sns
-import matplotlib.pyplot as plt
-import os
 from typing import Optional
 import pandas as pd
 from matplotlib.axes import Axes
 
-def plot_income_vs_dalys(df):
-    sample_df = df.sample(5000, random_state=1)
-    sns.regplot(data=sample_df, x='Per Capita Income (USD)', y='DALYs', scatter_kws={'alpha':0.2})
-    plt.title("Income vs DALYs with Regression Line")
-    plt.legend(["Regression Line"])
-    plt.savefig("assets/income_regression.png")
-    plt.clf()
-
-def plot_education_vs_dalys(df):
-    sample_df = df.sample(5000, random_state=42)
-    sns.scatterplot(data=sample_df, x='Education Index', y='DALYs', hue='Disease Category')
-    plt.title("DALYs vs Education Index")
-    plt.savefig("assets/education_vs_dalys.png")
-    plt.clf()
-
-def plot_urbanization_vs_dalys(df):
-    sample_df = df.sample(5000, random_state=42)
-    sns.scatterplot(data=sample_df, x='Urbanization Rate (%)', y='DALYs', hue='Disease Category')
-    plt.title("DALYs vs Urbanization Rate")
-    plt.savefig("assets/urbanization_vs_dalys.png")
-    plt.clf()
-
-def plot_correlation_matrix(df):
+from aggregates import box_stats, group_means
+from figures import draw_bars, draw_boxes, draw_density, draw_lines, get_axes, save_figure
+from lod import level_of_detail
+from moments import frame_moments
+from telemetry import stage, traced
+
+def draw_scatter(axes, df, x, y='DALYs', hue=None, regression=False):
+    # Points, a stratified sample or a density image depending on how many
+    # rows there are for the size of the axes (see lod.py). seaborn is slow to
+    # import, so it is loaded by the first plot that uses it.
+    import seaborn as sns
+    with stage('visualization.level_of_detail', rows_in=df) as record:
+        mode, data = level_of_detail(df, x, y, axes)
+        record['mode'] = mode
+        record['rows_out'] = data['binned'] if mode == 'density' else len(data)
+    if mode == 'density':
+        draw_density(axes, data, x, y, hue=hue)
+        if regression:
+            # Fitted on every row, from the cached moments
+            coef, intercept, _ = frame_moments(df).ols([x], y)
+            xs = data['xedges'][[0, -1]]
+            axes.plot(xs, intercept + coef[0] * xs, color='C1', label="Regression Line")
+            axes.legend()
+    elif regression:
+        sns.regplot(data=data, x=x, y=y, scatter_kws={'alpha':0.2}, ax=axes)
+        axes.legend(["Regression Line"])
+    else:
+        sns.scatterplot(data=data, x=x, y=y, hue=hue, ax=axes)
+
+@traced
+def plot_income_vs_dalys(df, ax: Optional[Axes] = None, save_path="assets/income_regression.png"):
+    fig, axes = get_axes(ax)
+    draw_scatter(axes, df, 'Per Capita Income (USD)', regression=True)
+    axes.set_title("Income vs DALYs with Regression Line")
+    save_figure(fig, ax, save_path)
+    return axes
+
+@traced
+def plot_education_vs_dalys(df, ax: Optional[Axes] = None, save_path="assets/education_vs_dalys.png"):
+    fig, axes = get_axes(ax)
+    draw_scatter(axes, df, 'Education Index', hue='Disease Category')
+    axes.set_title("DALYs vs Education Index")
+    save_figure(fig, ax, save_path)
+    return axes
+
+@traced
+def plot_urbanization_vs_dalys(df, ax: Optional[Axes] = None, save_path="assets/urbanization_vs_dalys.png"):
+    fig, axes = get_axes(ax)
+    draw_scatter(axes, df, 'Urbanization Rate (%)', hue='Disease Category')
+    axes.set_title("DALYs vs Urbanization Rate")
+    save_figure(fig, ax, save_path)
+    return axes
+
+@traced
+def plot_correlation_matrix(df, ax: Optional[Axes] = None, save_path="assets/correlation_matrix.png"):
+    import seaborn as sns
+    fig, axes = get_axes(ax, figsize=(8, 6))
     selected = df[['DALYs', 'Per Capita Income (USD)', 'Education Index', 'Urbanization Rate (%)']]
     corr = selected.corr()
-    plt.figure(figsize=(8, 6))  
-    sns.heatmap(corr, annot=True, cmap='coolwarm', fmt=".5f")
-    plt.xticks(rotation=45, ha='right')
-    plt.yticks(rotation=0)
-    plt.title("Correlation Matrix")
-    plt.tight_layout() 
-    plt.savefig("assets/correlation_matrix.png")
-    plt.clf()
-
-def plot_treatment_vs_dalys(df):
-    sns.boxplot(data=df, x='Treatment Type', y='DALYs')
-    plt.xticks(rotation=45)
-    plt.title("DALYs by Treatment Type")
-    plt.tight_layout()
-    plt.savefig("assets/dalys_by_treatment.png")
-    plt.clf()
-
-def plot_country_vs_dalys(df):
-    top = df.groupby('Country')['DALYs'].mean().sort_values(ascending=False).head(10)
-    plt.figure(figsize=(8, 6))
-    sns.barplot(x=top.values, y=top.index)
-    plt.title("Top 10 Countries by Avg DALYs")
-    plt.xlabel("Average DALYs")
-    plt.tight_layout()
-    plt.savefig("assets/top_countries_dalys.png")
-    plt.clf()
-
-from sklearn.linear_model import LinearRegression
-import numpy as np
-
-def run_regression(df,save_path):
-    X = df[['Per Capita Income (USD)', 'Education Index', 'Urbanization Rate (%)']]
-    y = df['DALYs']
-    model = LinearRegression().fit(X, y)
-    print("Regression Coefficients:", model.coef_)
-    print("Intercept:", model.intercept_)
-    print("R² Score:", model.score(X, y))
- 
-    os.makedirs(os.path.dirname(save_path), exist_ok=True)
-    with open(save_path, "w") as f:
-        f.write("========== MISSING DATA REPORT ==========\n")
-        if df is not None:
-            f.write("\n\nAfter Cleaning:\n")
-            f.write(str(df.isnull().sum()))
-        else:
-            f.write("Original Data Not Provided\n")
-        f.write("\n\n")
-
-        # Outlier section
-        Q1 = df['DALYs'].quantile(0.25)
-        Q3 = df['DALYs'].quantile(0.75)
-        IQR = Q3 - Q1
-        lower = Q1 - 1.5 * IQR
-        upper = Q3 + 1.5 * IQR
-        outlier_count = df[(df['DALYs'] < lower) | (df['DALYs'] > upper)].shape[0]
-
-        f.write("========== OUTLIER REPORT ==========\n")
-        f.write(f"Lower Bound: {lower:.2f}, Upper Bound: {upper:.2f}\n")
-        f.write(f"Outliers Detected: {outlier_count} rows\n\n")
-
-        # Regression section
-        r2_score = model.score(X, y)
-        f.write("========== REGRESSION RESULTS ==========\n")
-        f.write(f"Coefficients: {model.coef_}\n")
-        f.write(f"Intercept: {model.intercept_:.2f}\n")
-        f.write(f"R² Score: {r2_score:.10f}  (scientific: {r2_score:.2e})\n")
-
-    print(f"\nFull summary saved to: {save_path}")
-    return model
-
-from scipy.stats import pearsonr
-
-def healthcare_correlation_summary(df, save_path):
-    access = df['Healthcare Access (%)']
-    beds = df['Hospital Beds per 1000']
-    dalys = df['DALYs']
-
-    # Pearson correlation
-    corr_access, p_access = pearsonr(access, dalys)
-    corr_beds, p_beds = pearsonr(beds, dalys)
-
-    # Append to summary file
-    os.makedirs(os.path.dirname(save_path), exist_ok=True)
-    with open(save_path, "a") as f:
-        f.write("\n========== HEALTHCARE INFRASTRUCTURE CORRELATIONS ==========\n")
-        f.write(f"Healthcare Access vs DALYs:\n")
-        f.write(f"  Correlation: {corr_access:.4f}, p-value: {p_access:.4e}\n")
-        f.write(f"Hospital Beds per 1000 vs DALYs:\n")
-        f.write(f"  Correlation: {corr_beds:.4f}, p-value: {p_beds:.4e}\n")
-
-    print("Healthcare correlations added to:", save_path)
-
-
-def plot_healthcare_vs_dalys(df):
-    sample_df = df.sample(5000, random_state=42) 
-    sns.scatterplot(data=sample_df, x='Doctors per 1000', y='DALYs', hue='Disease Category')
-    plt.title("DALYs vs Doctor Availability")
-    plt.savefig("assets/dalys_vs_doctors.png")
-    plt.clf()
-
-def plot_dalys_over_time(df):
-    yearly = df.groupby('Year')['DALYs'].mean().reset_index()
-    sns.lineplot(data=yearly, x='Year', y='DALYs')
-    plt.title("Average DALYs Over Time")
-    plt.savefig("assets/dalys_over_time.png")
-    plt.clf()
-
-def plot_dalys_over_time_by_income(df):
-    df_grouped = df.groupby(['Year', 'Income Group'])['DALYs'].mean().reset_index()
-    sns.lineplot(data=df_grouped, x='Year', y='DALYs', hue='Income Group')
-    plt.title("DALYs Over Time by Income Group")
-    plt.savefig("assets/dalys_time_income.png")
-    plt.clf()
-
-def plot_dalys_vs_hospital_beds(df):
-    sample = df.sample(5000)
-    sns.scatterplot(data=sample, x='Hospital Beds per 1000', y='DALYs')
-    plt.title("DALYs vs Hospital Beds per 1000")
-    plt.savefig("assets/dalys_vs_beds.png")
-    plt.clf()
-
-def plot_dalys_vs_access(df):
-    sample = df.sample(5000)
-    sns.scatterplot(data=sample, x='Healthcare Access (%)', y='DALYs')
-    plt.title("DALYs vs Healthcare Access (%)")
-    plt.savefig("assets/dalys_vs_access.png")
-    plt.clf()
+    sns.heatmap(corr, annot=True, cmap='coolwarm', fmt=".5f", ax=axes)
+    axes.tick_params(axis='x', rotation=45)
+    for label in axes.get_xticklabels():
+        label.set_horizontalalignment('right')
+    axes.tick_params(axis='y', rotation=0)
+    axes.set_title("Correlation Matrix")
+    save_figure(fig, ax, save_path, tight=True)
+    return axes
+
+@traced
+def plot_treatment_vs_dalys(df, ax: Optional[Axes] = None, save_path="assets/dalys_by_treatment.png"):
+    fig, axes = get_axes(ax)
+    draw_boxes(axes, box_stats(df, 'Treatment Type'), 'Treatment Type')
+    axes.tick_params(axis='x', rotation=45)
+    axes.set_title("DALYs by Treatment Type")
+    save_figure(fig, ax, save_path, tight=True)
+    return axes
+
+@traced
+def plot_country_vs_dalys(df, ax: Optional[Axes] = None, save_path="assets/top_countries_dalys.png"):
+    fig, axes = get_axes(ax, figsize=(8, 6))
+    top = group_means(df, 'Country', ci='none').sort_values('mean', ascending=False).head(10)
+    draw_bars(axes, top, 'Country', horizontal=True, errors=False)
+    axes.set_title("Top 10 Countries by Avg DALYs")
+    axes.set_xlabel("Average DALYs")
+    save_figure(fig, ax, save_path, tight=True)
+    return axes
+
+@traced
+def plot_healthcare_vs_dalys(df, ax: Optional[Axes] = None, save_path="assets/dalys_vs_doctors.png"):
+    fig, axes = get_axes(ax)
+    draw_scatter(axes, df, 'Doctors per 1000', hue='Disease Category')
+    axes.set_title("DALYs vs Doctor Availability")
+    save_figure(fig, ax, save_path)
+    return axes
+
+@traced
+def plot_dalys_over_time(df, ax: Optional[Axes] = None, save_path="assets/dalys_over_time.png", ci=None):
+    fig, axes = get_axes(ax)
+    draw_lines(axes, group_means(df, 'Year', ci=ci), 'Year')
+    axes.set_title("Average DALYs Over Time")
+    save_figure(fig, ax, save_path)
+    return axes
+
+@traced
+def plot_dalys_over_time_by_income(df, ax: Optional[Axes] = None, save_path="assets/dalys_time_income.png", ci=None):
+    fig, axes = get_axes(ax)
+    draw_lines(axes, group_means(df, ['Year', 'Income Group'], ci=ci), 'Year', hue='Income Group')
+    axes.set_title("DALYs Over Time by Income Group")
+    save_figure(fig, ax, save_path)
+    return axes
+
+@traced
+def plot_dalys_vs_hospital_beds(df, ax: Optional[Axes] = None, save_path="assets/dalys_vs_beds.png"):
+    fig, axes = get_axes(ax)
+    draw_scatter(axes, df, 'Hospital Beds per 1000')
+    axes.set_title("DALYs vs Hospital Beds per 1000")
+    save_figure(fig, ax, save_path)
+    return axes
+
+@traced
+def plot_dalys_vs_access(df, ax: Optional[Axes] = None, save_path="assets/dalys_vs_access.png"):
+    fig, axes = get_axes(ax)
+    draw_scatter(axes, df, 'Healthcare Access (%)')
+    axes.set_title("DALYs vs Healthcare Access (%)")
+    save_figure(fig, ax, save_path)
+    return axes